@@ -6,19 +6,78 @@
 #define ADF4351_DATA 11
 #define ADF4351_CE   9
 #define ADF4351_LD   8
+#define SWEEP_SYNC   7   // Pulses at every step of a device-resident sweep
 
 // Global variables
 uint32_t current_frequency = 50000000UL;  // Default to 50MHz
 bool sweep_mode = false;
+bool binary_mode = false;
+
+// Binary command mode (entered with the BIN text command)
+// Frame: SYNC, CMD, SEQ, payload (fixed size per command), XOR of CMD..payload
+// Reply: one ack byte, followed by SEQ when CMD has BIN_SEQ_FLAG set
+const uint8_t BIN_SYNC = 0xA5;
+const uint8_t BIN_SEQ_FLAG = 0x80;
+const uint8_t CMD_STATUS = 0x00;  // no payload
+const uint8_t CMD_REGS = 0x01;    // R0..R5, 4 bytes each, big-endian
+const uint8_t CMD_TABLE = 0x02;   // index (2 bytes), table entry (4 bytes)
+const uint8_t CMD_INDEX = 0x03;   // index (2 bytes): program a table entry
+const uint8_t CMD_TEXT = 0x04;    // no payload: back to the text protocol
+const uint8_t CMD_SWEEP = 0x05;   // first index (2), count (2), dwell in us (4), flags (1)
+const uint8_t CMD_STOP = 0x06;    // no payload: stop a running sweep
+const uint8_t CMD_SWEEP_LOCK = 0x07;  // first (2), count (2), dwell (4), settle (4), lock timeout (4) in us, flags (1)
+const uint8_t ACK = 0x80;         // ASCII replies never have bit 7 set
+const uint8_t ACK_LOCKED = 0x01;
+const uint8_t ACK_ERROR = 0x02;
+const uint8_t ACK_SWEEPING = 0x04;
+
+// Sweep flags and the 3-byte events sent while a sweep runs
+const uint8_t SWEEP_REPEAT = 0x01;
+const uint8_t SWEEP_REPORT = 0x02;  // send EVT_STEP for every step
+const uint8_t EVT_STEP = 0xC0;      // | lock, step index (2 bytes)
+const uint8_t EVT_DONE = 0xD0;      // | lock, steps done (2 bytes)
+
+// Frequency table: R0 words with the RF divider select (R4 DB22..DB20)
+// stored in the R0 control bits DB2..DB0, which are always 0 in R0
+const uint16_t TABLE_SIZE = 128;
+uint32_t freq_table[TABLE_SIZE];
+
+// Device-resident sweep over table entries, stepped on a micros() schedule
+uint16_t sweep_first = 0;
+uint16_t sweep_count = 0;
+uint16_t sweep_step = 0;
+uint32_t sweep_dwell_us = 0;
+uint32_t sweep_next_us = 0;
+uint8_t sweep_flags = 0;
+bool sweep_step_open = false;  // Timed sweeps: a step is programmed but not yet reported
+
+// Lock-gated sweeps: each step waits for lock detect (at most the lock
+// timeout) plus the settle margin, then pulses sync and holds for the dwell
+const uint8_t PHASE_PROGRAM = 0;
+const uint8_t PHASE_LOCKING = 1;
+const uint8_t PHASE_SETTLING = 2;
+bool sweep_lock_gated = false;
+uint32_t sweep_settle_us = 0;
+uint32_t sweep_timeout_us = 0;
+uint32_t sweep_phase_us = 0;
+uint8_t sweep_phase = PHASE_PROGRAM;
 
 // Constants
 const uint32_t REF_FREQ = 25000000UL;  // 25MHz reference
 const uint32_t CHANNEL_SPACING = 100000UL;  // 100kHz
+const uint32_t LOCK_HOLDOFF_US = 100;    // VCO band selection after an R0 write
+const uint32_t LOCK_TIMEOUT_US = 10000;  // Give up waiting for lock detect
 
 // Function declarations
 void writeADF4351(uint32_t value);
 uint32_t calculateR0(uint32_t freq_hz);
 void setFrequency(uint32_t freq_hz);
+uint8_t programRegisters();
+uint32_t waitForLock();
+uint8_t programEntry(uint16_t index);
+void serviceSweep();
+void serviceLockedSweep();
+void handleBinaryFrame();
 
 // Register array with corrected values for 50MHz default
 uint32_t registers[6] = {
@@ -30,6 +89,9 @@ uint32_t registers[6] = {
     0x00580005   // R5: LD pin mode
 };
 
+// Words last written to the chip, so retunes only write what changed
+uint32_t programmed[6];
+
 void writeADF4351(uint32_t value) {
     digitalWrite(ADF4351_LE, LOW);
     delayMicroseconds(1);
@@ -103,18 +165,16 @@ void setFrequency(uint32_t freq_hz) {
         // Calculate and set registers
         registers[0] = calculateR0(freq_hz);
         
-        // Write all registers in reverse order
-        for (int i = 5; i >= 0; i--) {
-            writeADF4351(registers[i]);
-            delay(1);
-        }
-        
-        // Write R0 again for frequency update
-        writeADF4351(registers[0]);
+        // Write the changed registers, then wait for lock detect
+        uint8_t written = programRegisters();
+        uint32_t lock_wait = written ? waitForLock() : 0;
         
         // Verify lock status
-        delay(10);
         bool locked = digitalRead(ADF4351_LD);
+        Serial.print(F("DEBUG: Registers written: "));
+        Serial.println(written);
+        Serial.print(F("DEBUG: Lock wait (us): "));
+        Serial.println(lock_wait);
         Serial.print(F("DEBUG: PLL Lock Status: "));
         Serial.println(locked ? "Locked" : "Unlocked");
         
@@ -124,10 +184,259 @@ void setFrequency(uint32_t freq_hz) {
     }
 }
 
+uint8_t programRegisters() {
+    // Changed registers from R5 down to R1, then R0 whenever anything was
+    // written: the R0 write starts VCO band selection and applies the update.
+    // Returns the number of registers written.
+    uint8_t written = 0;
+    for (int i = 5; i >= 1; i--) {
+        if (registers[i] != programmed[i]) {
+            writeADF4351(registers[i]);
+            programmed[i] = registers[i];
+            written++;
+        }
+    }
+    if (written || registers[0] != programmed[0]) {
+        writeADF4351(registers[0]);
+        programmed[0] = registers[0];
+        written++;
+    }
+    return written;
+}
+
+uint32_t waitForLock() {
+    // Poll lock detect after an R0 write; returns the wait in us, which is
+    // LOCK_TIMEOUT_US or more if the PLL did not lock
+    uint32_t start = micros();
+    delayMicroseconds(LOCK_HOLDOFF_US);
+    while (!digitalRead(ADF4351_LD) && micros() - start < LOCK_TIMEOUT_US) {
+    }
+    return micros() - start;
+}
+
+uint32_t readWord(const uint8_t *p) {
+    return ((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) | ((uint32_t)p[2] << 8) | p[3];
+}
+
+int payloadLength(uint8_t cmd) {
+    switch (cmd) {
+        case CMD_STATUS: return 0;
+        case CMD_REGS: return 24;
+        case CMD_TABLE: return 6;
+        case CMD_INDEX: return 2;
+        case CMD_TEXT: return 0;
+        case CMD_SWEEP: return 9;
+        case CMD_STOP: return 0;
+        case CMD_SWEEP_LOCK: return 17;
+        default: return -1;
+    }
+}
+
+uint8_t programEntry(uint16_t index) {
+    uint32_t entry = freq_table[index];
+    registers[4] = (registers[4] & ~(7UL << 20)) | ((entry & 7UL) << 20);
+    registers[0] = entry & ~7UL;
+    return programRegisters();
+}
+
+void sendEvent(uint8_t event, uint16_t value) {
+    if (digitalRead(ADF4351_LD)) event |= ACK_LOCKED;
+    Serial.write(event);
+    Serial.write((uint8_t)(value >> 8));
+    Serial.write((uint8_t)(value & 0xFF));
+}
+
+bool sweepFinished() {
+    // Wraps a repeating sweep; ends a single one and reports it
+    if (sweep_step < sweep_count) return false;
+    if (sweep_flags & SWEEP_REPEAT) {
+        sweep_step = 0;
+        return false;
+    }
+    sweep_mode = false;
+    sendEvent(EVT_DONE, sweep_count);
+    return true;
+}
+
+void pulseSync() {
+    digitalWrite(SWEEP_SYNC, HIGH);
+    delayMicroseconds(2);
+    digitalWrite(SWEEP_SYNC, LOW);
+}
+
+void finishStep() {
+    pulseSync();
+    if (sweep_flags & SWEEP_REPORT) sendEvent(EVT_STEP, sweep_step);
+    sweep_step++;
+}
+
+void serviceSweep() {
+    if (sweep_lock_gated) {
+        serviceLockedSweep();
+        return;
+    }
+    // Steps are due at fixed multiples of the dwell after the start, so
+    // serial traffic and programming time do not accumulate into drift
+    if ((int32_t)(micros() - sweep_next_us) < 0) return;
+    // A step is reported at the end of its dwell, so the lock bit says
+    // whether it was locked while held, not right after its R0 write
+    if (sweep_step_open) {
+        if (sweep_flags & SWEEP_REPORT) sendEvent(EVT_STEP, sweep_step - 1);
+        sweep_step_open = false;
+    }
+    if (sweepFinished()) return;
+    programEntry(sweep_first + sweep_step);
+    pulseSync();
+    sweep_step++;
+    sweep_step_open = true;
+    sweep_next_us += sweep_dwell_us;
+}
+
+void serviceLockedSweep() {
+    // One phase per call, so binary frames (CMD_STOP) are still served.
+    // A step that times out is reported with the lock bit clear.
+    uint32_t now = micros();
+    switch (sweep_phase) {
+        case PHASE_PROGRAM:
+            if ((int32_t)(now - sweep_next_us) < 0) return;
+            if (sweepFinished()) return;
+            programEntry(sweep_first + sweep_step);
+            sweep_phase_us = micros();
+            sweep_phase = PHASE_LOCKING;
+            break;
+        case PHASE_LOCKING:
+            if (now - sweep_phase_us < LOCK_HOLDOFF_US) return;
+            if (digitalRead(ADF4351_LD)) {
+                sweep_next_us = now + sweep_settle_us;
+                sweep_phase = PHASE_SETTLING;
+            } else if (now - sweep_phase_us >= sweep_timeout_us) {
+                sweep_next_us = now;
+                sweep_phase = PHASE_SETTLING;
+            }
+            break;
+        case PHASE_SETTLING:
+            if ((int32_t)(now - sweep_next_us) < 0) return;
+            finishStep();
+            sweep_next_us = micros() + sweep_dwell_us;
+            sweep_phase = PHASE_PROGRAM;
+            break;
+    }
+}
+
+void sendAck(uint8_t flags, uint8_t cmd, uint8_t seq) {
+    uint8_t status = ACK | flags;
+    if (digitalRead(ADF4351_LD)) status |= ACK_LOCKED;
+    if (sweep_mode) status |= ACK_SWEEPING;
+    Serial.write(status);
+    if (cmd & BIN_SEQ_FLAG) Serial.write(seq);
+}
+
+void handleBinaryFrame() {
+    // Skip anything up to the next sync byte
+    if (Serial.read() != BIN_SYNC) return;
+
+    uint8_t header[2];
+    if (Serial.readBytes(header, 2) != 2) return;
+    uint8_t cmd = header[0];
+    uint8_t seq = header[1];
+    int length = payloadLength(cmd & ~BIN_SEQ_FLAG);
+    if (length < 0) {
+        sendAck(ACK_ERROR, cmd, seq);
+        return;
+    }
+
+    uint8_t payload[25];
+    if (Serial.readBytes(payload, length + 1) != (size_t)(length + 1)) {
+        sendAck(ACK_ERROR, cmd, seq);
+        return;
+    }
+    uint8_t check = cmd ^ seq;
+    for (int i = 0; i < length; i++) check ^= payload[i];
+    if (check != payload[length]) {
+        sendAck(ACK_ERROR, cmd, seq);
+        return;
+    }
+
+    switch (cmd & ~BIN_SEQ_FLAG) {
+        case CMD_REGS:
+            for (int i = 0; i < 6; i++) {
+                registers[i] = readWord(payload + 4 * i);
+            }
+            if (programRegisters()) waitForLock();
+            break;
+        case CMD_TABLE: {
+            uint16_t index = ((uint16_t)payload[0] << 8) | payload[1];
+            if (index >= TABLE_SIZE) {
+                sendAck(ACK_ERROR, cmd, seq);
+                return;
+            }
+            freq_table[index] = readWord(payload + 2);
+            break;
+        }
+        case CMD_INDEX: {
+            uint16_t index = ((uint16_t)payload[0] << 8) | payload[1];
+            if (index >= TABLE_SIZE) {
+                sendAck(ACK_ERROR, cmd, seq);
+                return;
+            }
+            if (programEntry(index)) waitForLock();
+            break;
+        }
+        case CMD_SWEEP: {
+            uint16_t first = ((uint16_t)payload[0] << 8) | payload[1];
+            uint16_t count = ((uint16_t)payload[2] << 8) | payload[3];
+            if (count == 0 || (uint32_t)first + count > TABLE_SIZE) {
+                sendAck(ACK_ERROR, cmd, seq);
+                return;
+            }
+            sweep_first = first;
+            sweep_count = count;
+            sweep_dwell_us = readWord(payload + 4);
+            sweep_flags = payload[8];
+            sweep_step = 0;
+            sweep_step_open = false;
+            sweep_next_us = micros();
+            sweep_lock_gated = false;
+            sweep_mode = true;
+            break;
+        }
+        case CMD_SWEEP_LOCK: {
+            uint16_t first = ((uint16_t)payload[0] << 8) | payload[1];
+            uint16_t count = ((uint16_t)payload[2] << 8) | payload[3];
+            if (count == 0 || (uint32_t)first + count > TABLE_SIZE) {
+                sendAck(ACK_ERROR, cmd, seq);
+                return;
+            }
+            sweep_first = first;
+            sweep_count = count;
+            sweep_dwell_us = readWord(payload + 4);
+            sweep_settle_us = readWord(payload + 8);
+            sweep_timeout_us = readWord(payload + 12);
+            sweep_flags = payload[16];
+            sweep_step = 0;
+            sweep_next_us = micros();
+            sweep_phase = PHASE_PROGRAM;
+            sweep_lock_gated = true;
+            sweep_mode = true;
+            break;
+        }
+        case CMD_STOP:
+            sweep_mode = false;
+            break;
+        case CMD_TEXT:
+            sweep_mode = false;
+            binary_mode = false;
+            break;
+    }
+    sendAck(0, cmd, seq);
+}
+
 void setupADF4351() {
     pinMode(ADF4351_LE, OUTPUT);
     pinMode(ADF4351_CE, OUTPUT);
     pinMode(ADF4351_LD, INPUT);
+    pinMode(SWEEP_SYNC, OUTPUT);
+    digitalWrite(SWEEP_SYNC, LOW);
     
     digitalWrite(ADF4351_LE, HIGH);
     
@@ -145,6 +454,7 @@ void setupADF4351() {
     // Program all registers with initial values
     for (int i = 5; i >= 0; i--) {
         writeADF4351(registers[i]);
+        programmed[i] = registers[i];
         delay(1);
     }
     
@@ -157,12 +467,23 @@ void setup() {
     while (!Serial) {
         ; // Wait for serial port to connect
     }
+    // Bounds the wait for the rest of a binary frame
+    Serial.setTimeout(50);
     setupADF4351();
     Serial.println(F("ADF4351 RF Generator Ready"));
     Serial.println(F("Default frequency set to 50 MHz"));
 }
 
 void loop() {
+    if (sweep_mode) {
+        serviceSweep();
+    }
+    if (binary_mode) {
+        if (Serial.available()) {
+            handleBinaryFrame();
+        }
+        return;
+    }
     if (Serial.available()) {
         String cmd = Serial.readStringUntil('\n');
         cmd.trim();
@@ -182,6 +503,11 @@ void loop() {
             Serial.print(F("Lock Status: "));
             Serial.println(digitalRead(ADF4351_LD) ? "Locked" : "Unlocked");
         }
+        else if (cmd == "BIN") {
+            // Quiet binary frames until CMD_TEXT
+            Serial.println(F("OK BIN"));
+            binary_mode = true;
+        }
     }
 }
 // A Project By Akash Chohan
\ No newline at end of file
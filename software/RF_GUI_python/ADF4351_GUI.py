@@ -5,7 +5,12 @@ import serial.tools.list_ports
 import time
 from tkinter import messagebox
 import threading
-from datetime import datetime
+import logging
+import queue
+from adf4351_protocol import ProtocolError
+from rf_source import ADF4351SerialSource
+from sweep_engine import SweepEngine, sweep_frequencies
+from console_log import LEVELS, ConsoleLog
 
 class ModernButton(tk.Button):
     def __init__(self, master, **kwargs):
@@ -38,10 +43,17 @@ class RFGeneratorGUI:
         self.root.configure(bg="#F0F0F0")
         
         # Initialize variables
-        self.serial_port = None
+        self.source = None  # ADF4351SerialSource while connected
         self.is_connected = False
         self.sweep_running = False
         self.sweep_thread = None
+        # Sweeps run off the Tk thread and report back through its queue
+        self.sweep_engine = SweepEngine(self.sweep_step)
+        self.binary_mode = tk.BooleanVar(value=False)
+        self.lock_gated = tk.BooleanVar(value=False)  # Step on lock detect instead of a fixed dwell
+        # Console lines are buffered and flushed in batches; the full log goes to a file
+        self.console_log = ConsoleLog(max_lines=2000, path="adf4351_gui.log")
+        self.console_level = tk.StringVar(value="DEBUG")
         
         # Initialize UI elements as class attributes
         self.port_combo = None
@@ -51,9 +63,11 @@ class RFGeneratorGUI:
         self.stop_freq = None
         self.step_size = None
         self.dwell_time = None
+        self.settle_time = None
         self.sweep_btn = None
         self.status_label = None
         self.console = None
+        self.binary_check = None
         
         # Create main container with padding
         self.main_frame = tk.Frame(root, bg="#F0F0F0", padx=20, pady=20)
@@ -66,6 +80,8 @@ class RFGeneratorGUI:
         self.create_frequency_control()
         self.create_sweep_control()
         self.create_status_frame()
+        self.root.after(100, self.flush_console)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def create_title(self):
         title_label = tk.Label(
@@ -89,6 +105,27 @@ class RFGeneratorGUI:
         )
         console_frame.pack(fill=tk.BOTH, expand=True, side=tk.BOTTOM)
         
+        level_frame = tk.Frame(console_frame, bg="#F0F0F0")
+        level_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        tk.Label(
+            level_frame,
+            text="Show:",
+            font=("Segoe UI", 10),
+            bg="#F0F0F0"
+        ).pack(side=tk.LEFT, padx=5)
+        
+        level_combo = ttk.Combobox(
+            level_frame,
+            textvariable=self.console_level,
+            values=list(LEVELS),
+            state="readonly",
+            width=10,
+            font=("Segoe UI", 10)
+        )
+        level_combo.pack(side=tk.LEFT, padx=5)
+        level_combo.bind("<<ComboboxSelected>>", self.set_console_level)
+        
         self.console = tk.Text(
             console_frame,
             height=10,
@@ -98,6 +135,8 @@ class RFGeneratorGUI:
             wrap=tk.WORD
         )
         self.console.pack(fill=tk.BOTH, expand=True)
+        self.console.tag_configure("WARNING", foreground="#FFB300")
+        self.console.tag_configure("ERROR", foreground="#FF5252")
         
     def create_connection_frame(self):
         conn_frame = tk.LabelFrame(
@@ -142,6 +181,17 @@ class RFGeneratorGUI:
         )
         refresh_btn.pack(side=tk.LEFT, padx=5)
         
+        # Disabled while a sweep runs: the sweep thread owns the port
+        self.binary_check = tk.Checkbutton(
+            port_frame,
+            text="Binary protocol",
+            variable=self.binary_mode,
+            command=self.toggle_protocol,
+            font=("Segoe UI", 10),
+            bg="#F0F0F0"
+        )
+        self.binary_check.pack(side=tk.LEFT, padx=5)
+        
         self.refresh_ports()
         
     def create_frequency_control(self):
@@ -202,7 +252,8 @@ class RFGeneratorGUI:
             ("Start (MHz):", 0, 0),
             ("Stop (MHz):", 0, 2),
             ("Step (MHz):", 1, 0),
-            ("Dwell (ms):", 1, 2)
+            ("Dwell (ms):", 1, 2),
+            ("Settle (us):", 2, 0)
         ]
         
         for text, row, col in labels:
@@ -218,13 +269,24 @@ class RFGeneratorGUI:
         self.stop_freq = self.create_entry(sweep_frame, "4400", 0, 3)
         self.step_size = self.create_entry(sweep_frame, "100", 1, 1)
         self.dwell_time = self.create_entry(sweep_frame, "100", 1, 3)
+        self.settle_time = self.create_entry(sweep_frame, "50", 2, 1)
+        
+        # With lock gating, each step is held for the dwell once the PLL
+        # has locked and the settle margin has passed
+        tk.Checkbutton(
+            sweep_frame,
+            text="Wait for lock",
+            variable=self.lock_gated,
+            font=("Segoe UI", 10),
+            bg="#F0F0F0"
+        ).grid(row=2, column=2, columnspan=2, padx=5, pady=5)
         
         self.sweep_btn = ModernButton(
             sweep_frame,
             text="Start Sweep",
             command=self.toggle_sweep
         )
-        self.sweep_btn.grid(row=2, column=0, columnspan=4, pady=10)
+        self.sweep_btn.grid(row=3, column=0, columnspan=4, pady=10)
 
     def create_entry(self, parent, default_value, row, col):
         entry = tk.Entry(
@@ -259,9 +321,32 @@ class RFGeneratorGUI:
         self.status_label.pack()
 
     def log_debug(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.console.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.console.see(tk.END)
+        """Queue a console line; safe from any thread, shown on the next flush"""
+        self.console_log.log(message)
+
+    def set_console_level(self, event=None):
+        """Show lines at or above the chosen level from now on"""
+        self.console_log.level = LEVELS[self.console_level.get()]
+
+    def flush_console(self):
+        """Insert the buffered lines in one call and trim the console; runs on the Tk thread"""
+        lines = self.console_log.drain()
+        if lines:
+            chunks = []
+            for level, line in lines:
+                chunks += [line, logging.getLevelName(level)]
+            self.console.insert(tk.END, *chunks)
+            count = int(self.console.index("end-1c").split(".")[0])
+            if count > self.console_log.max_lines:
+                self.console.delete("1.0", f"{count - self.console_log.max_lines}.0")
+            self.console.see(tk.END)
+        self.root.after(100, self.flush_console)
+
+    def on_close(self):
+        self.sweep_running = False
+        self.sweep_engine.stop()
+        self.console_log.close()
+        self.root.destroy()
         
     def refresh_ports(self):
         ports = [port.device for port in serial.tools.list_ports.comports()]
@@ -274,21 +359,46 @@ class RFGeneratorGUI:
         if not self.is_connected:
             try:
                 port = self.port_combo.get()
-                self.serial_port = serial.Serial(port, 115200, timeout=1)
-                time.sleep(2)  # Wait for Arduino reset
+                source = ADF4351SerialSource(port, binary=False)
+                source.connect()
+                self.source = source
                 self.is_connected = True
                 self.connect_btn.configure(text="Disconnect")
                 self.status_label.configure(text="Connected", fg="#2E7D32")
                 self.log_debug(f"Connected to {port}")
+                self.toggle_protocol()
             except Exception as e:
                 self.log_debug(f"Connection error: {str(e)}")
                 messagebox.showerror("Error", f"Failed to connect: {str(e)}")
         else:
             self.disconnect()
             
+    def toggle_protocol(self):
+        """Switch between the text protocol and quiet binary frames"""
+        if not self.is_connected:
+            return
+        enabled = self.binary_mode.get()
+        if enabled == self.source.binary:
+            return
+        if self.sweep_running or self.sweep_engine.running or (self.sweep_thread and self.sweep_thread.is_alive()):
+            self.binary_mode.set(self.source.binary)
+            self.log_debug("Error: Stop the sweep before switching protocol")
+            return
+        try:
+            self.source.use_binary(enabled)
+            self.log_debug("Binary protocol enabled" if enabled else "Text protocol enabled")
+        except ProtocolError as e:
+            self.binary_mode.set(self.source.binary)
+            self.log_debug(f"Protocol error: {str(e)}")
+            messagebox.showerror("Error", f"Failed to switch protocol: {str(e)}")
+    
     def disconnect(self):
-        if self.serial_port:
-            self.serial_port.close()
+        if self.source is not None:
+            try:
+                self.source.disconnect()
+            except Exception as e:
+                self.log_debug(f"Protocol error: {str(e)}")
+            self.source = None
         self.is_connected = False
         self.connect_btn.configure(text="Connect")
         self.status_label.configure(text="Disconnected", fg="#D32F2F")
@@ -299,29 +409,32 @@ class RFGeneratorGUI:
             self.log_debug("Error: Not connected to device")
             messagebox.showerror("Error", "Please connect to device first")
             return
+        if self.sweep_running:
+            self.log_debug("Error: Stop the sweep before setting a frequency")
+            return
             
         try:
             freq = float(self.freq_entry.get())
             if 35 <= freq <= 4400:
-                command = f"FREQ:{freq:.3f}\n"
-                self.log_debug(f"Sending command: {command.strip()}")
-                self.serial_port.write(command.encode())
-                
-                # Read debug information
-                while True:
-                    response = self.serial_port.readline().decode().strip()
-                    if not response:
-                        break
-                    self.log_debug(f"Device response: {response}")
-                    if response == "OK":
-                        self.status_label.configure(
-                            text=f"Frequency set to {freq} MHz",
-                            fg="#2E7D32"
-                        )
-                        break
-                    elif response.startswith("ERROR"):
-                        messagebox.showerror("Error", response)
-                        break
+                if not self.source.binary:
+                    self.log_debug(f"Sending command: FREQ:{freq:.3f}")
+                result = self.source.set_frequency(freq * 1e6)
+                if self.source.binary:
+                    lock = "locked" if result["locked"] else "not locked"
+                    self.log_debug(
+                        f"Set {result['frequency'] / 1e6:.6f} MHz, {lock}, "
+                        f"round trip {result['rtt'] * 1e3:.2f} ms"
+                    )
+                else:
+                    for response in result["lines"]:
+                        self.log_debug(f"Device response: {response}")
+                if result["ok"]:
+                    self.status_label.configure(
+                        text=f"Frequency set to {freq} MHz",
+                        fg="#2E7D32"
+                    )
+                elif result["lines"][-1].startswith("ERROR"):
+                    messagebox.showerror("Error", result["lines"][-1])
             else:
                 self.log_debug("Error: Frequency out of range")
                 messagebox.showerror("Error", "Frequency must be between 35 and 4400 MHz")
@@ -339,50 +452,124 @@ class RFGeneratorGUI:
             return
             
         if not self.sweep_running:
+            if self.sweep_engine.running or (self.sweep_thread and self.sweep_thread.is_alive()):
+                self.log_debug("Error: Previous sweep is still finishing")
+                return
             try:
                 start = float(self.start_freq.get())
                 stop = float(self.stop_freq.get())
                 step = float(self.step_size.get())
                 dwell = float(self.dwell_time.get())
+                settle = float(self.settle_time.get()) / 1e6 if self.lock_gated.get() else None
                 
                 if not (35 <= start <= 4400 and 35 <= stop <= 4400):
                     self.log_debug("Error: Sweep frequencies out of range")
                     messagebox.showerror("Error", "Frequencies must be between 35 and 4400 MHz")
                     return
+                freqs = sweep_frequencies(start * 1e6, stop * 1e6, step * 1e6)
                     
                 self.sweep_running = True
                 self.sweep_btn.configure(text="Stop Sweep")
+                self.binary_check.configure(state=tk.DISABLED)
                 self.log_debug(f"Starting sweep: {start}MHz to {stop}MHz, step={step}MHz, dwell={dwell}ms")
                 
-                # Start sweep in separate thread
-                self.sweep_thread = threading.Thread(
-                    target=self.run_sweep,
-                    args=(start, stop, step, dwell)
-                )
-                self.sweep_thread.daemon = True
-                self.sweep_thread.start()
+                if self.source.binary:
+                    # The firmware steps the sweep; this thread only uploads and listens
+                    self.sweep_thread = threading.Thread(
+                        target=self.run_device_sweep,
+                        args=(freqs, dwell / 1000, settle)
+                    )
+                    self.sweep_thread.daemon = True
+                    self.sweep_thread.start()
+                else:
+                    self.sweep_engine.start(freqs, dwell / 1000, settle=settle)
+                self.root.after(50, self.poll_sweep)
             except ValueError:
                 self.log_debug("Error: Invalid sweep parameters")
                 messagebox.showerror("Error", "Invalid sweep parameters")
         else:
             self.sweep_running = False
+            self.sweep_engine.stop()
             self.sweep_btn.configure(text="Start Sweep")
             self.log_debug("Sweep stopped")
-            
-    def run_sweep(self, start, stop, step, dwell):
-        current = start
-        while current <= stop and self.sweep_running:
-            self.freq_entry.delete(0, tk.END)
-            self.freq_entry.insert(0, f"{current:.3f}")
-            self.set_frequency()
-            time.sleep(dwell / 1000)  # Convert ms to seconds
-            current += step
-            
+
+    def sweep_step(self, freq_hz):
+        """Retune for one sweep step; runs on the sweep thread"""
+        return self.source.set_frequency(freq_hz)
+
+    def poll_sweep(self):
+        """Apply the sweep progress messages on the Tk thread"""
+        finished = False
+        while True:
+            try:
+                message = self.sweep_engine.progress.get_nowait()
+            except queue.Empty:
+                break
+            if message["type"] == "step":
+                freq = message["frequency"] / 1e6
+                self.freq_entry.delete(0, tk.END)
+                self.freq_entry.insert(0, f"{freq:.3f}")
+                self.log_debug(f"Sending command: FREQ:{freq:.3f}")
+                for response in message["result"].get("lines", ()):
+                    self.log_debug(f"Device response: {response}")
+                if message["result"]["ok"]:
+                    self.status_label.configure(text=f"Frequency set to {freq:.3f} MHz", fg="#2E7D32")
+                if message["locked"] is False:
+                    self.log_debug(f"Warning: step {message['index']} at {freq:.3f} MHz not locked")
+            elif message["type"] == "log":
+                self.log_debug(message["message"])
+            elif message["type"] == "error":
+                self.log_debug(f"Sweep error: {message['message']}")
+            elif message["type"] == "done":
+                finished = True
+                if "timing" in message:
+                    timing = message["timing"]
+                    planned = "lock-gated" if message["gated"] else f"planned {message['planned']:.2f} s"
+                    self.log_debug(
+                        f"Sweep: {message['steps']} of {message['count']} steps in "
+                        f"{message['elapsed']:.2f} s ({planned}), "
+                        f"{message['unlocked']} not locked, "
+                        f"step timing error mean {timing['mean'] * 1e3:.2f} ms, "
+                        f"max {timing['max'] * 1e3:.2f} ms"
+                    )
+        if not finished:
+            self.root.after(50, self.poll_sweep)
+            return
+        self.binary_check.configure(state=tk.NORMAL)
         if self.sweep_running:
             self.sweep_running = False
-            self.root.after(0, lambda: self.sweep_btn.configure(text="Start Sweep"))
+            self.sweep_btn.configure(text="Start Sweep")
             self.log_debug("Sweep completed")
 
+    def run_device_sweep(self, freqs, dwell, settle=None):
+        """Hand the sweep to the source as one list and let the firmware step it"""
+        try:
+            self.source.set_frequency_list(freqs)
+            started = time.perf_counter()
+            steps = self.source.run_list(
+                dwell,
+                settle=settle,
+                should_stop=lambda: not self.sweep_running
+            )
+            elapsed = time.perf_counter() - started
+            # Every step carries the lock bit: read after the lock wait in a
+            # lock-gated sweep, at the end of the dwell in a timed one
+            unlocked = [step["frequency"] for step in steps if step["locked"] is False]
+            self.sweep_engine.post(
+                "log",
+                message=f"Device sweep: {len(steps)} of {len(freqs)} steps in {elapsed:.2f} s, "
+                        f"{len(unlocked)} reported unlocked"
+            )
+            if unlocked:
+                listed = ", ".join(f"{freq / 1e6:.3f}" for freq in unlocked[:10])
+                more = f" and {len(unlocked) - 10} more" if len(unlocked) > 10 else ""
+                self.sweep_engine.post("log", message=f"Warning: not locked at {listed} MHz{more}")
+        except Exception as e:
+            # Includes a lost port (SerialException, OSError); the GUI must still leave sweep mode
+            self.sweep_engine.post("error", message=str(e))
+        finally:
+            self.sweep_engine.post("done")
+
 def main():
     root = tk.Tk()
     app = RFGeneratorGUI(root)
@@ -0,0 +1,310 @@
+"""
+Adaptive coarse-to-fine ODMR frequency sweeps.
+
+A uniform start/stop/step grid spends most of its points on flat baseline.
+AdaptiveSweep measures a coarse grid first, then keeps adding points where
+the signal deviates from the baseline or bends, and finally fits a
+Lorentzian to every dip and measures around each fit until its centre is
+known to the requested precision. Measurement is a callback that takes a
+batch of frequencies (Hz) and returns the signal at each, so every pass can
+be run as one frequency list on the RF source:
+
+    sweep = AdaptiveSweep(measure, 35e6, 250e6, linewidth=4e6, precision=20e3)
+    result = sweep.run()
+    result["dips"]   # [{"center", "center_error", "fwhm", "depth"}, ...]
+
+    python adaptive_sweep.py   # adaptive vs uniform on synthetic Lorentzian dips
+"""
+import argparse
+import warnings
+import numpy as np
+from scipy.optimize import curve_fit, OptimizeWarning
+from sweep_engine import sweep_frequencies
+
+
+def lorentzian(freqs, center, fwhm, depth, baseline):
+    """Baseline with one Lorentzian dip of the given depth and full width"""
+    return baseline - depth / (1 + (2 * (freqs - center) / fwhm) ** 2)
+
+
+def synthetic_odmr(dips, baseline=1.0, noise=1e-3, seed=None):
+    """
+    Measurement callback returning Lorentzian dips plus white noise
+
+    Parameters:
+    dips: List of (center, fwhm, depth)
+    baseline: Signal far from resonance
+    noise: Standard deviation of the noise per point
+    """
+    rng = np.random.default_rng(seed)
+
+    def measure(freqs):
+        freqs = np.asarray(freqs, dtype=float)
+        signal = np.full(len(freqs), float(baseline))
+        for center, fwhm, depth in dips:
+            signal -= depth / (1 + (2 * (freqs - center) / fwhm) ** 2)
+        return signal + rng.normal(0, noise, len(freqs))
+
+    return measure
+
+
+def fit_dip(freqs, signal, guess, fwhm, baseline):
+    """
+    Least-squares Lorentzian fit to the points within 3 widths of guess
+
+    Returns a dict with center, center_error (1 sigma), fwhm, depth,
+    baseline and the number of points fitted, or None when the fit fails.
+    """
+    window = np.abs(freqs - guess) < 3 * fwhm
+    if window.sum() < 5:
+        return None
+    x, y = freqs[window], signal[window]
+    p0 = (guess, fwhm, max(baseline - y.min(), 1e-12), baseline)
+    try:
+        # An undetermined covariance comes back as inf and is rejected below
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", OptimizeWarning)
+            params, cov = curve_fit(lorentzian, x, y, p0=p0, maxfev=2000)
+    except (RuntimeError, ValueError):
+        return None
+    errors = np.sqrt(np.diag(cov))
+    center, width, depth, base = params
+    if not np.all(np.isfinite(errors)) or depth <= 0 or abs(center - guess) > 2 * fwhm:
+        return None
+    return {
+        "center": float(center),
+        "center_error": float(errors[0]),
+        "fwhm": float(abs(width)),
+        "depth": float(depth),
+        "baseline": float(base),
+        "points": int(window.sum()),
+    }
+
+
+class AdaptiveSweep:
+    """
+    Coarse pass, deviation/curvature refinement, then per-dip fit refinement
+
+    Parameters:
+    measure: Called with an array of frequencies (Hz), returns the signal
+    start, stop: Sweep range (Hz)
+    linewidth: Expected dip FWHM (Hz); sets the coarse step
+    precision: Target 1-sigma uncertainty of every dip centre (Hz)
+    resolution: Frequency grid of the source (Hz); new points snap to it
+    threshold: Significance, in noise sigmas, of a dip
+    refine_threshold: Deviation or curvature, in noise sigmas, that calls
+        for more points around it
+    max_points: Budget of measured points
+    """
+    def __init__(self, measure, start, stop, linewidth, precision, resolution=100e3,
+                 threshold=5.0, refine_threshold=2.5, max_points=2000):
+        self.measure = measure
+        self.start = start
+        self.stop = stop
+        self.linewidth = linewidth
+        self.precision = precision
+        self.resolution = resolution
+        self.threshold = threshold
+        self.refine_threshold = refine_threshold
+        self.max_points = max_points
+        self.freqs = np.empty(0)
+        self.signal = np.empty(0)
+        self.passes = []
+
+    def _snap(self, freqs):
+        freqs = np.round(np.asarray(freqs) / self.resolution) * self.resolution
+        return freqs[(freqs >= self.start) & (freqs <= self.stop)]
+
+    def _acquire(self, freqs, stage):
+        """Measure a batch, within the point budget; returns how many were measured"""
+        freqs = freqs[:max(0, self.max_points - len(self.freqs))]
+        if not len(freqs):
+            return 0
+        signal = np.asarray(self.measure(freqs), dtype=float)
+        self.freqs = np.concatenate([self.freqs, freqs])
+        self.signal = np.concatenate([self.signal, signal])
+        order = np.argsort(self.freqs, kind="stable")
+        self.freqs, self.signal = self.freqs[order], self.signal[order]
+        self.passes.append({"stage": stage, "points": len(freqs)})
+        return len(freqs)
+
+    def _noise(self):
+        """Baseline (median) and noise sigma (from point-to-point differences)"""
+        baseline = float(np.median(self.signal))
+        diffs = np.diff(self.signal)
+        sigma = 1.4826 * np.median(np.abs(diffs - np.median(diffs))) / np.sqrt(2)
+        return baseline, max(float(sigma), 1e-15)
+
+    def _refine_candidates(self, baseline, sigma):
+        """Midpoints of intervals whose ends deviate or bend by more than the threshold"""
+        # Repeated frequencies count once, with their mean
+        freqs, inverse = np.unique(self.freqs, return_inverse=True)
+        signal = np.bincount(inverse, self.signal) / np.bincount(inverse)
+        deviation = np.abs(signal - baseline) / sigma
+        score = np.maximum(deviation[:-1], deviation[1:])
+        if len(freqs) > 2:
+            curvature = np.abs(signal[:-2] - 2 * signal[1:-1] + signal[2:]) / (sigma * np.sqrt(6))
+            score[:-1] = np.maximum(score[:-1], curvature)
+            score[1:] = np.maximum(score[1:], curvature)
+        width = np.diff(freqs)
+        split = (score > self.refine_threshold) & (width > max(self.linewidth / 4, 2 * self.resolution))
+        return self._snap((freqs[:-1][split] + freqs[1:][split]) / 2)
+
+    def _find_dips(self, baseline, sigma):
+        """
+        Dip positions: the deepest points of the signal averaged over half a
+        linewidth, where that average is threshold sigmas below baseline,
+        at least one linewidth apart
+        """
+        half = self.linewidth / 4
+        lo = np.searchsorted(self.freqs, self.freqs - half)
+        hi = np.searchsorted(self.freqs, self.freqs + half, side="right")
+        sums = np.concatenate([[0.0], np.cumsum(self.signal)])
+        count = hi - lo
+        mean = (sums[hi] - sums[lo]) / count
+        significance = (baseline - mean) / (sigma / np.sqrt(count))
+        guesses = []
+        for i in np.argsort(mean):
+            if significance[i] < self.threshold:
+                continue
+            if all(abs(self.freqs[i] - guess) >= self.linewidth for guess in guesses):
+                guesses.append(float(self.freqs[i]))
+        return sorted(guesses)
+
+    def _fit_dips(self, baseline, sigma):
+        """Fit every dip; fits that converge on the same dip count once, the best one"""
+        fits = [fit_dip(self.freqs, self.signal, guess, self.linewidth, baseline)
+                for guess in self._find_dips(baseline, sigma)]
+        dips = []
+        for fit in sorted((fit for fit in fits if fit is not None), key=lambda fit: fit["center_error"]):
+            if all(abs(fit["center"] - dip["center"]) >= self.linewidth / 2 for dip in dips):
+                dips.append(fit)
+        return sorted(dips, key=lambda dip: dip["center"])
+
+    def run(self, fine_batch=8, max_passes=50):
+        """
+        Run the sweep
+
+        Parameters:
+        fine_batch: Fewest points added around a dip per fit pass
+        max_passes: Limit on refinement passes and on fit passes
+
+        Returns a dict with the measured frequencies and signal (sorted), the
+        fitted dips, the baseline, the noise sigma, the points per pass and
+        converged. Each dip has converged set when its fitted centre error
+        (1 sigma, from the fit covariance) reached the precision; the
+        result's converged is True when every dip did. A dip stops short of
+        the precision only when max_points or max_passes runs out.
+        """
+        self._acquire(self._snap(sweep_frequencies(self.start, self.stop, self.linewidth)), "coarse")
+        baseline, sigma = self._noise()
+
+        for _ in range(max_passes):
+            new = self._refine_candidates(baseline, sigma)
+            new = new[~np.isin(new, self.freqs)]
+            if not len(new) or not self._acquire(new, "refine"):
+                break
+
+        # Fit each dip and measure where the centre is most sensitive, around
+        # the steepest points of the Lorentzian at +-fwhm / (2 sqrt 3), until
+        # every centre is known to the requested precision. The error falls
+        # as 1 / sqrt(points), which sizes each batch
+        dips = self._fit_dips(baseline, sigma)
+        for _ in range(max_passes):
+            open_dips = [dip for dip in dips if dip["center_error"] > self.precision]
+            if not open_dips:
+                break
+            new = []
+            for dip in open_dips:
+                needed = dip["points"] * ((dip["center_error"] / self.precision) ** 2 - 1)
+                count = max(fine_batch, int(np.ceil(needed / 2)))
+                offsets = np.linspace(-1, 1, count) / np.sqrt(3)
+                new.append(dip["center"] + offsets * dip["fwhm"] / 2)
+            new = np.concatenate(new)
+            if not self._acquire(self._snap(new), "fit"):
+                break
+            dips = self._fit_dips(baseline, sigma)
+        for dip in dips:
+            dip["converged"] = dip["center_error"] <= self.precision
+
+        return {
+            "frequencies": self.freqs,
+            "signal": self.signal,
+            "dips": dips,
+            "baseline": baseline,
+            "sigma": sigma,
+            "passes": self.passes,
+            "converged": all(dip["converged"] for dip in dips),
+        }
+
+
+def uniform_sweep(measure, start, stop, count, linewidth, threshold=5.0):
+    """Uniform grid of count points with the same dip detection and fits, for comparison"""
+    sweep = AdaptiveSweep(measure, start, stop, linewidth, precision=0.0, resolution=1.0,
+                          threshold=threshold, max_points=count)
+    sweep._acquire(np.linspace(start, stop, count), "uniform")
+    baseline, sigma = sweep._noise()
+    return {"frequencies": sweep.freqs, "dips": sweep._fit_dips(baseline, sigma)}
+
+
+def center_errors(dips, true_centers):
+    """Error of the fitted centre nearest to each true centre (inf if missed)"""
+    centers = np.array([dip["center"] for dip in dips])
+    if not len(centers):
+        return np.full(len(true_centers), np.inf)
+    return np.array([np.min(np.abs(centers - c)) for c in true_centers])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive vs uniform ODMR sweep on synthetic dips")
+    parser.add_argument("--precision", type=float, default=20.0, help="Target dip centre precision (kHz)")
+    parser.add_argument("--noise", type=float, default=1e-3, help="Noise sigma per point (of a baseline of 1)")
+    parser.add_argument("--trials", type=int, default=40)
+    args = parser.parse_args()
+
+    # Two SiC-like resonances on a 35-250 MHz span
+    dips = [(70.3e6, 4e6, 0.02), (141.1e6, 5e6, 0.012)]
+    start, stop, linewidth = 35e6, 250e6, 4e6
+    true_centers = [center for center, fwhm, depth in dips]
+    precision = args.precision * 1e3
+
+    points, errors, reported, converged = [], [], [], 0
+    for trial in range(args.trials):
+        sweep = AdaptiveSweep(synthetic_odmr(dips, noise=args.noise, seed=trial),
+                              start, stop, linewidth, precision)
+        result = sweep.run()
+        points.append(len(result["frequencies"]))
+        errors.append(center_errors(result["dips"], true_centers))
+        reported.append([min(result["dips"], key=lambda dip: abs(dip["center"] - c))["center_error"]
+                         if result["dips"] else np.inf for c in true_centers])
+        converged += result["converged"]
+    errors = np.array(errors)
+    rms = np.sqrt(np.mean(errors ** 2, axis=0))
+    print(f"Adaptive: {np.mean(points):.0f} points on average, centre RMS error "
+          + ", ".join(f"{e / 1e3:.1f} kHz" for e in rms))
+    print(f"  fit 1 sigma (mean) "
+          + ", ".join(f"{e / 1e3:.1f} kHz" for e in np.mean(reported, axis=0))
+          + f", precision reached in {converged} of {args.trials} trials")
+    print("  passes of the last trial: "
+          + ", ".join(f"{p['stage']} {p['points']}" for p in result["passes"]))
+
+    # Smallest uniform grid (in 10% steps) that does as well on every dip
+    target = rms
+    count = 64
+    while True:
+        errors = np.array([
+            center_errors(uniform_sweep(synthetic_odmr(dips, noise=args.noise, seed=1000 + trial),
+                                        start, stop, count, linewidth)["dips"], true_centers)
+            for trial in range(args.trials)
+        ])
+        rms = np.sqrt(np.mean(errors ** 2, axis=0))
+        if np.all(rms <= target):
+            break
+        count = int(count * 1.1)
+    print(f"Uniform:  {count} points ({(stop - start) / (count - 1) / 1e3:.1f} kHz step) for centre RMS error "
+          + ", ".join(f"{e / 1e3:.1f} kHz" for e in rms))
+    print(f"Adaptive uses {count / np.mean(points):.1f}x fewer RF steps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Virtual ADF4351 board on a pseudo-terminal.
+
+VirtualADF4351 opens a pty pair and answers on it like an Arduino running
+Final_Code_ADF4351.ino: the FREQ:/STATUS text commands with their DEBUG:,
+OK and ERROR replies, and the binary protocol after BIN. The device behind
+it is a SimulatedADF4351 with serial line, sketch and PLL lock timing
+switched on, so anything that opens a serial port - ADF4351_GUI.py,
+adf4351_protocol.py, a terminal program - can be run against it on a Linux
+box without hardware, and the registers it programmed inspected afterwards.
+
+    python adf4351_emulator.py              # print the port name and serve it
+    python adf4351_emulator.py --check      # frequency to register checks
+    python adf4351_emulator.py --bench      # retune and sweep throughput
+"""
+import argparse
+import os
+import select
+import threading
+import time
+import tty
+import numpy as np
+import serial
+from adf4351_registers import REF_FREQ, VCO_MIN, VCO_MAX, OUTPUT_DIVIDERS, ADF4351Registers
+from adf4351_protocol import TextProtocol, BinaryProtocol, measure_rtt
+from adf4351_sim import SimulatedADF4351
+
+
+class VirtualADF4351:
+    """
+    SimulatedADF4351 served on the slave side of a pty
+
+    Parameters:
+    baud: Serial line rate the device keeps time with
+    lock_time: Time (s) lock detect stays low after an R0 write
+    lock_time_per_ghz: Extra lock time per GHz of VCO frequency change
+    locked: Whether the PLL can lock at all
+    """
+    def __init__(self, baud=115200, lock_time=250e-6, lock_time_per_ghz=500e-6, locked=True):
+        self.device = SimulatedADF4351(
+            timeout=0.1,
+            locked=locked,
+            baud=baud,
+            lock_time=lock_time,
+            lock_time_per_ghz=lock_time_per_ghz,
+            firmware_delays=True
+        )
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.running = False
+        self.threads = []
+
+    def start(self):
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._host_to_device, daemon=True),
+            threading.Thread(target=self._device_to_host, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.device.close()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _host_to_device(self):
+        while self.running:
+            readable, _, _ = select.select([self.master], [], [], 0.1)
+            if readable:
+                self.device.write(os.read(self.master, 4096))
+
+    def _device_to_host(self):
+        # read() returns each byte when the line rate says it has arrived
+        while self.running:
+            data = self.device.read(1)
+            if data:
+                os.write(self.master, data + self.device.read(self.device.in_waiting))
+
+
+def open_port(emulator, timeout=1):
+    """Open the emulator's port as the GUI opens the Arduino's"""
+    port = serial.Serial(emulator.port, 115200, timeout=timeout)
+    time.sleep(0.05)
+    port.reset_input_buffer()
+    return port
+
+
+def rf_divider(freq_hz):
+    """Smallest RF divider that puts the VCO at or above its 2200 MHz minimum"""
+    return next(d for d in OUTPUT_DIVIDERS if freq_hz * d >= VCO_MIN or d == OUTPUT_DIVIDERS[-1])
+
+
+def expected_frequency(freq_hz, step):
+    """
+    Output frequency the ADF4351 should give for a request, from the
+    datasheet arithmetic alone (no register code)
+
+    The VCO moves in steps of step Hz: the 25 MHz PFD for integer-N, which
+    truncates as calculateR0() does, or the channel spacing for
+    fractional-N, which rounds to nearest.
+    """
+    divider = rf_divider(freq_hz)
+    vco = freq_hz * divider
+    if step == REF_FREQ:
+        n = vco // step
+    else:
+        n = np.floor(vco / step + 0.5)
+    return n * step / divider
+
+
+def check_mapping(emulator, count=200, seed=0):
+    """
+    Set random frequencies over the pty and compare the output frequencies
+
+    The frequency decoded from the words the chip received must match
+    expected_frequency(): integer-N on the 25 MHz PFD grid in text mode,
+    the 100 kHz VCO grid of the host register model in binary mode.
+    calculateR0() computes the VCO frequency in uint32, so text requests
+    whose VCO frequency reaches 2^32 Hz (the top of the divider-1, -2 and
+    -4 ranges) are counted apart as overflow.
+
+    Returns a dict per mode with the count of frequencies that differ from
+    the expected one, the count missed by more than the mode's resolution
+    (one integer-N step in text mode, half a channel in binary mode) and
+    the largest error from the request (Hz); for text mode also the
+    overflow requests and how many of them came out wrong.
+    """
+    device = emulator.device
+    model = ADF4351Registers()
+    # The text command carries the frequency in kHz
+    freqs = np.round(np.random.default_rng(seed).uniform(35e6, 4400e6, count) / 1e3) * 1e3
+    results = {}
+
+    port = open_port(emulator)
+    try:
+        text = TextProtocol(port)
+        wrong = 0
+        overflow = 0
+        overflow_wrong = 0
+        outside = 0
+        errors = []
+        for freq in freqs:
+            reply = text.set_frequency(freq)
+            # The firmware parses the MHz value as a float
+            freq_hz = int(np.float32(freq / 1e6) * np.float32(1e6))
+            missed = not reply["ok"] or abs(device.frequency - expected_frequency(freq_hz, REF_FREQ)) > 1e-3
+            if freq_hz * rf_divider(freq_hz) >= 2 ** 32:
+                overflow += 1
+                overflow_wrong += missed
+                continue
+            wrong += missed
+            error = abs(device.frequency - freq)
+            if error >= REF_FREQ / rf_divider(freq_hz):
+                outside += 1
+            errors.append(error)
+        results["text"] = {"count": count, "wrong": wrong, "outside": outside,
+                           "max_error": max(errors), "overflow": overflow,
+                           "overflow_wrong": overflow_wrong}
+
+        binary = BinaryProtocol(port, model)
+        binary.enter()
+        wrong = 0
+        outside = 0
+        errors = []
+        try:
+            for freq in freqs:
+                binary.set_frequency(freq)
+                if abs(device.frequency - expected_frequency(freq, model.channel_spacing)) > 1e-3:
+                    wrong += 1
+                error = abs(device.frequency - freq)
+                if error > model.channel_spacing / 2 + 1e-3:
+                    outside += 1
+                errors.append(error)
+        finally:
+            binary.leave()
+        results["binary"] = {"count": count, "wrong": wrong, "outside": outside,
+                             "max_error": max(errors)}
+    finally:
+        port.close()
+    return results
+
+
+def benchmark(emulator, count=100, dwell=0.001, start=2150e6, step=1e6, settle=50e-6):
+    """
+    Retune round trip and sweep throughput through the pty
+
+    The host-driven sweep loops like ADF4351_GUI.run_sweep() in text mode:
+    the round trip is the time the sweep thread is blocked per step. The
+    default sweep crosses the RF divider change at 2200 MHz, where the VCO
+    jumps by 2.2 GHz. The timed device sweep holds each step for the dwell
+    plus the worst-case lock time, as a fixed dwell must; the lock-gated one
+    holds it for the dwell after lock plus settle.
+
+    Returns a dict of results, times in seconds.
+    """
+    device = emulator.device
+    worst_lock = device.lock_time + device.lock_time_per_ghz * (VCO_MAX - VCO_MIN) / 1e9
+    freqs = start + step * np.arange(count)
+    results = {}
+
+    port = open_port(emulator)
+    try:
+        text = TextProtocol(port)
+        results["text_rtt"] = measure_rtt(text, freqs)
+
+        started = time.perf_counter()
+        for freq in freqs:
+            text.set_frequency(freq)
+            time.sleep(dwell)
+        results["text_sweep"] = {"steps": count, "elapsed": time.perf_counter() - started}
+
+        binary = BinaryProtocol(port)
+        binary.enter()
+        try:
+            results["binary_rtt"] = measure_rtt(binary, freqs)
+            locked = [binary.set_frequency(freq)["locked"] for freq in freqs[:10]]
+            results["binary_locked_on_ack"] = sum(locked) / len(locked)
+
+            table = binary.model.sweep_table(freqs)
+            for mode, options in (("device_sweep", {"dwell": dwell + worst_lock}),
+                                  ("gated_sweep", {"dwell": dwell, "settle": settle})):
+                started = time.perf_counter()
+                steps = binary.run_sweep(table["registers"], **options)
+                results[mode] = {
+                    "steps": len(steps),
+                    "elapsed": time.perf_counter() - started,
+                    "unlocked": sum(1 for index, locked in steps if not locked),
+                }
+                assert abs(device.frequency - table["actual"][-1]) < 1e-3
+        finally:
+            binary.leave()
+    finally:
+        port.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual ADF4351 board on a pseudo-terminal")
+    parser.add_argument("--baud", type=int, default=115200, help="Line rate the device keeps time with")
+    parser.add_argument("--lock-time", type=float, default=250.0, help="PLL lock time after an R0 write (us)")
+    parser.add_argument("--lock-time-per-ghz", type=float, default=500.0,
+                        help="Extra lock time per GHz of VCO change (us)")
+    parser.add_argument("--unlocked", action="store_true", help="Hold lock detect low")
+    parser.add_argument("--check", action="store_true", help="Check frequency to register mapping")
+    parser.add_argument("--bench", action="store_true", help="Measure retune and sweep throughput")
+    parser.add_argument("--count", type=int, default=100, help="Frequencies per check or benchmark")
+    parser.add_argument("--dwell", type=float, default=1.0, help="Sweep dwell time (ms)")
+    parser.add_argument("--settle", type=float, default=50.0, help="Settle margin after lock (us)")
+    args = parser.parse_args()
+
+    emulator = VirtualADF4351(
+        baud=args.baud,
+        lock_time=args.lock_time * 1e-6,
+        lock_time_per_ghz=args.lock_time_per_ghz * 1e-6,
+        locked=not args.unlocked
+    )
+    with emulator:
+        if args.check:
+            for mode, result in check_mapping(emulator, args.count).items():
+                print(f"{mode:6s} {result['count']} frequencies: {result['wrong']} not at the "
+                      f"expected frequency, {result['outside']} outside resolution, "
+                      f"max frequency error {result['max_error'] / 1e6:.6f} MHz")
+                if "overflow" in result:
+                    print(f"       {result['overflow']} in the uint32 overflow ranges, "
+                          f"{result['overflow_wrong']} of them programmed wrong")
+        if args.bench:
+            results = benchmark(emulator, args.count, args.dwell / 1000, settle=args.settle * 1e-6)
+            for mode in ("text_rtt", "binary_rtt"):
+                stats = results[mode]
+                print(f"{mode:10s} mean {stats['mean'] * 1e3:6.2f} ms, p95 {stats['p95'] * 1e3:6.2f} ms, "
+                      f"max {stats['max'] * 1e3:6.2f} ms")
+            print(f"Binary acks reporting lock: {results['binary_locked_on_ack']:.0%}")
+            for mode in ("text_sweep", "device_sweep", "gated_sweep"):
+                stats = results[mode]
+                unlocked = f", {stats['unlocked']} reported unlocked" if "unlocked" in stats else ""
+                print(f"{mode:12s} {stats['steps']} steps at {args.dwell} ms dwell: "
+                      f"{stats['elapsed']:.3f} s, {stats['steps'] / stats['elapsed']:.0f} steps/s{unlocked}")
+        if not (args.check or args.bench):
+            print(f"Virtual ADF4351 on {emulator.port} (Ctrl+C to stop)")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+
+
+if __name__ == "__main__":
+    main()
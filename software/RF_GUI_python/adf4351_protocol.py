@@ -0,0 +1,435 @@
+"""
+Serial protocols of the ADF4351 firmware (Final_Code_ADF4351.ino).
+
+TextProtocol speaks the original line protocol (FREQ:<MHz>, STATUS) whose
+DEBUG: replies are useful when debugging but cost milliseconds of serial
+traffic per retune. BinaryProtocol switches the firmware into its quiet
+binary mode with the BIN command and then sends fixed-size frames:
+
+    SYNC (0xA5), CMD, SEQ, payload (fixed size per command), XOR of CMD..payload
+
+    CMD_STATUS  no payload
+    CMD_REGS    R0..R5, 4 bytes each, big-endian
+    CMD_TABLE   index (2 bytes), table entry (4 bytes)
+    CMD_INDEX   index (2 bytes): program a table entry
+    CMD_TEXT    no payload: back to the text protocol
+    CMD_SWEEP   first index (2), count (2), dwell in us (4), flags (1)
+    CMD_STOP    no payload: stop a running sweep
+    CMD_SWEEP_LOCK  first index (2), count (2), dwell, settle and lock
+                timeout in us (4 each), flags (1): lock-gated sweep
+
+The firmware answers every frame with one ack byte (bit 7 set, bit 0 PLL
+lock, bit 1 error, bit 2 sweep running), followed by SEQ when bit 7 of CMD
+asks for it. The register words are computed on the host with
+adf4351_registers.
+
+A device-resident sweep steps through table entries on the firmware's own
+clock, pulses the SWEEP_SYNC pin at every step and sends 3-byte events
+(EVT_STEP with the step index, EVT_DONE with the step count, each with the
+lock bit), so the host only starts it and monitors it. In a timed sweep a
+step's event is sent at the end of its dwell, so its lock bit tells whether
+the step was locked while held:
+
+    protocol.run_sweep(model.sweep_table(freqs)["registers"], dwell=0.01)
+
+A lock-gated sweep (settle given) does not step on a fixed period: each
+step waits for the lock detect pin, at most lock_timeout, then the settle
+margin, and only then pulses SWEEP_SYNC, reports the step and holds it for
+the dwell. Steps that timed out are reported unlocked:
+
+    protocol.run_sweep(registers, dwell=0.001, settle=50e-6, lock_timeout=5e-3)
+
+Round-trip time per retune in both modes:
+
+    python adf4351_protocol.py --port /dev/ttyUSB0 --count 100
+"""
+import argparse
+import collections
+import time
+import numpy as np
+import serial
+from adf4351_registers import ADF4351Registers, unpack_register
+
+SYNC = 0xA5
+SEQ_FLAG = 0x80
+CMD_STATUS = 0x00
+CMD_REGS = 0x01
+CMD_TABLE = 0x02
+CMD_INDEX = 0x03
+CMD_TEXT = 0x04
+CMD_SWEEP = 0x05
+CMD_STOP = 0x06
+CMD_SWEEP_LOCK = 0x07
+PAYLOAD_SIZES = {CMD_STATUS: 0, CMD_REGS: 24, CMD_TABLE: 6, CMD_INDEX: 2, CMD_TEXT: 0,
+                 CMD_SWEEP: 9, CMD_STOP: 0, CMD_SWEEP_LOCK: 17}
+
+ACK = 0x80
+ACK_LOCKED = 0x01
+ACK_ERROR = 0x02
+ACK_SWEEPING = 0x04
+
+SWEEP_REPEAT = 0x01
+SWEEP_REPORT = 0x02
+EVT_STEP = 0xC0
+EVT_DONE = 0xD0
+EVENT_SIZE = 3
+
+TABLE_SIZE = 128
+DIVIDER_SELECT_MASK = 7 << 20  # RF divider select in R4
+
+
+class ProtocolError(Exception):
+    """The device did not answer, or answered with an error"""
+
+
+def encode_frame(cmd, payload=b"", seq=None):
+    """One binary frame; a seq number (0-255) asks the device to echo it"""
+    if len(payload) != PAYLOAD_SIZES[cmd]:
+        raise ValueError(f"Command 0x{cmd:02X} takes {PAYLOAD_SIZES[cmd]} payload bytes")
+    if seq is not None:
+        cmd |= SEQ_FLAG
+    body = bytes([cmd, (seq or 0) & 0xFF]) + bytes(payload)
+    check = 0
+    for b in body:
+        check ^= b
+    return bytes([SYNC]) + body + bytes([check])
+
+
+def table_entry(words):
+    """
+    Pack the per-frequency part of a register set into one table entry
+
+    The firmware keeps R1-R3 and R5 from the last CMD_REGS; per entry it
+    needs R0 and the RF divider select from R4, which goes into the R0
+    control bits (always 0 in R0).
+    """
+    divider_select = unpack_register(words[4])[1]["divider_select"]
+    return (int(words[0]) & ~7) | divider_select
+
+
+def check_table(registers):
+    """
+    ValueError unless every entry shares R1-R3, R5 and R4 apart from the
+    RF divider select, the registers a table entry does not carry
+    """
+    registers = np.asarray(registers, dtype=np.int64)
+    common = registers[:, [1, 2, 3, 4, 5]]
+    common[:, 3] &= ~DIVIDER_SELECT_MASK
+    differ = np.any(common != common[0], axis=0)
+    if differ.any():
+        names = ", ".join(f"R{n}" for n in np.array([1, 2, 3, 4, 5])[differ])
+        raise ValueError(f"Table entries differ in {names}, which the firmware keeps from the "
+                         f"first entry (a model with reduce_fraction gives each entry its own MOD)")
+
+
+class TextProtocol:
+    """
+    The original FREQ:/STATUS line protocol
+
+    Parameters:
+    port: Open serial port (or any object with write/readline)
+    log: Called with every line the device sends, e.g. the GUI console
+    """
+    def __init__(self, port, log=None):
+        self.port = port
+        self.log = log
+
+    def _lines(self):
+        """Device lines until the read timeout"""
+        while True:
+            line = self.port.readline().decode(errors="replace").strip()
+            if not line:
+                return
+            if self.log is not None:
+                self.log(line)
+            yield line
+
+    def set_frequency(self, freq_hz):
+        """
+        Send FREQ: and wait for OK or ERROR
+
+        Returns a dict with ok, locked, rtt (s) and the reply lines.
+        """
+        started = time.perf_counter()
+        self.port.write(f"FREQ:{freq_hz / 1e6:.3f}\n".encode())
+        lines = []
+        result = {"ok": False, "locked": False}
+        for line in self._lines():
+            lines.append(line)
+            if line.startswith("DEBUG: PLL Lock Status:"):
+                result["locked"] = line.endswith(" Locked")
+            elif line == "OK":
+                result["ok"] = True
+                break
+            elif line.startswith("ERROR"):
+                break
+        result["rtt"] = time.perf_counter() - started
+        result["lines"] = lines
+        if not lines:
+            raise ProtocolError("no reply to FREQ command")
+        return result
+
+    def status(self):
+        """Frequency (Hz) and lock state from the STATUS command"""
+        self.port.write(b"STATUS\n")
+        status = {}
+        for line in self._lines():
+            if line.startswith("Frequency:"):
+                status["frequency"] = float(line.split()[1]) * 1e6
+            elif line.startswith("Lock Status:"):
+                status["locked"] = line.endswith(" Locked")
+                break
+        return status
+
+
+class BinaryProtocol:
+    """
+    Quiet fixed-size binary frames with a one-byte ack
+
+    Parameters:
+    port: Open serial port
+    model: ADF4351Registers used to compute the register words
+    sequence: Ask the device to echo a sequence number with every ack
+    """
+    def __init__(self, port, model=None, sequence=True):
+        self.port = port
+        self.model = model if model is not None else ADF4351Registers()
+        self.sequence = sequence
+        self.seq = 0
+        self.last_rtt = None
+        self.active = False
+        # Sweep events received so far, and an event cut off mid-read
+        self.events = collections.deque()
+        self._partial = bytearray()
+
+    def enter(self):
+        """Switch the firmware from the text protocol to binary frames"""
+        self.port.reset_input_buffer()
+        self.port.write(b"BIN\n")
+        deadline = time.perf_counter() + 2.0
+        while time.perf_counter() < deadline:
+            line = self.port.readline().decode(errors="replace").strip()
+            if line == "OK BIN":
+                self.active = True
+                return
+        raise ProtocolError("device did not enter binary mode (firmware without BIN support?)")
+
+    def leave(self):
+        """Return the firmware to the text protocol"""
+        if self.active:
+            self.send(CMD_TEXT)
+            self.active = False
+
+    def send(self, cmd, payload=b""):
+        """
+        Send one frame and wait for its ack
+
+        Returns the ack byte. Raises ProtocolError on a missing, mismatched
+        or error ack.
+        """
+        seq = None
+        if self.sequence:
+            self.seq = (self.seq + 1) & 0xFF
+            seq = self.seq
+        frame = encode_frame(cmd, payload, seq)
+        started = time.perf_counter()
+        self.port.write(frame)
+        ack = self._read_ack()
+        echoed = self.port.read(1) if seq is not None and ack is not None else b""
+        self.last_rtt = time.perf_counter() - started
+
+        if ack is None:
+            raise ProtocolError(f"no ack for command 0x{cmd:02X}")
+        if not ack & ACK:
+            raise ProtocolError(f"unexpected reply byte 0x{ack:02X} (device in text mode?)")
+        if seq is not None and (not echoed or echoed[0] != seq):
+            self.port.reset_input_buffer()
+            raise ProtocolError(f"sequence mismatch: sent {seq}, got {echoed.hex() or 'nothing'}")
+        if ack & ACK_ERROR:
+            raise ProtocolError(f"device rejected command 0x{cmd:02X}")
+        return ack
+
+    def _read_ack(self):
+        """Next ack byte, queueing any sweep events that arrive before it"""
+        if self._partial:
+            self._parse(self.port.read(EVENT_SIZE - len(self._partial)))
+        while True:
+            data = self.port.read(1)
+            if not data:
+                return None
+            if data[0] & 0xF0 not in (EVT_STEP, EVT_DONE):
+                return data[0]
+            self._parse(data + self.port.read(EVENT_SIZE - 1))
+
+    def _parse(self, data):
+        self._partial += data
+        while len(self._partial) >= EVENT_SIZE:
+            event = self._partial[:EVENT_SIZE]
+            del self._partial[:EVENT_SIZE]
+            self.events.append({
+                "done": event[0] & 0xF0 == EVT_DONE,
+                "index": (event[1] << 8) | event[2],
+                "locked": bool(event[0] & ACK_LOCKED),
+                "time": time.perf_counter(),
+            })
+
+    def read_events(self, timeout=0.0):
+        """
+        Sweep events received within timeout seconds
+
+        Returns a list of dicts with index (step index, or the step count
+        for the final event), locked, done and the host receive time.
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            waiting = self.port.in_waiting
+            if waiting:
+                self._parse(self.port.read(waiting))
+            if self.events or time.perf_counter() >= deadline:
+                break
+            time.sleep(0.0005)
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+    def write_registers(self, words):
+        """Program R0..R5; returns True if the PLL reported lock"""
+        payload = b"".join(int(word).to_bytes(4, "big") for word in words)
+        return bool(self.send(CMD_REGS, payload) & ACK_LOCKED)
+
+    def set_frequency(self, freq_hz):
+        """
+        Compute the registers on the host and program them
+
+        Returns a dict with ok, locked, rtt (s) and the actual frequency.
+        """
+        settings = self.model.solve(freq_hz)
+        locked = self.write_registers(settings["registers"])
+        return {"ok": True, "locked": locked, "rtt": self.last_rtt, "actual": settings["actual"]}
+
+    def load_table(self, registers):
+        """Upload an (N, 6) register table (see ADF4351Registers.sweep_table)"""
+        registers = np.asarray(registers)
+        if len(registers) > TABLE_SIZE:
+            raise ValueError(f"Table holds at most {TABLE_SIZE} entries")
+        check_table(registers)
+        # The common registers come from the first entry
+        self.write_registers(registers[0])
+        for index, words in enumerate(registers):
+            payload = index.to_bytes(2, "big") + table_entry(words).to_bytes(4, "big")
+            self.send(CMD_TABLE, payload)
+
+    def select(self, index):
+        """Program table entry index; returns True if the PLL reported lock"""
+        return bool(self.send(CMD_INDEX, int(index).to_bytes(2, "big")) & ACK_LOCKED)
+
+    def status(self):
+        ack = self.send(CMD_STATUS)
+        return {"locked": bool(ack & ACK_LOCKED), "sweeping": bool(ack & ACK_SWEEPING)}
+
+    def start_sweep(self, count, dwell, first=0, repeat=False, report=True, settle=None,
+                    lock_timeout=0.01):
+        """
+        Step through table entries first..first+count-1 on the device
+
+        dwell is the time per step in seconds, timed by the firmware. With
+        settle (s) the sweep is lock-gated and dwell is the hold time after
+        lock plus settle; lock_timeout (s) bounds the wait for lock.
+        """
+        if not 0 < count <= TABLE_SIZE - first:
+            raise ValueError(f"Sweep must lie within the {TABLE_SIZE}-entry table")
+        flags = (SWEEP_REPEAT if repeat else 0) | (SWEEP_REPORT if report else 0)
+        times = [dwell] if settle is None else [dwell, settle, lock_timeout]
+        payload = (int(first).to_bytes(2, "big") + int(count).to_bytes(2, "big")
+                   + b"".join(int(round(t * 1e6)).to_bytes(4, "big") for t in times)
+                   + bytes([flags]))
+        self.events.clear()
+        self.send(CMD_SWEEP if settle is None else CMD_SWEEP_LOCK, payload)
+
+    def stop_sweep(self):
+        self.send(CMD_STOP)
+
+    def run_sweep(self, registers, dwell, on_step=None, should_stop=None, settle=None,
+                  lock_timeout=0.01):
+        """
+        Run a whole sweep on the device, uploading longer tables in chunks
+
+        registers is an (N, 6) table as from ADF4351Registers.sweep_table.
+        on_step(index, locked) is called for every reported step (index over
+        the whole table). Returns a list of (index, locked) per step, or
+        stops early and returns what was done when should_stop() is true.
+        settle and lock_timeout make the sweep lock-gated, see start_sweep().
+        """
+        registers = np.asarray(registers)
+        check_table(registers)
+        steps = []
+        for offset in range(0, len(registers), TABLE_SIZE):
+            chunk = registers[offset:offset + TABLE_SIZE]
+            self.load_table(chunk)
+            self.start_sweep(len(chunk), dwell, settle=settle, lock_timeout=lock_timeout)
+            done = False
+            # Allow for the sweep itself plus serial and scheduling slack
+            step_time = dwell if settle is None else dwell + settle + lock_timeout
+            deadline = time.perf_counter() + len(chunk) * step_time + 2.0
+            while not done:
+                if should_stop is not None and should_stop():
+                    self.stop_sweep()
+                    return steps
+                if time.perf_counter() > deadline:
+                    raise ProtocolError("sweep did not finish in time")
+                for event in self.read_events(timeout=0.05):
+                    if event["done"]:
+                        done = True
+                        continue
+                    step = (offset + event["index"], event["locked"])
+                    steps.append(step)
+                    if on_step is not None:
+                        on_step(*step)
+        return steps
+
+
+def measure_rtt(protocol, frequencies):
+    """Round-trip time per retune in seconds: dict of mean, p50, p95 and max"""
+    rtts = np.array([protocol.set_frequency(freq)["rtt"] for freq in frequencies])
+    return {
+        "count": len(rtts),
+        "mean": float(rtts.mean()),
+        "p50": float(np.percentile(rtts, 50)),
+        "p95": float(np.percentile(rtts, 95)),
+        "max": float(rtts.max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare text and binary ADF4351 retune round-trip time")
+    parser.add_argument("--port", required=True, help="Serial port of the Arduino")
+    parser.add_argument("--baud", type=int, default=115200)
+    parser.add_argument("--count", type=int, default=100, help="Retunes per mode")
+    parser.add_argument("--start", type=float, default=2800.0, help="First frequency (MHz)")
+    parser.add_argument("--step", type=float, default=0.5, help="Step (MHz)")
+    args = parser.parse_args()
+
+    frequencies = (args.start + args.step * np.arange(args.count)) * 1e6
+    port = serial.Serial(args.port, args.baud, timeout=1)
+    try:
+        time.sleep(2)  # Wait for Arduino reset
+        port.reset_input_buffer()
+        text = TextProtocol(port)
+        binary = BinaryProtocol(port)
+        results = {"text": measure_rtt(text, frequencies)}
+        binary.enter()
+        try:
+            results["binary"] = measure_rtt(binary, frequencies)
+        finally:
+            binary.leave()
+    finally:
+        port.close()
+
+    for mode, stats in results.items():
+        print(f"{mode:6s} {stats['count']} retunes: mean {stats['mean'] * 1e3:7.2f} ms, "
+              f"p50 {stats['p50'] * 1e3:7.2f} ms, p95 {stats['p95'] * 1e3:7.2f} ms, "
+              f"max {stats['max'] * 1e3:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
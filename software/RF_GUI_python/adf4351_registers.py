@@ -0,0 +1,351 @@
+"""
+Register model of the ADF4351 wideband synthesizer.
+
+Computes the six 32-bit register words for an output frequency on the host,
+with fractional-N (INT + FRAC/MOD) resolution, output divider and band-select
+clock selection, so the firmware only has to shift precomputed words into the
+chip. ADF4351Registers.sweep_table() does this for a whole frequency list at
+once with NumPy, in exact integer arithmetic:
+
+    model = ADF4351Registers(channel_spacing=100e3)
+    table = model.sweep_table(np.arange(2.80e9, 2.95e9, 1e6))
+    table["registers"]   # (N, 6) uint32 words R0..R5 per frequency
+
+The defaults are the register settings of Final_Code_ADF4351.ino (25 MHz
+reference, R = 1, +5 dBm, digital lock detect on the LD pin).
+
+    python adf4351_registers.py 2112.6 --ref 10 --spacing 0.2 --reduce
+    python adf4351_registers.py --sweep 2800 2950 1
+    python adf4351_registers.py --check   # runs tests/test_adf4351_registers.py
+
+write_sequence() models which registers the firmware writes on a retune:
+only those that changed, R5 down to R1, then R0.
+"""
+import argparse
+import os
+import numpy as np
+
+
+REF_FREQ = 25e6
+FREQ_MIN = 35e6
+FREQ_MAX = 4.4e9
+VCO_MIN = 2.2e9
+VCO_MAX = 4.4e9
+MOD_MAX = 4095
+INT_MAX = 65535
+BAND_SELECT_MAX = 125e3
+OUTPUT_DIVIDERS = (1, 2, 4, 8, 16, 32, 64)
+OUTPUT_POWER_DBM = (-4, -1, 2, 5)
+
+# Words programmed by Final_Code_ADF4351.ino at start-up (R0..R5)
+FIRMWARE_REGISTERS = (0x00780000, 0x08008011, 0x00004E42, 0x000004B3, 0x00EC803C, 0x00580005)
+
+# (name, lowest bit, width) of every field, per register; DB2..DB0 hold the register number
+FIELDS = (
+    (("int", 15, 16), ("frac", 3, 12)),
+    (("phase_adjust", 28, 1), ("prescaler", 27, 1), ("phase", 15, 12), ("mod", 3, 12)),
+    (("noise_mode", 29, 2), ("muxout", 26, 3), ("ref_doubler", 25, 1), ("ref_div2", 24, 1),
+     ("r_counter", 14, 10), ("double_buffer", 13, 1), ("cp_current", 9, 4), ("ldf", 8, 1),
+     ("ldp", 7, 1), ("pd_polarity", 6, 1), ("power_down", 5, 1), ("cp_three_state", 4, 1),
+     ("counter_reset", 3, 1)),
+    (("band_select_mode", 23, 1), ("abp", 22, 1), ("charge_cancel", 21, 1), ("csr", 18, 1),
+     ("clk_div_mode", 15, 2), ("clock_divider", 3, 12)),
+    (("feedback_select", 23, 1), ("divider_select", 20, 3), ("band_select_div", 12, 8),
+     ("vco_power_down", 11, 1), ("mtld", 10, 1), ("aux_select", 9, 1), ("aux_enable", 8, 1),
+     ("aux_power", 6, 2), ("rf_enable", 5, 1), ("output_power", 3, 2)),
+    (("ld_pin_mode", 22, 2),),
+)
+R5_RESERVED = 3 << 19  # DB20..DB19 must be set
+
+
+def pack_register(number, fields):
+    """
+    Pack field values into one register word
+
+    Values may be ints or NumPy arrays (giving a uint32 array of words);
+    fields not given are zero.
+    """
+    word = np.uint64(number)
+    for name, lsb, width in FIELDS[number]:
+        value = fields.get(name, 0)
+        word = word | ((np.asarray(value, dtype=np.uint64) & np.uint64((1 << width) - 1)) << np.uint64(lsb))
+    if number == 5:
+        word = word | np.uint64(R5_RESERVED)
+    word = np.asarray(word).astype(np.uint32)
+    return int(word) if word.ndim == 0 else word
+
+
+def unpack_register(word):
+    """Split a register word into (register number, {field: value})"""
+    word = int(word)
+    number = word & 7
+    if number > 5:
+        raise ValueError(f"Not an ADF4351 register word: 0x{word:08X}")
+    return number, {name: (word >> lsb) & ((1 << width) - 1) for name, lsb, width in FIELDS[number]}
+
+
+def decode_registers(words):
+    """Fields of all six registers, keyed by register number"""
+    decoded = {}
+    for word in words:
+        number, fields = unpack_register(word)
+        decoded[number] = fields
+    return decoded
+
+
+def decode_frequency(words, ref_freq=REF_FREQ):
+    """Output frequency in Hz programmed by a set of R0..R5 words"""
+    r = decode_registers(words)
+    pfd = ref_freq * (1 + r[2]["ref_doubler"]) / (r[2]["r_counter"] * (1 + r[2]["ref_div2"]))
+    n = r[0]["int"] + r[0]["frac"] / r[1]["mod"]
+    divider = 1 << r[4]["divider_select"]
+    if r[4]["feedback_select"]:
+        return n * pfd / divider
+    return n * pfd
+
+
+class ADF4351Registers:
+    """
+    Frequency to register word conversion for one ADF4351 setup
+
+    Parameters:
+    ref_freq: Reference input frequency (Hz)
+    r_counter: Reference divider R (1-1023)
+    ref_doubler: Double the reference before the R counter
+    ref_div2: Divide the reference by 2 after the R counter
+    channel_spacing: Frequency resolution (Hz), sets MOD = PFD / channel_spacing
+    fractional: False for integer-N only (FRAC = 0), like the original firmware
+    reduce_fraction: Reduce FRAC/MOD by their GCD as in the datasheet examples.
+                     Off by default so MOD, and with it R1, stays the same over a sweep
+    feedback: "fundamental" (VCO) or "divided" (after the output divider)
+    output_power: 0-3 for -4, -1, +2 and +5 dBm
+    base_registers: R0..R5 words the remaining settings are taken from
+    """
+    def __init__(self, ref_freq=REF_FREQ, r_counter=None, ref_doubler=None, ref_div2=None,
+                 channel_spacing=100e3, fractional=True, reduce_fraction=False,
+                 feedback="fundamental", output_power=None, base_registers=FIRMWARE_REGISTERS):
+        self.fields = decode_registers(base_registers)
+        r2 = self.fields[2]
+        if r_counter is not None:
+            r2["r_counter"] = int(r_counter)
+        if ref_doubler is not None:
+            r2["ref_doubler"] = int(bool(ref_doubler))
+        if ref_div2 is not None:
+            r2["ref_div2"] = int(bool(ref_div2))
+        if output_power is not None:
+            self.fields[4]["output_power"] = int(output_power)
+        if feedback not in ("fundamental", "divided"):
+            raise ValueError(f"Unknown feedback path: {feedback}")
+        if not 1 <= r2["r_counter"] <= 1023:
+            raise ValueError(f"R counter out of range: {r2['r_counter']}")
+
+        self.ref_freq = float(ref_freq)
+        self.channel_spacing = float(channel_spacing)
+        self.fractional = fractional
+        self.reduce_fraction = reduce_fraction
+        self.feedback = feedback
+
+        # PFD as an exact fraction ref * (1 + D) / (R * (1 + T)) of integer Hz
+        self._pfd_num = int(round(self.ref_freq)) * (1 + r2["ref_doubler"])
+        self._pfd_den = r2["r_counter"] * (1 + r2["ref_div2"])
+        pfd_max = 45e6 if fractional else 90e6
+        if self.pfd > pfd_max:
+            raise ValueError(f"PFD frequency {self.pfd / 1e6:.3f} MHz above {pfd_max / 1e6:.0f} MHz")
+        self.mod = int(min(MOD_MAX, max(2, round(self.pfd / self.channel_spacing)))) if fractional else 2
+
+        # Lock detect and anti-backlash settings depend on the mode (datasheet, Register 2/3)
+        r2["ldf"] = 0 if fractional else 1
+        r2["ldp"] = 0 if fractional else 1
+        self.fields[3]["abp"] = 0 if fractional else 1
+        self.fields[3]["charge_cancel"] = 0 if fractional else 1
+        self.fields[4]["feedback_select"] = 1 if feedback == "fundamental" else 0
+        self.fields[4]["band_select_div"] = self.band_select_divider
+
+    @property
+    def pfd(self):
+        """Phase frequency detector frequency (Hz)"""
+        return self._pfd_num / self._pfd_den
+
+    @property
+    def band_select_divider(self):
+        """Smallest divider keeping the band-select clock at or below 125 kHz"""
+        return int(min(255, max(1, -(-self._pfd_num // int(self._pfd_den * BAND_SELECT_MAX)))))
+
+    @property
+    def band_select_clock(self):
+        return self.pfd / self.band_select_divider
+
+    @property
+    def int_min(self):
+        # 8/9 prescaler needs INT >= 75, 4/5 needs INT >= 23
+        return 75 if self.fields[1]["prescaler"] else 23
+
+    def sweep_table(self, frequencies):
+        """
+        Register words for every frequency (Hz), computed in one vectorized pass
+
+        Returns a dict of arrays: frequency (requested), actual, error,
+        divider, vco, int, frac, mod and registers, an (N, 6) uint32 array of
+        R0..R5. Raises ValueError naming the first frequency that cannot be set.
+        """
+        requested = np.atleast_1d(np.asarray(frequencies, dtype=np.float64))
+        freq = np.rint(requested).astype(np.int64)
+        bad = (freq < FREQ_MIN) | (freq > FREQ_MAX)
+        if bad.any():
+            raise ValueError(f"Frequency out of range: {requested[bad][0] / 1e6:.6f} MHz "
+                             f"(35-4400 MHz)")
+
+        # Smallest output divider bringing the VCO into 2.2-4.4 GHz
+        divider = np.ones_like(freq)
+        for _ in OUTPUT_DIVIDERS[1:]:
+            divider = np.where(freq * divider < VCO_MIN, divider * 2, divider)
+        vco = freq * divider
+        feedback = vco if self.feedback == "fundamental" else freq
+
+        # N = feedback / PFD, split into INT + FRAC/MOD with rounding to nearest
+        numerator = feedback * self._pfd_den
+        mod = np.full_like(freq, self.mod)
+        if self.fractional:
+            int_part = numerator // self._pfd_num
+            remainder = numerator % self._pfd_num
+            frac = (2 * remainder * mod + self._pfd_num) // (2 * self._pfd_num)
+            carry = frac >= mod
+            int_part = np.where(carry, int_part + 1, int_part)
+            frac = np.where(carry, 0, frac)
+            if self.reduce_fraction:
+                gcd = np.gcd(frac, mod)
+                frac //= gcd
+                mod = np.maximum(mod // gcd, 2)
+        else:
+            int_part = (2 * numerator + self._pfd_num) // (2 * self._pfd_num)
+            frac = np.zeros_like(freq)
+
+        bad = (int_part < self.int_min) | (int_part > INT_MAX)
+        if bad.any():
+            raise ValueError(f"INT = {int_part[bad][0]} out of range for "
+                             f"{requested[bad][0] / 1e6:.6f} MHz with a {self.pfd / 1e6:.3f} MHz PFD")
+
+        n = int_part + frac / mod
+        actual = n * self.pfd
+        if self.feedback == "fundamental":
+            actual = actual / divider
+
+        divider_select = np.log2(divider).astype(np.int64)
+        registers = np.empty((len(freq), 6), dtype=np.uint32)
+        registers[:, 0] = pack_register(0, {"int": int_part, "frac": frac})
+        registers[:, 1] = pack_register(1, dict(self.fields[1], mod=mod))
+        registers[:, 2] = pack_register(2, self.fields[2])
+        registers[:, 3] = pack_register(3, self.fields[3])
+        registers[:, 4] = pack_register(4, dict(self.fields[4], divider_select=divider_select))
+        registers[:, 5] = pack_register(5, self.fields[5])
+
+        return {
+            "frequency": requested,
+            "actual": actual,
+            "error": actual - requested,
+            "divider": divider,
+            "vco": n * self.pfd if self.feedback == "fundamental" else actual * divider,
+            "int": int_part,
+            "frac": frac,
+            "mod": mod,
+            "registers": registers,
+        }
+
+    def solve(self, frequency):
+        """Settings for one frequency (Hz) as a dict of plain numbers"""
+        table = self.sweep_table([frequency])
+        result = {key: value[0].item() for key, value in table.items() if key != "registers"}
+        result["registers"] = [int(word) for word in table["registers"][0]]
+        return result
+
+    def registers(self, frequency):
+        """R0..R5 words for one frequency (Hz)"""
+        return self.solve(frequency)["registers"]
+
+
+def firmware_calculate_r0(freq_hz):
+    """
+    Python port of calculateR0() in Final_Code_ADF4351.ino, including its
+    uint32_t arithmetic, for comparison. Returns (R0, R4).
+    """
+    freq_hz &= 0xFFFFFFFF
+    for limit, divider in ((68750000, 64), (137500000, 32), (275000000, 16),
+                           (550000000, 8), (1100000000, 4), (2200000000, 2)):
+        if freq_hz < limit:
+            break
+    else:
+        divider = 1
+    vco_freq = (freq_hz * divider) & 0xFFFFFFFF
+    int_value = vco_freq // 25000000
+    div_bits = OUTPUT_DIVIDERS.index(divider)
+    r4 = (FIRMWARE_REGISTERS[4] & ~(7 << 20)) | (div_bits << 20)
+    r0 = (int_value << 15) & 0xFFFFFFFF
+    return r0, r4
+
+
+def write_sequence(programmed, words):
+    """
+    Register numbers written to go from programmed to words, in order, as
+    programRegisters() in the firmware writes them
+
+    Registers that differ are written from R5 down to R1, then R0 whenever
+    anything was written, since the R0 write starts VCO band selection and
+    applies the new settings.
+
+    Parameters:
+    programmed: Words in the chip (R0..R5), or None to write all six
+    words: Target words R0..R5
+    """
+    if programmed is None:
+        return [5, 4, 3, 2, 1, 0]
+    sequence = [n for n in range(5, 0, -1) if int(words[n]) != int(programmed[n])]
+    if sequence or int(words[0]) != int(programmed[0]):
+        sequence.append(0)
+    return sequence
+
+
+def self_check():
+    """Run the register model tests (tests/test_adf4351_registers.py); returns the pytest exit code"""
+    import pytest
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "test_adf4351_registers.py")
+    return pytest.main(["-q", path])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ADF4351 register calculator")
+    parser.add_argument("frequencies", nargs="*", type=float, help="Output frequencies (MHz)")
+    parser.add_argument("--sweep", nargs=3, type=float, metavar=("START", "STOP", "STEP"),
+                        help="Sweep table in MHz (stop included)")
+    parser.add_argument("--ref", type=float, default=REF_FREQ / 1e6, help="Reference (MHz)")
+    parser.add_argument("--spacing", type=float, default=0.1, help="Channel spacing (MHz)")
+    parser.add_argument("--integer", action="store_true", help="Integer-N only")
+    parser.add_argument("--reduce", action="store_true", help="Reduce FRAC/MOD")
+    parser.add_argument("--check", action="store_true", help="Run the register model tests")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(self_check())
+
+    model = ADF4351Registers(ref_freq=args.ref * 1e6, channel_spacing=args.spacing * 1e6,
+                             fractional=not args.integer, reduce_fraction=args.reduce)
+    freqs = list(args.frequencies)
+    if args.sweep:
+        start, stop, step = args.sweep
+        count = int(round((stop - start) / step)) + 1
+        freqs += list(start + step * np.arange(count))
+    if not freqs:
+        parser.print_help()
+        return
+
+    table = model.sweep_table(np.asarray(freqs) * 1e6)
+    print(f"PFD {model.pfd / 1e6:.3f} MHz, band-select clock {model.band_select_clock / 1e3:.3f} kHz")
+    print(f"{'MHz':>12} {'actual MHz':>14} {'div':>3} {'INT':>5} {'FRAC':>5} {'MOD':>5}  "
+          + " ".join(f"{'R' + str(n):>10}" for n in range(6)))
+    for i in range(len(freqs)):
+        print(f"{freqs[i]:12.6f} {table['actual'][i] / 1e6:14.6f} {table['divider'][i]:3d} "
+              f"{table['int'][i]:5d} {table['frac'][i]:5d} {table['mod'][i]:5d}  "
+              + " ".join(f"0x{word:08X}" for word in table["registers"][i]))
+
+
+if __name__ == "__main__":
+    main()
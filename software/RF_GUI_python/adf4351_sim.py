@@ -0,0 +1,486 @@
+"""
+Simulated ADF4351 board for testing the host side without an Arduino.
+
+SimulatedADF4351 behaves like the serial port of an Arduino running
+Final_Code_ADF4351.ino: it offers the pyserial calls the protocols use
+(write, read, readline, in_waiting, reset_input_buffer, close) and answers
+them as the firmware does, in text and binary mode, including
+device-resident sweeps stepped on their own clock. Everything the "chip"
+receives is kept for inspection:
+
+    device = SimulatedADF4351()
+    protocol = BinaryProtocol(device)
+    protocol.enter()
+    protocol.set_frequency(2870e6)
+    device.frequency        # 2870e6, decoded from the programmed registers
+    device.spi_log          # [(time, word), ...]
+
+By default every reply is available at once. With baud, lock_time and
+firmware_delays set the device also keeps time like the real board: bytes
+move at the serial line rate (10 bits each, with the 64-byte transmit
+buffer of the Arduino core blocking the sketch when it fills), the sketch's
+delay() calls and SPI writes take their time, and the lock detect pin goes
+low for a while after every R0 write.
+
+    python adf4351_sim.py   # device sweep timing check
+"""
+import bisect
+import threading
+import time
+import numpy as np
+from adf4351_registers import (FIRMWARE_REGISTERS, OUTPUT_DIVIDERS, decode_frequency,
+                               firmware_calculate_r0, write_sequence)
+from adf4351_protocol import (SYNC, SEQ_FLAG, PAYLOAD_SIZES, CMD_REGS, CMD_TABLE, CMD_INDEX,
+                              CMD_TEXT, CMD_SWEEP, CMD_STOP, CMD_SWEEP_LOCK, ACK, ACK_LOCKED, ACK_ERROR,
+                              ACK_SWEEPING, SWEEP_REPEAT, SWEEP_REPORT, EVT_STEP, EVT_DONE,
+                              TABLE_SIZE)
+
+TX_BUFFER = 64              # Arduino hardware serial transmit buffer (bytes)
+SPI_WORD_TIME = 30e-6       # writeADF4351(): 32 bits at 2 MHz plus the LE pulse
+LOCK_HOLDOFF = 100e-6       # LOCK_HOLDOFF_US in the firmware
+LOCK_TIMEOUT = 10e-3        # LOCK_TIMEOUT_US
+
+
+class SimulatedADF4351:
+    """
+    In-process stand-in for the Arduino and ADF4351, used like a serial port
+
+    Parameters:
+    timeout: Read timeout in seconds, as for serial.Serial
+    locked: Whether the PLL can lock at all; False holds lock detect low
+    baud: Serial line rate, or None for instant transfers
+    lock_time: Time (s) lock detect stays low after an R0 write
+    lock_time_per_ghz: Extra lock time per GHz of VCO frequency change
+    firmware_delays: Spend the sketch's delay() and SPI write times
+    """
+    def __init__(self, timeout=1.0, locked=True, baud=None, lock_time=0.0,
+                 lock_time_per_ghz=0.0, firmware_delays=False):
+        self.timeout = timeout
+        self.locked = locked
+        self.baud = baud
+        self.lock_time = lock_time
+        self.lock_time_per_ghz = lock_time_per_ghz
+        self.firmware_delays = firmware_delays
+        self.is_open = True
+
+        self.registers = list(FIRMWARE_REGISTERS)
+        self.programmed = None  # Words in the chip
+        self.table = [0] * TABLE_SIZE
+        self.binary_mode = False
+        self.current_frequency = 50000000
+        self.spi_log = []
+        self.sweep_log = []
+        self.sweeping = False
+
+        self._rx = bytearray()
+        self._tx = bytearray()
+        self._tx_times = []     # When each byte of _tx reaches the host
+        self._tx_end = 0.0
+        self._rx_end = 0.0
+        self._clock = 0.0       # Device time, ahead of the wall clock while the sketch is busy
+        self._unlocked_until = 0.0
+        self._locked_vco = None
+        self._cond = threading.Condition()
+        self._sweep_thread = None
+        self._sweep_stop = threading.Event()
+
+        # Start-up as in setup(): program the defaults, then 90 MHz
+        with self._cond:
+            self._program()
+            self._set_frequency(90000000)
+            self._println("ADF4351 RF Generator Ready")
+            self._println("Default frequency set to 50 MHz")
+
+    @property
+    def frequency(self):
+        """Output frequency (Hz) decoded from the programmed registers"""
+        return decode_frequency(self.registers)
+
+    @property
+    def vco_frequency(self):
+        """VCO frequency (Hz) of the programmed registers"""
+        return self.frequency * OUTPUT_DIVIDERS[(self.registers[4] >> 20) & 7]
+
+    @property
+    def lock_detect(self):
+        """Level of the lock detect pin right now"""
+        with self._cond:
+            return self._lock_detect()
+
+    # pyserial API
+
+    def write(self, data):
+        with self._cond:
+            if self.baud:
+                # A command is handled once its last byte has arrived
+                self._rx_end = max(time.perf_counter(), self._rx_end) + len(data) * 10 / self.baud
+                self._clock = max(self._clock, self._rx_end)
+            self._rx += data
+            self._process()
+        return len(data)
+
+    def read(self, size=1):
+        deadline = time.perf_counter() + self.timeout
+        with self._cond:
+            ready = self._wait(lambda ready: ready >= size, size, deadline)
+            return self._take(min(size, ready))
+
+    def readline(self):
+        deadline = time.perf_counter() + self.timeout
+        with self._cond:
+            ready = self._wait(lambda ready: b"\n" in self._tx[:ready],
+                               lambda: self._tx.find(b"\n") + 1, deadline)
+            end = self._tx.find(b"\n", 0, ready) + 1 or ready
+            return self._take(end)
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            return self._ready()
+
+    def reset_input_buffer(self):
+        # Bytes still on the line arrive after the flush, as on a real port
+        with self._cond:
+            self._take(self._ready())
+
+    def close(self):
+        self._stop_sweep()
+        self.is_open = False
+
+    # Serial line
+
+    def _ready(self):
+        """Number of transmitted bytes that have reached the host"""
+        return bisect.bisect_right(self._tx_times, time.perf_counter())
+
+    def _take(self, size):
+        data = bytes(self._tx[:size])
+        del self._tx[:size]
+        del self._tx_times[:size]
+        return data
+
+    def _wait(self, done, needed, deadline):
+        """
+        Wait until done(ready) or the deadline; returns the ready byte count
+
+        Parameters:
+        done: Test on the number of bytes that have reached the host
+        needed: Byte count (or a callable giving it, 0 if unknown) that
+            would satisfy done, so the wait ends when that byte arrives
+        """
+        while True:
+            ready = self._ready()
+            now = time.perf_counter()
+            if done(ready) or now >= deadline:
+                return ready
+            count = needed() if callable(needed) else needed
+            wake = deadline
+            if len(self._tx) > ready:
+                # Sleep until the byte that completes the read, or the next one
+                wake = min(wake, self._tx_times[min(max(count, ready + 1), len(self._tx)) - 1])
+            self._cond.wait(max(wake - now, 0.0))
+
+    # Firmware
+
+    def _now(self):
+        """Device time: the wall clock, or later while the sketch is busy"""
+        self._clock = max(self._clock, time.perf_counter())
+        return self._clock
+
+    def _delay(self, seconds):
+        if self.firmware_delays:
+            self._clock = self._now() + seconds
+
+    def _send(self, data):
+        start = max(self._now(), self._tx_end)
+        if self.baud:
+            byte_time = 10 / self.baud
+            times = [start + byte_time * (i + 1) for i in range(len(data))]
+            self._tx_end = times[-1]
+            # Serial.print() blocks until all but TX_BUFFER bytes are on the line
+            queued = self._tx_times + times
+            if self.firmware_delays and len(queued) > TX_BUFFER:
+                self._clock = max(self._clock, queued[-TX_BUFFER - 1])
+        else:
+            times = [start] * len(data)
+        self._tx += data
+        self._tx_times += times
+        self._cond.notify_all()
+
+    def _println(self, line):
+        self._send(line.encode() + b"\r\n")
+
+    def _write_word(self, word):
+        self.spi_log.append((self._now(), int(word)))
+        self._delay(SPI_WORD_TIME)
+        if word & 7 == 0:
+            self._relock()
+
+    def _relock(self):
+        """An R0 write starts VCO band selection; lock detect drops until the loop settles"""
+        vco = self.vco_frequency
+        previous = vco if self._locked_vco is None else self._locked_vco
+        self._locked_vco = vco
+        settle = self.lock_time + self.lock_time_per_ghz * abs(vco - previous) / 1e9
+        self._unlocked_until = self._now() + settle
+
+    def _lock_detect(self):
+        return self.locked and self._now() >= self._unlocked_until
+
+    def _program(self):
+        """Write the registers that changed, as programRegisters(); returns the count"""
+        sequence = write_sequence(self.programmed, self.registers)
+        for n in sequence:
+            self._write_word(self.registers[n])
+        self.programmed = list(self.registers)
+        return len(sequence)
+
+    def _wait_for_lock(self):
+        """Poll lock detect as waitForLock(); returns the wait in us"""
+        if self.locked:
+            wait = min(max(LOCK_HOLDOFF, self._unlocked_until - self._now()), LOCK_TIMEOUT)
+        else:
+            wait = LOCK_TIMEOUT
+        self._delay(wait)
+        return int(wait * 1e6)
+
+    def _ack_status(self, flags=0):
+        status = ACK | flags
+        if self._lock_detect():
+            status |= ACK_LOCKED
+        if self.sweeping:
+            status |= ACK_SWEEPING
+        return status
+
+    def _process(self):
+        while self._rx:
+            if self.binary_mode:
+                if not self._binary_frame():
+                    return
+            else:
+                end = self._rx.find(b"\n")
+                if end < 0:
+                    return
+                line = self._rx[:end].decode(errors="replace").strip()
+                del self._rx[:end + 1]
+                self._text_command(line)
+
+    def _text_command(self, line):
+        if line.startswith("FREQ:"):
+            try:
+                freq_mhz = float(np.float32(line[5:]))
+            except ValueError:
+                freq_mhz = 0.0
+            self._println(f"Setting frequency to {freq_mhz:.2f} MHz")
+            self._set_frequency(int(np.float32(freq_mhz) * np.float32(1e6)))
+        elif line == "STATUS":
+            self._println(f"Frequency: {self.current_frequency / 1e6:.3f} MHz")
+            self._println(f"Lock Status: {'Locked' if self._lock_detect() else 'Unlocked'}")
+        elif line == "BIN":
+            self._println("OK BIN")
+            self.binary_mode = True
+
+    def _set_frequency(self, freq_hz):
+        if 35000000 <= freq_hz <= 4400000000:
+            self.current_frequency = freq_hz
+            r0, r4 = firmware_calculate_r0(freq_hz)
+            divider = OUTPUT_DIVIDERS[(r4 >> 20) & 7]
+            vco = (freq_hz * divider) & 0xFFFFFFFF
+            self._println(f"DEBUG: Target Freq (Hz): {freq_hz}")
+            self._println(f"DEBUG: VCO Freq (Hz): {vco}")
+            self._println(f"DEBUG: Divider: {divider}")
+            self._println(f"DEBUG: INT: {vco // 25000000}")
+            self.registers[0] = r0
+            self.registers[4] = r4
+            written = self._program()
+            lock_wait = self._wait_for_lock() if written else 0
+            locked = self._lock_detect()
+            self._println(f"DEBUG: Registers written: {written}")
+            self._println(f"DEBUG: Lock wait (us): {lock_wait}")
+            self._println(f"DEBUG: PLL Lock Status: {'Locked' if locked else 'Unlocked'}")
+            self._println("OK")
+        else:
+            self._println("ERROR: Frequency out of range")
+
+    def _binary_frame(self):
+        """Handle one frame from the receive buffer; False if it is incomplete"""
+        if self._rx[0] != SYNC:
+            del self._rx[0]
+            return True
+        if len(self._rx) < 3:
+            return False
+        cmd, seq = self._rx[1], self._rx[2]
+        length = PAYLOAD_SIZES.get(cmd & ~SEQ_FLAG)
+        if length is None:
+            del self._rx[:3]
+            self._ack(ACK_ERROR, cmd, seq)
+            return True
+        if len(self._rx) < 4 + length:
+            return False
+        payload = bytes(self._rx[3:3 + length])
+        check = self._rx[3 + length]
+        del self._rx[:4 + length]
+
+        expected = cmd ^ seq
+        for b in payload:
+            expected ^= b
+        if expected != check:
+            self._ack(ACK_ERROR, cmd, seq)
+            return True
+
+        command = cmd & ~SEQ_FLAG
+        if command == CMD_REGS:
+            self.registers = [int.from_bytes(payload[4 * i:4 * i + 4], "big") for i in range(6)]
+            if self._program():
+                self._wait_for_lock()
+        elif command in (CMD_TABLE, CMD_INDEX):
+            index = int.from_bytes(payload[:2], "big")
+            if index >= TABLE_SIZE:
+                self._ack(ACK_ERROR, cmd, seq)
+                return True
+            if command == CMD_TABLE:
+                self.table[index] = int.from_bytes(payload[2:], "big")
+            else:
+                if self._program_entry(index):
+                    self._wait_for_lock()
+        elif command in (CMD_SWEEP, CMD_SWEEP_LOCK):
+            first = int.from_bytes(payload[0:2], "big")
+            count = int.from_bytes(payload[2:4], "big")
+            if count == 0 or first + count > TABLE_SIZE:
+                self._ack(ACK_ERROR, cmd, seq)
+                return True
+            # dwell, then settle and lock timeout for a lock-gated sweep, in us
+            times = [int.from_bytes(payload[i:i + 4], "big") / 1e6 for i in range(4, length - 1, 4)]
+            self._start_sweep(first, count, payload[-1], *times)
+        elif command == CMD_STOP:
+            self.sweeping = False
+            self._sweep_stop.set()
+        elif command == CMD_TEXT:
+            self.sweeping = False
+            self._sweep_stop.set()
+            self.binary_mode = False
+        self._ack(0, cmd, seq)
+        return True
+
+    def _ack(self, flags, cmd, seq):
+        reply = bytes([self._ack_status(flags)])
+        if cmd & SEQ_FLAG:
+            reply += bytes([seq])
+        self._send(reply)
+
+    def _program_entry(self, index):
+        entry = self.table[index]
+        self.registers[4] = (self.registers[4] & ~(7 << 20)) | ((entry & 7) << 20)
+        self.registers[0] = entry & ~7
+        return self._program()
+
+    def _event(self, event, value):
+        if self._lock_detect():
+            event |= ACK_LOCKED
+        self._send(bytes([event]) + int(value).to_bytes(2, "big"))
+
+    # Device-resident sweep
+
+    def _start_sweep(self, first, count, flags, dwell, settle=None, lock_timeout=None):
+        # Called with the lock held; the old sweep thread exits on its own
+        self._sweep_stop.set()
+        self._sweep_stop = threading.Event()
+        self.sweeping = True
+        self._sweep_thread = threading.Thread(
+            target=self._sweep_loop,
+            args=(first, count, dwell, flags, self._sweep_stop, settle, lock_timeout),
+            daemon=True
+        )
+        self._sweep_thread.start()
+
+    def _stop_sweep(self):
+        with self._cond:
+            self.sweeping = False
+            self._sweep_stop.set()
+
+    def _lock_ready(self, programmed, lock_timeout):
+        """When serviceLockedSweep() ends the lock wait, and whether it timed out"""
+        ready = max(programmed + LOCK_HOLDOFF, self._unlocked_until)
+        if not self.locked or ready - programmed >= lock_timeout:
+            return programmed + max(lock_timeout, LOCK_HOLDOFF), True
+        return ready, False
+
+    def _sweep_loop(self, first, count, dwell, flags, stop, settle=None, lock_timeout=None):
+        due = time.perf_counter()
+        step = 0
+        open_step = None
+        while True:
+            # Timed sweeps: step k is due at start + k * dwell, as serviceSweep(),
+            # and reported at the end of its dwell. Lock-gated: program, wait
+            # for lock and settle, report, then hold for dwell.
+            delay = due - time.perf_counter()
+            if delay > 0 and stop.wait(delay):
+                return
+            with self._cond:
+                if stop.is_set():
+                    return
+                if open_step is not None:
+                    if flags & SWEEP_REPORT:
+                        self._event(EVT_STEP, open_step)
+                    open_step = None
+                if step >= count:
+                    if flags & SWEEP_REPEAT:
+                        step = 0
+                    else:
+                        self.sweeping = False
+                        self._event(EVT_DONE, count)
+                        return
+                self._program_entry(first + step)
+                if settle is None:
+                    self.sweep_log.append((time.perf_counter(), first + step))
+                    open_step = step
+                else:
+                    ready, timed_out = self._lock_ready(self._now(), lock_timeout)
+            if settle is not None:
+                if not timed_out:
+                    ready += settle
+                delay = ready - time.perf_counter()
+                if delay > 0 and stop.wait(delay):
+                    return
+                with self._cond:
+                    if stop.is_set():
+                        return
+                    self.sweep_log.append((time.perf_counter(), first + step))
+                    if flags & SWEEP_REPORT:
+                        self._event(EVT_STEP, step)
+            step += 1
+            due = due + dwell if settle is None else time.perf_counter() + dwell
+
+
+def main():
+    from adf4351_registers import ADF4351Registers
+    from adf4351_protocol import BinaryProtocol
+
+    model = ADF4351Registers()
+    device = SimulatedADF4351()
+    protocol = BinaryProtocol(device, model)
+    protocol.enter()
+
+    freqs = np.arange(2800e6, 2950e6, 0.5e6)
+    table = model.sweep_table(freqs)
+    dwell = 0.002
+    started = time.perf_counter()
+    steps = protocol.run_sweep(table["registers"], dwell)
+    elapsed = time.perf_counter() - started
+
+    # Within a table chunk every step is due at the chunk start + index * dwell
+    times = np.array([t for t, index in device.sweep_log])
+    indices = np.array([index for t, index in device.sweep_log])
+    chunk_start = times[np.maximum.accumulate(np.where(indices == 0, np.arange(len(indices)), 0))]
+    lateness = times - chunk_start - indices * dwell
+    print(f"{len(steps)} steps in {elapsed:.3f} s ({len(freqs) * dwell:.3f} s of dwell)")
+    print(f"Step time vs schedule: median {np.median(lateness) * 1e6:.0f} us, "
+          f"max {lateness.max() * 1e6:.0f} us, last step of a chunk "
+          f"{lateness[indices == indices.max()].max() * 1e6:.0f} us")
+    assert [index for index, locked in steps] == list(range(len(freqs)))
+    assert abs(device.frequency - table["actual"][-1]) < 1e-3
+    print(f"Final frequency {device.frequency / 1e6:.3f} MHz")
+
+
+if __name__ == "__main__":
+    main()
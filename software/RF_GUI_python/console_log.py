@@ -0,0 +1,177 @@
+"""
+Bounded, batched debug log for the Tk console.
+
+Inserting every serial reply into a tk.Text as it arrives costs a widget
+update per line and the widget never shrinks, so long sweeps with several
+DEBUG: lines per step slow the GUI down more and more. ConsoleLog keeps the
+lines in a ring buffer instead: log() only appends to a deque, from any
+thread, and the GUI drains it on a timer and inserts each batch in one call,
+trimming the widget to the same number of lines. The full log goes to a
+rotating file through a QueueHandler, and a QueueListener thread does the
+file writes, so disk I/O never runs on the UI thread either.
+
+    log = ConsoleLog(path="adf4351_gui.log")
+    log.log("Device response: DEBUG: Lock wait (us): 212")
+    for level, line in log.drain():   # on the Tk thread, every 100 ms
+        ...
+
+    python console_log.py   # cost per line, batches and log file rotation
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import numpy as np
+
+LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
+
+
+def level_of(message):
+    """Level of a console message, from the prefixes the GUI already uses"""
+    if message.startswith(("Error", "Connection error", "Protocol error", "Sweep error")):
+        return logging.ERROR
+    if message.startswith("Warning"):
+        return logging.WARNING
+    if message.startswith(("Device response: DEBUG:", "Sending command")):
+        return logging.DEBUG
+    return logging.INFO
+
+
+class ConsoleLog:
+    """
+    Ring buffer of console lines plus a rotating log file
+
+    Parameters:
+    max_lines: Lines kept for the console; older ones are dropped
+    level: Lowest level drain() returns
+    path: Log file for the full log, or None for no file
+    max_bytes: Size at which the log file is rotated
+    backups: Rotated files kept
+    """
+    def __init__(self, max_lines=2000, level=logging.DEBUG, path=None, max_bytes=1_000_000, backups=3):
+        self.max_lines = max_lines
+        self.level = level
+        self.lines = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.listener = None
+        self.logger = logging.getLogger(f"{__name__}.{id(self)}")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        if path is None:
+            self.logger.addHandler(logging.NullHandler())
+        else:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(message)s"))
+            records = queue.SimpleQueue()
+            self.logger.addHandler(logging.handlers.QueueHandler(records))
+            self.listener = logging.handlers.QueueListener(records, handler)
+            self.listener.start()
+
+    def log(self, message, level=None):
+        """Record a message; safe to call from any thread"""
+        if level is None:
+            level = level_of(message)
+        if len(self.lines) == self.max_lines:
+            self.dropped += 1
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.lines.append((level, f"[{timestamp}] {message}\n"))
+        self.logger.log(level, message)
+
+    def drain(self):
+        """Take the buffered lines at or above the display level, oldest first"""
+        lines = []
+        while True:
+            try:
+                level, line = self.lines.popleft()
+            except IndexError:
+                break
+            if level >= self.level:
+                lines.append((level, line))
+        return lines
+
+    def close(self):
+        """Write out the queued records and stop the file thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+
+
+def benchmark(count=20000, max_lines=2000, interval=0.1, rate=20000):
+    """
+    Log count lines from a worker thread at rate lines/s while draining every interval
+
+    Returns a dict with the per-call cost of log() (s), the drained batches,
+    the lines the console would hold and the log files written.
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "console.log")
+    log = ConsoleLog(max_lines=max_lines, path=path, max_bytes=200_000)
+    costs = []
+
+    def worker():
+        started = time.perf_counter()
+        for index in range(count):
+            message = (f"Device response: DEBUG: Lock wait (us): {index % 400}" if index % 4
+                       else f"Sending command: FREQ:{2800 + index * 0.1:.3f}")
+            begin = time.perf_counter()
+            log.log(message)
+            costs.append(time.perf_counter() - begin)
+            delay = started + (index + 1) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    shown = deque(maxlen=max_lines)  # What the trimmed console holds
+    batches = []
+    while thread.is_alive() or log.lines:
+        time.sleep(interval)
+        lines = log.drain()
+        batches.append(len(lines))
+        shown.extend(lines)
+    thread.join()
+    log.close()
+    files = sorted(os.listdir(directory))
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+    shutil.rmtree(directory)
+    return {
+        "log_cost": {"mean": float(np.mean(costs)), "p99": float(np.percentile(costs, 99))},
+        "batches": len(batches),
+        "largest_batch": max(batches),
+        "shown": len(shown),
+        "dropped": log.dropped,
+        "files": files,
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Console log throughput")
+    parser.add_argument("--count", type=int, default=20000, help="Lines to log")
+    parser.add_argument("--max-lines", type=int, default=2000, help="Console lines kept")
+    args = parser.parse_args()
+
+    results = benchmark(args.count, args.max_lines)
+    cost = results["log_cost"]
+    print(f"{args.count} lines: log() mean {cost['mean'] * 1e6:.1f} us, p99 {cost['p99'] * 1e6:.1f} us")
+    print(f"Drained in {results['batches']} batches (largest {results['largest_batch']} lines), "
+          f"console holds {results['shown']}, {results['dropped']} dropped before display")
+    print(f"Log files: {', '.join(results['files'])} ({results['bytes'] / 1e3:.0f} kB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+RF sources behind one interface, independent of the GUI.
+
+RFSource is what an experiment needs from a microwave source: connect, set
+one frequency, hand over a whole frequency list and run it, and ask for lock
+and status. A frequency list goes to the backend in one piece, so a backend
+that can step on its own (the ADF4351 firmware's table sweeps) runs it with
+one start command instead of a host round trip per step. Backends that
+cannot fall back to RFSource.run_list(), which steps set_frequency() on the
+SweepEngine schedule.
+
+    ADF4351SerialSource   Arduino running Final_Code_ADF4351.ino, text or binary protocol
+    SimulatedSource       the same over a SimulatedADF4351, no hardware needed
+
+Another synthesizer (the README's Si5351 board, say) needs only a subclass
+with connect, disconnect, set_frequency and status. Scripted use:
+
+    with ADF4351SerialSource("/dev/ttyACM0") as source:
+        source.set_frequency_list(np.arange(2860e6, 2880e6, 0.1e6))
+        steps = source.run_list(dwell=0.005, settle=50e-6)
+
+    python rf_source.py   # frequency list run on the simulated board, both protocols
+"""
+import argparse
+import time
+import numpy as np
+import serial
+from adf4351_registers import (FIRMWARE_REGISTERS, FREQ_MIN, FREQ_MAX, ADF4351Registers,
+                               decode_frequency, firmware_calculate_r0)
+from adf4351_protocol import BinaryProtocol, TextProtocol
+from adf4351_sim import SimulatedADF4351
+from sweep_engine import SweepEngine
+
+
+class RFSource:
+    """
+    Interface of an RF source
+
+    set_frequency() returns a dict with at least ok, locked and frequency
+    (the frequency actually programmed, Hz). run_list() returns one dict per
+    step with index, frequency and locked (None if the source cannot tell).
+    """
+    freq_min = FREQ_MIN
+    freq_max = FREQ_MAX
+
+    def __init__(self):
+        self.frequencies = None
+        self.requested = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def disconnect(self):
+        raise NotImplementedError
+
+    def set_frequency(self, freq_hz):
+        raise NotImplementedError
+
+    def status(self):
+        """Dict with at least frequency (Hz) and locked"""
+        raise NotImplementedError
+
+    def locked(self):
+        return bool(self.status()["locked"])
+
+    def check_frequencies(self, freqs):
+        """Frequencies as an array, or ValueError if any is out of range"""
+        freqs = np.atleast_1d(np.asarray(freqs, dtype=float))
+        if not len(freqs):
+            raise ValueError("Frequency list is empty")
+        if freqs.min() < self.freq_min or freqs.max() > self.freq_max:
+            raise ValueError(f"Frequencies must be between {self.freq_min / 1e6:g} and "
+                             f"{self.freq_max / 1e6:g} MHz")
+        return freqs
+
+    def set_frequency_list(self, freqs):
+        """
+        Prepare a frequency list for run_list()
+
+        Returns the frequencies that will actually be programmed (Hz).
+        """
+        self.requested = self.frequencies = self.check_frequencies(freqs)
+        return self.frequencies
+
+    def run_list(self, dwell, settle=None, on_step=None, should_stop=None):
+        """
+        Step through the prepared list, holding each frequency for dwell (s)
+
+        Parameters:
+        dwell: Time per step, or with settle the hold time after lock
+        settle: Margin (s) after lock before a step counts; None for a fixed period
+        on_step: Called with every step dict as it happens
+        should_stop: Polled between steps; the run ends when it returns True
+
+        This default steps set_frequency() from the host on the SweepEngine
+        schedule; backends that can run a list themselves override it.
+        """
+        if self.frequencies is None:
+            raise ValueError("No frequency list set")
+        engine = SweepEngine(self.set_frequency)
+        # The requests, not the programmed frequencies: asking again for a
+        # programmed frequency can land a step lower
+        engine.start(self.requested, dwell, settle=settle)
+        steps = []
+        while True:
+            message = engine.progress.get()
+            if message["type"] == "step":
+                step = {"index": message["index"],
+                        "frequency": message["result"]["frequency"],
+                        "locked": message["locked"]}
+                steps.append(step)
+                if on_step is not None:
+                    on_step(step)
+                if should_stop is not None and should_stop():
+                    engine.stop()
+            elif message["type"] == "error":
+                engine.join()
+                raise RuntimeError(message["message"])
+            else:
+                return steps
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.disconnect()
+
+
+class ADF4351SerialSource(RFSource):
+    """
+    ADF4351 board on a serial port
+
+    In binary mode the registers are computed on the host and a frequency
+    list is uploaded as a register table and stepped by the firmware. In
+    text mode every frequency is a FREQ: command and lists are stepped from
+    the host.
+
+    Parameters:
+    port: Serial port name
+    binary: Use the binary protocol
+    baud: Serial line rate
+    model: ADF4351Registers for binary mode; the firmware defaults if not given.
+           Not one with reduce_fraction: its per-frequency MOD lives in R1,
+           which the firmware's sweep table does not carry.
+    lock_timeout: Longest wait (s) for lock per step of a lock-gated list
+    log: Called with every text reply line, e.g. the GUI console
+    """
+    def __init__(self, port, binary=True, baud=115200, model=None, lock_timeout=0.01, log=None):
+        super().__init__()
+        self.port_name = port
+        self.baud = baud
+        self.model = model if model is not None else ADF4351Registers()
+        if self.model.reduce_fraction:
+            raise ValueError("A model with reduce_fraction gives each frequency its own MOD, "
+                             "which firmware table sweeps cannot program")
+        self.lock_timeout = lock_timeout
+        self.log = log
+        self.port = None
+        self.protocol = None
+        self.frequency = None
+        self.table = None
+        self._binary = binary
+
+    @property
+    def connected(self):
+        return self.port is not None
+
+    @property
+    def binary(self):
+        return isinstance(self.protocol, BinaryProtocol)
+
+    def _open(self):
+        port = serial.Serial(self.port_name, self.baud, timeout=1)
+        time.sleep(2)  # Wait for Arduino reset
+        return port
+
+    def connect(self):
+        self.port = self._open()
+        # Drop the start-up messages so they are not read as the first reply
+        self.port.reset_input_buffer()
+        self.protocol = TextProtocol(self.port, log=self.log)
+        try:
+            self.use_binary(self._binary)
+        except Exception:
+            self.disconnect()
+            raise
+
+    def disconnect(self):
+        if self.port is None:
+            return
+        try:
+            if self.binary:
+                self.protocol.leave()
+        finally:
+            self.port.close()
+            self.port = None
+            self.protocol = None
+
+    def use_binary(self, enabled):
+        """Switch the firmware between the text and the binary protocol"""
+        if enabled and not self.binary:
+            protocol = BinaryProtocol(self.port, self.model)
+            protocol.enter()
+            self.protocol = protocol
+        elif not enabled and self.binary:
+            protocol = self.protocol
+            self.protocol = TextProtocol(self.port, log=self.log)
+            protocol.leave()
+        self._binary = enabled
+        self.table = None
+
+    def text_frequency(self, freq_hz):
+        """Frequency the firmware programs for a FREQ: command (integer-N, kHz in the command)"""
+        sent = int(np.float32(round(freq_hz / 1e3) / 1e3) * np.float32(1e6))
+        r0, r4 = firmware_calculate_r0(sent)
+        words = list(FIRMWARE_REGISTERS)
+        words[0], words[4] = r0, r4
+        return decode_frequency(words)
+
+    def set_frequency(self, freq_hz):
+        """
+        Program one frequency
+
+        Returns a dict with ok, locked, frequency (actual, Hz), rtt (s) and
+        in text mode the reply lines.
+        """
+        self.check_frequencies(freq_hz)
+        result = self.protocol.set_frequency(freq_hz)
+        if "actual" in result:
+            result["frequency"] = result.pop("actual")
+        else:
+            result["frequency"] = self.text_frequency(freq_hz)
+        if result["ok"]:
+            self.frequency = result["frequency"]
+        return result
+
+    def set_frequency_list(self, freqs):
+        freqs = self.requested = self.check_frequencies(freqs)
+        if not self.binary:
+            self.table = None
+            self.frequencies = np.array([self.text_frequency(freq) for freq in freqs])
+            return self.frequencies
+        self.table = self.model.sweep_table(freqs)
+        self.frequencies = self.table["actual"]
+        return self.frequencies
+
+    def run_list(self, dwell, settle=None, on_step=None, should_stop=None):
+        """Run the prepared list; on the firmware's clock in binary mode (see RFSource.run_list)"""
+        if not self.binary:
+            return super().run_list(dwell, settle, on_step, should_stop)
+        if self.table is None:
+            raise ValueError("No frequency list set")
+        steps = []
+
+        def step(index, locked):
+            steps.append({"index": index, "frequency": float(self.frequencies[index]), "locked": locked})
+            if on_step is not None:
+                on_step(steps[-1])
+
+        self.protocol.run_sweep(self.table["registers"], dwell, on_step=step, should_stop=should_stop,
+                                settle=settle, lock_timeout=self.lock_timeout)
+        if steps:
+            self.frequency = steps[-1]["frequency"]
+        return steps
+
+    def status(self):
+        """Dict with frequency (Hz), locked and binary, plus sweeping in binary mode"""
+        status = self.protocol.status()
+        if self.binary:
+            status["frequency"] = self.frequency
+        status["binary"] = self.binary
+        return status
+
+
+class SimulatedSource(ADF4351SerialSource):
+    """
+    ADF4351SerialSource talking to a SimulatedADF4351 instead of a port
+
+    Parameters:
+    binary: Use the binary protocol
+    model: ADF4351Registers for binary mode, as for ADF4351SerialSource
+    lock_timeout: Longest wait (s) for lock per step of a lock-gated list
+    device_options: Passed to SimulatedADF4351 (baud, lock_time, ...)
+    """
+    def __init__(self, binary=True, model=None, lock_timeout=0.01, **device_options):
+        super().__init__("simulated", binary=binary, model=model, lock_timeout=lock_timeout)
+        self.device_options = device_options
+        self.device = None
+
+    def _open(self):
+        self.device = SimulatedADF4351(**self.device_options)
+        time.sleep(0.05)  # Let the start-up messages arrive
+        return self.device
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a frequency list through an RF source")
+    parser.add_argument("--port", help="Serial port of the Arduino; the simulated board if not given")
+    parser.add_argument("--start", type=float, default=2860.0, help="First frequency (MHz)")
+    parser.add_argument("--step", type=float, default=0.1, help="Step (MHz)")
+    parser.add_argument("--count", type=int, default=200, help="Frequencies in the list")
+    parser.add_argument("--dwell", type=float, default=1.0, help="Hold time per step (ms)")
+    parser.add_argument("--settle", type=float, default=50.0, help="Settle margin after lock (us)")
+    args = parser.parse_args()
+
+    freqs = (args.start + args.step * np.arange(args.count)) * 1e6
+    for binary in (False, True):
+        if args.port:
+            source = ADF4351SerialSource(args.port, binary=binary)
+        else:
+            source = SimulatedSource(binary=binary, baud=115200, lock_time=250e-6,
+                                     lock_time_per_ghz=500e-6, firmware_delays=True)
+        with source:
+            actual = source.set_frequency_list(freqs)
+            started = time.perf_counter()
+            steps = source.run_list(args.dwell / 1000, settle=args.settle * 1e-6)
+            elapsed = time.perf_counter() - started
+            status = source.status()
+        unlocked = sum(1 for step in steps if step["locked"] is False)
+        mode = "binary" if binary else "text"
+        print(f"{mode:6s} {len(steps)} of {len(freqs)} steps in {elapsed:.3f} s "
+              f"({elapsed / len(steps) * 1e3:.2f} ms/step), {unlocked} not locked, "
+              f"max offset {np.max(np.abs(actual - freqs)) / 1e3:.1f} kHz, "
+              f"ends at {status['frequency'] / 1e6:.3f} MHz, {'locked' if status['locked'] else 'not locked'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Frequency sweeps stepped from the host on a fixed schedule.
+
+SweepEngine runs a sweep on its own thread, away from the GUI. Step k is
+retuned at start + k * dwell on the monotonic clock, so a slow retune delays
+only its own step instead of pushing back every later one, and frequency k
+is start + k * step rather than a running floating-point sum. The engine
+touches no widgets: each step, errors and the end of the sweep are posted
+as dicts to a queue that the GUI drains on its own thread.
+
+With a settle margin the sweep is lock-gated instead: the retune call waits
+for lock detect (the firmware does this since differential programming), the
+engine adds the settle margin, and the dwell counts from there. Steps the
+device reported unlocked are flagged rather than silently accepted.
+
+    engine = SweepEngine(TextProtocol(port).set_frequency)
+    engine.start(sweep_frequencies(2800e6, 2900e6, 0.5e6), dwell=0.05)
+    message = engine.progress.get()   # {"type": "step", "index": 0, ...}
+
+    python sweep_engine.py   # schedule vs sleep loop on the simulated board
+"""
+import queue
+import threading
+import time
+import numpy as np
+
+
+def sweep_frequencies(start, stop, step):
+    """
+    Frequencies of a start/stop/step sweep, computed by index
+
+    Parameters:
+    start: First frequency
+    stop: Last frequency, included when the grid lands on it
+    step: Frequency step, positive
+    """
+    if step <= 0:
+        raise ValueError("step must be positive")
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if count < 1:
+        raise ValueError("stop is below start")
+    return start + step * np.arange(count)
+
+
+def timing_summary(errors):
+    """Mean, p95 and max (s) of per-step timing errors"""
+    errors = np.asarray(errors, dtype=float)
+    if not len(errors):
+        return {"mean": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "mean": float(errors.mean()),
+        "p95": float(np.percentile(errors, 95)),
+        "max": float(errors.max()),
+    }
+
+
+class SweepEngine:
+    """
+    Deadline-scheduled sweep thread reporting through a queue
+
+    Messages put on progress:
+        {"type": "step", "index", "frequency", "error", "duration", "locked", "result"}
+        {"type": "error", "index", "message"}
+        {"type": "done", "steps", "count", "stopped", "elapsed", "planned", "gated", "unlocked",
+         "timing"}
+    error is how late (s) the retune started against its deadline, duration
+    how long the retune call took, locked the "locked" entry of its result
+    (None if it has none) and result what it returned.
+
+    Parameters:
+    set_frequency: Called on the sweep thread with each frequency
+    progress: Queue for the messages; a new one if not given
+    """
+    def __init__(self, set_frequency, progress=None):
+        self.set_frequency = set_frequency
+        self.progress = progress if progress is not None else queue.Queue()
+        self.steps = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, frequencies, dwell, settle=None):
+        """
+        Start sweeping in the background
+
+        Parameters:
+        frequencies: Frequencies in sweep order
+        dwell: Time (s) from one retune to the next, or with settle the
+            time each frequency is held once it is valid
+        settle: Margin (s) after the retune returned locked; None for a
+            fixed schedule
+        """
+        if self.running:
+            raise RuntimeError("sweep already running")
+        self.steps = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(np.asarray(frequencies, dtype=float), dwell, settle, self._stop),
+            daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ask the sweep to end before its next step"""
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def post(self, kind, **fields):
+        """Queue a message for the UI thread"""
+        fields["type"] = kind
+        self.progress.put(fields)
+
+    def _run(self, frequencies, dwell, settle, stop):
+        started = time.perf_counter()
+        due = started
+        for index, frequency in enumerate(frequencies):
+            if settle is None:
+                due = started + index * dwell
+            delay = due - time.perf_counter()
+            if (delay > 0 and stop.wait(delay)) or stop.is_set():
+                break
+            begin = time.perf_counter()
+            try:
+                result = self.set_frequency(frequency)
+            except Exception as e:
+                self.post("error", index=index, message=str(e))
+                break
+            end = time.perf_counter()
+            step = {
+                "index": index,
+                "frequency": float(frequency),
+                "error": begin - due,
+                "duration": end - begin,
+                "locked": result.get("locked") if isinstance(result, dict) else None,
+                "result": result,
+            }
+            if settle is not None:
+                # Valid after the settle margin; the next retune follows the dwell
+                stop.wait(settle)
+                due = time.perf_counter() + dwell
+            self.steps.append(step)
+            self.post("step", **step)
+        else:
+            # Hold the last frequency for its dwell too
+            if settle is None:
+                due = started + len(frequencies) * dwell
+            delay = due - time.perf_counter()
+            if delay > 0:
+                stop.wait(delay)
+
+        self.post(
+            "done",
+            steps=len(self.steps),
+            count=len(frequencies),
+            stopped=stop.is_set(),
+            elapsed=time.perf_counter() - started,
+            planned=len(frequencies) * dwell,
+            gated=settle is not None,
+            unlocked=sum(1 for step in self.steps if step["locked"] is False),
+            timing=timing_summary([step["error"] for step in self.steps])
+        )
+
+
+def main():
+    from adf4351_sim import SimulatedADF4351
+    from adf4351_protocol import TextProtocol
+
+    start, stop, step, dwell = 2800e6, 2810e6, 0.1e6, 0.03
+
+    # The old GUI loop: accumulate the frequency, sleep after each retune
+    accumulated = []
+    current = start / 1e6
+    while current <= stop / 1e6:
+        accumulated.append(current)
+        current += step / 1e6
+    frequencies = sweep_frequencies(start, stop, step)
+    print(f"Accumulated grid: {len(accumulated)} points, last {accumulated[-1]:.15f} MHz; "
+          f"by index: {len(frequencies)} points, last {frequencies[-1] / 1e6:.15f} MHz")
+
+    device = SimulatedADF4351(baud=115200, firmware_delays=True)
+    time.sleep(0.1)  # Let the start-up messages arrive before dropping them
+    device.reset_input_buffer()
+    protocol = TextProtocol(device)
+
+    started = time.perf_counter()
+    for frequency in frequencies:
+        protocol.set_frequency(frequency)
+        time.sleep(dwell)
+    sleep_loop = time.perf_counter() - started
+
+    engine = SweepEngine(protocol.set_frequency)
+    engine.start(frequencies, dwell)
+    while True:
+        message = engine.progress.get()
+        if message["type"] != "step":
+            break
+    assert message["type"] == "done" and message["steps"] == len(frequencies)
+    timing = message["timing"]
+    print(f"{len(frequencies)} steps at {dwell * 1e3:.0f} ms dwell, planned {message['planned']:.3f} s")
+    print(f"Sleep loop:   {sleep_loop:.3f} s")
+    print(f"SweepEngine:  {message['elapsed']:.3f} s, step start error mean "
+          f"{timing['mean'] * 1e3:.2f} ms, p95 {timing['p95'] * 1e3:.2f} ms, max {timing['max'] * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
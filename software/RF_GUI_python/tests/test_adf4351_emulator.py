@@ -0,0 +1,43 @@
+import pytest
+from adf4351_emulator import VirtualADF4351, check_mapping, expected_frequency, open_port
+from adf4351_protocol import TextProtocol
+
+
+@pytest.fixture(scope="module")
+def emulator():
+    with VirtualADF4351() as emulator:
+        yield emulator
+
+
+def test_expected_frequency_from_the_datasheet():
+    # Integer-N truncates the VCO frequency to the 25 MHz PFD grid:
+    # 2870 MHz at divider 1, 90 MHz at divider 32 (VCO 2880 MHz)
+    assert expected_frequency(2870e6, 25e6) == 2850e6
+    assert expected_frequency(90e6, 25e6) == pytest.approx(2875e6 / 32)
+    # Fractional-N rounds the VCO frequency to the 100 kHz channel grid:
+    # VCO 4000.0496 MHz at divider 4
+    assert expected_frequency(2800.06e6, 100e3) == pytest.approx(2800.1e6)
+    assert expected_frequency(1000.0124e6, 100e3) == pytest.approx(1000e6)
+
+
+def test_mapping_over_the_pty(emulator):
+    results = check_mapping(emulator, count=100)
+    for mode in ("text", "binary"):
+        assert results[mode]["wrong"] == 0, mode
+        assert results[mode]["outside"] == 0, mode
+    # calculateR0() computes the VCO frequency in uint32 and wraps above 2^32 Hz
+    assert results["text"]["overflow"] > 0
+    assert results["text"]["overflow_wrong"] == results["text"]["overflow"]
+
+
+def test_text_overflow_range(emulator):
+    port = open_port(emulator)
+    try:
+        text = TextProtocol(port)
+        # Divider 2 below 2200 MHz puts the VCO past 4294.967 MHz
+        text.set_frequency(2160e6)
+        assert emulator.device.frequency != pytest.approx(2150e6)
+        text.set_frequency(2140e6)
+        assert emulator.device.frequency == pytest.approx(2137.5e6)
+    finally:
+        port.close()
@@ -0,0 +1,163 @@
+import time
+import numpy as np
+import pytest
+from adf4351_protocol import (CMD_REGS, CMD_STATUS, EVT_DONE, EVT_STEP, SYNC, TABLE_SIZE, BinaryProtocol,
+                              encode_frame)
+from adf4351_registers import ADF4351Registers
+from adf4351_sim import SimulatedADF4351
+from rf_source import SimulatedSource
+
+
+@pytest.fixture
+def device():
+    device = SimulatedADF4351()
+    yield device
+    device.close()
+
+
+def binary(device, model=None):
+    protocol = BinaryProtocol(device, model)
+    protocol.enter()
+    return protocol
+
+
+def table(count, start=2800e6, step=1e6):
+    return ADF4351Registers().sweep_table(start + step * np.arange(count))
+
+
+class ChunkedPort:
+    """Serial port stand-in that hands over preset byte chunks, one per read"""
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size=1):
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+def test_encode_frame():
+    frame = encode_frame(CMD_STATUS, seq=7)
+    assert frame == bytes([SYNC, CMD_STATUS | 0x80, 7, (CMD_STATUS | 0x80) ^ 7])
+    with pytest.raises(ValueError):
+        encode_frame(CMD_REGS, b"\x00" * 23)
+
+
+def test_events_split_across_reads():
+    protocol = BinaryProtocol(ChunkedPort([bytes([EVT_STEP | 1, 0x01]), bytes([0x02, EVT_STEP, 0]),
+                                           bytes([3, EVT_DONE | 1, 0, 4])]))
+    events = []
+    for _ in range(3):
+        events += protocol.read_events()
+    assert [(e["index"], e["locked"], e["done"]) for e in events] == [
+        (0x102, True, False), (3, False, False), (4, True, True)]
+
+
+def test_table_entries_program_their_frequencies(device):
+    model = ADF4351Registers()
+    table = model.sweep_table([2800.1e6, 2800.2e6, 2199.9e6, 2800.3e6])
+    protocol = binary(device, model)
+    protocol.load_table(table["registers"])
+    for index, actual in enumerate(table["actual"]):
+        protocol.select(index)
+        assert device.frequency == pytest.approx(actual, abs=1e-3)
+
+
+def test_table_with_differing_mod_is_refused(device):
+    # Each entry has its own MOD in R1, which a table entry cannot carry
+    table = ADF4351Registers(reduce_fraction=True).sweep_table([2800.1e6, 2800.2e6, 2800.3e6])
+    assert len(set(table["mod"])) > 1
+    protocol = binary(device)
+    with pytest.raises(ValueError, match="R1"):
+        protocol.load_table(table["registers"])
+    with pytest.raises(ValueError, match="R1"):
+        protocol.run_sweep(table["registers"], 0.001)
+    assert not device.sweep_log
+
+
+def test_source_refuses_reduced_fraction_model():
+    with pytest.raises(ValueError):
+        SimulatedSource(model=ADF4351Registers(reduce_fraction=True))
+
+
+def test_start_sweep_reports_every_step_then_done(device):
+    protocol = binary(device)
+    sweep = table(20)
+    protocol.load_table(sweep["registers"])
+    protocol.start_sweep(20, 0.001)
+    events = []
+    deadline = time.perf_counter() + 2
+    while not (events and events[-1]["done"]):
+        assert time.perf_counter() < deadline
+        events += protocol.read_events(timeout=0.05)
+    assert [e["index"] for e in events[:-1]] == list(range(20))
+    assert all(e["locked"] for e in events)
+    assert events[-1]["index"] == 20
+    assert [index for t, index in device.sweep_log] == list(range(20))
+    assert device.frequency == pytest.approx(sweep["actual"][-1], abs=1e-3)
+    assert not protocol.status()["sweeping"]
+
+
+def test_start_sweep_checks_the_table_range(device):
+    protocol = binary(device)
+    with pytest.raises(ValueError):
+        protocol.start_sweep(TABLE_SIZE + 1, 0.001)
+    with pytest.raises(ValueError):
+        protocol.start_sweep(10, 0.001, first=TABLE_SIZE - 5)
+
+
+def test_run_sweep_longer_than_the_table(device):
+    # Uploaded and run in chunks of TABLE_SIZE entries
+    count = 2 * TABLE_SIZE + 44
+    sweep = table(count, start=35e6, step=14e6)
+    reported = []
+    steps = binary(device).run_sweep(sweep["registers"], 0.0002,
+                                     on_step=lambda index, locked: reported.append(index))
+    assert [index for index, locked in steps] == list(range(count))
+    assert reported == list(range(count))
+    chunk_indices = [index for t, index in device.sweep_log]
+    assert chunk_indices == list(range(TABLE_SIZE)) * 2 + list(range(44))
+    assert device.frequency == pytest.approx(sweep["actual"][-1], abs=1e-3)
+
+
+def test_run_sweep_stops_partway(device):
+    protocol = binary(device)
+    steps = []
+    result = protocol.run_sweep(table(100)["registers"], 0.002, on_step=lambda *step: steps.append(step),
+                                should_stop=lambda: len(steps) >= 10)
+    assert 10 <= len(result) < 100
+    assert not protocol.status()["sweeping"]
+    stopped_at = len(device.sweep_log)
+    time.sleep(0.02)
+    assert len(device.sweep_log) == stopped_at
+
+
+def test_stop_sweep_ends_a_repeating_sweep(device):
+    protocol = binary(device)
+    protocol.load_table(table(4)["registers"])
+    protocol.start_sweep(4, 0.0005, repeat=True)
+    time.sleep(0.01)
+    assert protocol.status()["sweeping"]
+    protocol.stop_sweep()
+    assert not protocol.status()["sweeping"]
+    assert len(device.sweep_log) > 4
+
+
+def test_timed_sweep_keeps_its_schedule(device):
+    binary(device).run_sweep(table(50)["registers"], 0.002)
+    times = np.array([t for t, index in device.sweep_log])
+    lateness = times - times[0] - 0.002 * np.arange(len(times))
+    assert np.max(lateness) < 0.002
+
+
+@pytest.mark.parametrize("settle", [None, 50e-6])
+def test_unlocked_steps_are_reported(settle):
+    device = SimulatedADF4351(locked=False)
+    try:
+        steps = binary(device).run_sweep(table(5)["registers"], 0.001, settle=settle, lock_timeout=0.001)
+    finally:
+        device.close()
+    assert [index for index, locked in steps] == list(range(5))
+    assert not any(locked for index, locked in steps)
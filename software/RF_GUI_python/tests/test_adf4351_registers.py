@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from adf4351_registers import (FIRMWARE_REGISTERS, FREQ_MAX, FREQ_MIN, VCO_MAX, VCO_MIN, ADF4351Registers,
+                               decode_frequency, decode_registers, firmware_calculate_r0, pack_register,
+                               unpack_register)
+
+FIRMWARE = ADF4351Registers()
+
+
+def test_datasheet_example():
+    # 2112.6 MHz from a 10 MHz reference with 200 kHz resolution gives RF
+    # divider 2, VCO 4225.2 MHz, INT 422, FRAC 13, MOD 25
+    model = ADF4351Registers(ref_freq=10e6, channel_spacing=200e3, reduce_fraction=True)
+    result = model.solve(2112.6e6)
+    assert result["divider"] == 2
+    assert result["vco"] == pytest.approx(4225.2e6, abs=1e-3)
+    assert (result["int"], result["frac"], result["mod"]) == (422, 13, 25)
+    assert result["actual"] == pytest.approx(2112.6e6, abs=1e-3)
+    # Band-select clock at most 125 kHz: 10 MHz / 80
+    assert model.band_select_divider == 80 and model.band_select_clock == 125e3
+
+
+def test_firmware_words_decode_and_repack():
+    # 25 MHz PFD, 125 kHz band-select clock (25 MHz / 200), +5 dBm,
+    # fundamental feedback, digital lock detect on the LD pin
+    fields = decode_registers(FIRMWARE_REGISTERS)
+    assert fields[2]["r_counter"] == 1 and fields[4]["band_select_div"] == 200
+    assert fields[4]["output_power"] == 3 and fields[4]["feedback_select"] == 1
+    assert fields[5]["ld_pin_mode"] == 1
+    assert [pack_register(n, fields[n]) for n in range(1, 6)] == list(FIRMWARE_REGISTERS[1:])
+    assert FIRMWARE.band_select_divider == 200
+
+
+@pytest.mark.parametrize("freq", [50e6, 90e6, 100e6, 437.5e6, 1000e6, 2900e6, 4000e6])
+def test_integer_n_matches_firmware(freq):
+    words = ADF4351Registers(fractional=False).registers(freq)
+    assert (words[0], words[4]) == firmware_calculate_r0(int(freq))
+
+
+def test_integer_n_fixes_firmware_overflow():
+    # calculateR0() overflows uint32 above 4294.967 MHz
+    words = ADF4351Registers(fractional=False).registers(4.4e9)
+    assert unpack_register(words[0])[1]["int"] == 176
+    r0, _ = firmware_calculate_r0(4400000000)
+    assert unpack_register(r0)[1]["int"] != 176
+
+
+def test_fractional_round_trip():
+    # Decoded words give the computed frequency, within half a channel of the request
+    rng = np.random.default_rng(1)
+    freqs = rng.uniform(FREQ_MIN, FREQ_MAX, 2000)
+    table = FIRMWARE.sweep_table(freqs)
+    assert np.all(np.abs(table["error"]) <= FIRMWARE.channel_spacing / 2 / table["divider"] + 1e-3)
+    assert np.all((table["vco"] >= VCO_MIN) & (table["vco"] <= VCO_MAX + FIRMWARE.pfd))
+    for i in rng.integers(0, len(freqs), 200):
+        assert decode_frequency(table["registers"][i]) == pytest.approx(table["actual"][i], abs=1e-3)
+        assert FIRMWARE.registers(freqs[i]) == [int(word) for word in table["registers"][i]]
+
+
+@pytest.mark.parametrize("freq", [34e6, 4.5e9])
+def test_out_of_range_rejected(freq):
+    with pytest.raises(ValueError):
+        FIRMWARE.registers(freq)
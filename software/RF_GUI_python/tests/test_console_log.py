@@ -0,0 +1,69 @@
+import logging
+import threading
+from console_log import ConsoleLog, level_of
+
+
+def messages(lines):
+    return [line.split("] ", 1)[1].rstrip("\n") for _, line in lines]
+
+
+def test_ring_keeps_the_newest_lines_and_counts_the_rest():
+    log = ConsoleLog(max_lines=5)
+    for index in range(8):
+        log.log(f"line {index}")
+    assert len(log.lines) == 5 and log.dropped == 3
+    assert messages(log.drain()) == [f"line {index}" for index in range(3, 8)]
+    # Draining makes room again: nothing more is dropped until the ring refills
+    log.log("line 8")
+    assert log.dropped == 3 and messages(log.drain()) == ["line 8"]
+    assert log.drain() == []
+
+
+def test_levels_from_the_gui_prefixes():
+    assert level_of("Sweep error: port lost") == logging.ERROR
+    assert level_of("Warning: PLL not locked") == logging.WARNING
+    assert level_of("Device response: DEBUG: Lock wait (us): 212") == logging.DEBUG
+    assert level_of("Sending command: FREQ:2800.000") == logging.DEBUG
+    assert level_of("Device response: OK") == logging.INFO
+
+
+def test_drain_filters_below_the_display_level():
+    log = ConsoleLog(level=logging.INFO)
+    log.log("Sending command: FREQ:2800.000")
+    log.log("Device response: OK")
+    log.log("Warning: PLL not locked")
+    log.log("explicit debug", level=logging.DEBUG)
+    lines = log.drain()
+    assert [level for level, _ in lines] == [logging.INFO, logging.WARNING]
+    assert messages(lines) == ["Device response: OK", "Warning: PLL not locked"]
+    # Filtered lines are consumed, not left for the next drain
+    assert not log.lines
+
+
+def test_log_file_rotates_on_the_listener_thread(tmp_path):
+    path = tmp_path / "console.log"
+    log = ConsoleLog(max_lines=10, path=str(path), max_bytes=2000, backups=20)
+    handler = log.listener.handlers[0]
+    threads = set()
+    emit = handler.emit
+
+    def recording_emit(record):
+        threads.add(threading.current_thread())
+        emit(record)
+
+    handler.emit = recording_emit
+    for index in range(200):
+        log.log(f"Device response: DEBUG: Lock wait (us): {index}")
+    log.close()
+    assert log.listener is None
+    assert threads and threading.current_thread() not in threads
+    # close() wrote out every queued record, across the rotated files
+    files = sorted(tmp_path.iterdir(), key=lambda f: -int(f.suffix[1:]) if f.suffix != ".log" else 0)
+    assert len(files) > 2
+    assert all(f.stat().st_size <= 2000 for f in files)
+    lines = [line for f in files for line in f.read_text().splitlines()]
+    assert len(lines) == 200
+    assert all(line.endswith(f"DEBUG   Device response: DEBUG: Lock wait (us): {index}")
+               for index, line in enumerate(lines))
+    # The console ring is independent of the file
+    assert log.dropped == 190
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from adf4351_registers import ADF4351Registers
+from rf_source import SimulatedSource
+
+FREQS = 2860e6 + 0.1e6 * np.arange(20) + 0.02e6
+
+
+@pytest.fixture(params=[False, True], ids=["text", "binary"])
+def source(request):
+    with SimulatedSource(binary=request.param) as source:
+        yield source
+
+
+def test_set_frequency_reports_what_the_board_programs(source):
+    result = source.set_frequency(2870.5e6)
+    assert result["ok"] and result["locked"]
+    assert result["frequency"] == pytest.approx(source.device.frequency, abs=1e-3)
+    # The text firmware reports the frequency it was asked for, not the one programmed
+    expected = source.device.frequency if source.binary else 2870.5e6
+    assert source.status()["frequency"] == pytest.approx(expected, abs=1e-3)
+
+
+def test_frequency_list_runs_on_the_board(source):
+    actual = source.set_frequency_list(FREQS)
+    if source.binary:
+        assert np.array_equal(actual, ADF4351Registers().sweep_table(FREQS)["actual"])
+    else:
+        # FREQ: commands program INT rounded down, in steps of the 25 MHz PFD
+        assert np.all((actual <= FREQS) & (actual > FREQS - 25e6))
+    seen = []
+    steps = source.run_list(0.001, on_step=seen.append)
+    assert steps == seen
+    assert [step["index"] for step in steps] == list(range(len(FREQS)))
+    assert [step["frequency"] for step in steps] == pytest.approx(list(actual), abs=1e-3)
+    assert all(step["locked"] for step in steps)
+    assert source.device.frequency == pytest.approx(actual[-1], abs=1e-3)
+
+
+def test_lock_gated_list(source):
+    source.set_frequency_list(FREQS[:5])
+    steps = source.run_list(0.001, settle=50e-6)
+    assert len(steps) == 5 and all(step["locked"] for step in steps)
+
+
+def test_should_stop_ends_the_run(source):
+    source.set_frequency_list(2800e6 + 1e6 * np.arange(200))
+    seen = []
+    steps = source.run_list(0.002, on_step=seen.append, should_stop=lambda: len(seen) >= 5)
+    assert 5 <= len(steps) < 200
+    assert [step["index"] for step in steps] == list(range(len(steps)))
+    # The source is usable again afterwards
+    assert source.set_frequency(2900e6)["ok"]
+
+
+@pytest.mark.parametrize("freqs", [[30e6], [2800e6, 4.5e9], []], ids=["low", "high", "empty"])
+def test_out_of_range_lists_rejected(source, freqs):
+    with pytest.raises(ValueError):
+        source.set_frequency_list(freqs)
+
+
+def test_out_of_range_frequency_rejected(source):
+    before = source.device.frequency
+    for freq in (34e6, 4.5e9):
+        with pytest.raises(ValueError):
+            source.set_frequency(freq)
+    assert source.device.frequency == before
+
+
+def test_run_without_a_list_rejected(source):
+    with pytest.raises(ValueError):
+        source.run_list(0.001)
@@ -0,0 +1,103 @@
+import time
+import numpy as np
+import pytest
+from sweep_engine import SweepEngine, sweep_frequencies
+
+
+def run(engine, frequencies, dwell, settle=None, on_step=None):
+    """Start a sweep and collect its messages up to and including done"""
+    engine.start(frequencies, dwell, settle=settle)
+    messages = []
+    while True:
+        message = engine.progress.get(timeout=5)
+        messages.append(message)
+        if message["type"] == "step" and on_step is not None:
+            on_step(message)
+        if message["type"] == "done":
+            engine.join()
+            return messages
+
+
+def test_grid_by_index_includes_the_endpoint():
+    freqs = sweep_frequencies(2800.0, 2810.0, 0.1)
+    assert len(freqs) == 101
+    assert freqs[-1] == pytest.approx(2810.0, abs=1e-9)
+    assert np.array_equal(freqs, 2800.0 + 0.1 * np.arange(101))
+    # A running sum drifts and loses the endpoint; the grid by index does not
+    assert len(sweep_frequencies(0.0, 1.0, 0.1)) == 11
+
+
+def test_grid_stops_below_an_endpoint_off_the_grid():
+    assert np.allclose(sweep_frequencies(0.0, 1.0, 0.3), [0.0, 0.3, 0.6, 0.9])
+    assert np.array_equal(sweep_frequencies(5.0, 5.0, 1.0), [5.0])
+
+
+@pytest.mark.parametrize("start, stop, step", [(0.0, 1.0, 0.0), (0.0, 1.0, -0.1), (1.0, 0.0, 0.1)])
+def test_grid_rejects_bad_steps(start, stop, step):
+    with pytest.raises(ValueError):
+        sweep_frequencies(start, stop, step)
+
+
+def test_schedule_does_not_drift_with_slow_retunes():
+    dwell = 0.01
+
+    def slow(freq):
+        # Most of the dwell, and one step far longer than it
+        time.sleep(dwell * 4 if freq == 5 else dwell * 0.6)
+        return {"locked": True}
+
+    messages = run(SweepEngine(slow), np.arange(30.0), dwell)
+    steps = [m for m in messages if m["type"] == "step"]
+    done = messages[-1]
+    assert len(steps) == 30 and not done["stopped"]
+    # The steps after the slow one start late, then catch up 4 ms a step
+    assert steps[6]["error"] > dwell
+    assert max(step["error"] for step in steps[20:]) < dwell / 2
+    assert done["elapsed"] == pytest.approx(30 * dwell, abs=3 * dwell)
+
+
+def test_stop_in_the_middle():
+    engine = SweepEngine(lambda freq: {"locked": True})
+
+    def stop_at_five(step):
+        if step["index"] == 4:
+            engine.stop()
+
+    messages = run(engine, np.arange(100.0), 0.005, on_step=stop_at_five)
+    done = messages[-1]
+    assert done["stopped"]
+    assert 5 <= done["steps"] < 100 and done["count"] == 100
+    assert [m["index"] for m in messages if m["type"] == "step"] == list(range(done["steps"]))
+
+
+def test_error_then_done():
+    def failing(freq):
+        if freq == 3:
+            raise OSError("port lost")
+        return {"locked": True}
+
+    messages = run(SweepEngine(failing), np.arange(10.0), 0.001)
+    assert [m["type"] for m in messages] == ["step"] * 3 + ["error", "done"]
+    assert messages[3]["index"] == 3 and messages[3]["message"] == "port lost"
+    assert messages[-1]["steps"] == 3
+
+
+def test_unlocked_steps_counted_in_gated_mode():
+    locks = [True, False, True, True, False, None]
+    calls = iter(locks)
+    messages = run(SweepEngine(lambda freq: {"locked": next(calls)}), np.arange(6.0), 0.001, settle=1e-4)
+    done = messages[-1]
+    assert done["gated"]
+    assert [m["locked"] for m in messages if m["type"] == "step"] == locks
+    # None (no lock information) is not counted as unlocked
+    assert done["unlocked"] == 2
+
+
+def test_gated_dwell_counts_from_the_valid_point():
+    def lock_wait(freq):
+        time.sleep(0.01)
+        return {"locked": True}
+
+    messages = run(SweepEngine(lock_wait), np.arange(5.0), 0.005, settle=0.002)
+    # Each step: 10 ms lock wait, 2 ms settle, 5 ms hold
+    assert messages[-1]["elapsed"] == pytest.approx(5 * 0.017, abs=0.02)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from adf4351_registers import (FIRMWARE_REGISTERS, FREQ_MAX, FREQ_MIN, ADF4351Registers, firmware_calculate_r0,
+                               write_sequence)
+
+FIRMWARE = ADF4351Registers()
+
+
+def test_write_sequence_sets():
+    # A step within one divider range changes R0 only, a divider change R4
+    # and R0, a new MOD R1 and R0
+    words = FIRMWARE.registers(2800e6)
+    assert write_sequence(words, words) == []
+    assert write_sequence(None, words) == [5, 4, 3, 2, 1, 0]
+    assert write_sequence(words, FIRMWARE.registers(2800.1e6)) == [0]
+    assert write_sequence(FIRMWARE.registers(2199.9e6), FIRMWARE.registers(2200.1e6)) == [4, 0]
+    reduced = ADF4351Registers(reduce_fraction=True)
+    assert write_sequence(reduced.registers(2800.1e6), reduced.registers(2800.2e6)) == [1, 0]
+    r0, r4 = firmware_calculate_r0(1000000000)
+    target = (r0,) + FIRMWARE_REGISTERS[1:4] + (r4,) + FIRMWARE_REGISTERS[5:]
+    assert write_sequence(FIRMWARE_REGISTERS, target) == [4, 0]
+
+
+@pytest.mark.parametrize("freqs", [np.random.default_rng(2).uniform(FREQ_MIN, FREQ_MAX, 500),
+                                   np.linspace(FREQ_MIN, FREQ_MAX, 2000)], ids=["hops", "sweep"])
+def test_write_sequence_replay(freqs):
+    # Replaying the writes leaves the chip holding exactly the target words
+    chip = None
+    writes = 0
+    for words in FIRMWARE.sweep_table(freqs)["registers"]:
+        sequence = write_sequence(chip, words)
+        assert sequence == sorted(sequence, reverse=True) and (not sequence or sequence[-1] == 0)
+        chip = list(words) if chip is None else chip
+        for n in sequence:
+            chip[n] = int(words[n])
+        assert chip == [int(word) for word in words]
+        writes += len(sequence)
+    assert writes < 6 * len(freqs)
@@ -1,14 +1,23 @@
 import sys
 import time
 import numpy as np
-import pyvisa
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
                              QHBoxLayout, QWidget, QLabel, QComboBox, QSpinBox,
                              QDoubleSpinBox, QGroupBox, QStatusBar, QMessageBox,
-                             QGridLayout, QLineEdit, QCheckBox, QFrame)
-from PyQt5.QtCore import Qt, QTimer
+                             QGridLayout, QLineEdit, QCheckBox, QFrame, QFileDialog)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QColor
 import pyqtgraph as pg
+from scope_recorder import FrameRecorder
+from plot_decimation import EnvelopeDecimator
+from scope_measurements import MeasurementEngine, format_frequency
+from scope_averaging import TraceAverager, AVERAGING_MODES
+from scope_lockin import FrameLockIn
+from scope_pipeline import DutyCycleMeter
+from scope_transport import ScpiTransport, TransportError
+from redpitaya_acquisition import RedPitayaAcquisition
+from scope_timing import PhaseTimer
+from history_viewer import HistoryViewer
 
 
 class TriggerIndicator(QFrame):
@@ -40,15 +49,143 @@ class TriggerIndicator(QFrame):
         self.update()
 
 
+class AcquisitionWorker(QThread):
+    """Runs continuous acquisition, averaging and recording off the GUI thread"""
+    frame_ready = pyqtSignal(object)
+    trigger_status = pyqtSignal(str)
+    message = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    duty_cycle = pyqtSignal(str)
+    
+    def __init__(self, scope):
+        super().__init__()
+        self.scope = scope
+        self.settings = scope.acquisition_settings()
+        self.running = False
+        self.display_pending = False
+        self.last_status = None
+        self.failed_frames = 0
+        self.consecutive_failures = 0
+        self.max_consecutive_failures = 10
+        self.duty_reported_at = 0.0
+        
+    def stop(self):
+        self.running = False
+        self.wait()
+        
+    def run(self):
+        self.running = True
+        meter = DutyCycleMeter()
+        while self.running:
+            # Settings are a snapshot taken on the GUI thread
+            settings = self.settings
+            if settings["pipelined"]:
+                try:
+                    self.run_pipelined(settings)
+                except (TransportError, ValueError) as e:
+                    if not self.frame_failed(e):
+                        break
+                except Exception as e:
+                    if self.running:
+                        self.failed.emit(str(e))
+                    break
+                meter.reset()
+                continue
+            
+            frame_started = time.perf_counter()
+            try:
+                frame = self.scope.acquire_frame(settings, self.message.emit, lambda: not self.running)
+            except (TransportError, ValueError) as e:
+                if not self.frame_failed(e):
+                    break
+                continue
+            except Exception as e:
+                if self.running:
+                    self.failed.emit(str(e))
+                break
+            
+            self.consecutive_failures = 0
+            if frame is None:
+                if self.running:
+                    self.set_trigger_status("TIMEOUT")
+                continue
+            self.set_trigger_status("TRIGGERED")
+            
+            frame_time, data_ch1, data_ch2 = frame
+            meter.add_frame(settings["buffer_size"] * settings["decimation"] / 125e6)
+            self.process_frame(frame_time, data_ch1, data_ch2, settings, meter)
+            if self.scope.timer.enabled:
+                self.scope.timer.record("frame", time.perf_counter() - frame_started)
+    
+    def run_pipelined(self, settings):
+        """Double-buffered loop, re-arming right after each transfer, until the settings change"""
+        def on_frame(frame_time, data_ch1, data_ch2):
+            # The pipeline reuses its buffers, the recorder needs its own copy
+            if self.scope.recorder is not None:
+                data_ch1, data_ch2 = data_ch1.copy(), data_ch2.copy()
+            self.set_trigger_status("TRIGGERED")
+            self.consecutive_failures = 0
+            self.process_frame(frame_time, data_ch1, data_ch2, settings, acquisition.meter)
+        
+        acquisition = self.scope.acquisition.pipelined(settings, on_frame)
+        acquisition.run(
+            should_stop=lambda: not self.running or self.settings != settings,
+            report=self.message.emit
+        )
+    
+    def process_frame(self, frame_time, data_ch1, data_ch2, settings, meter):
+        """Record, demodulate and average one frame, then hand it to the GUI if it is free"""
+        with self.scope.timer.phase("process"):
+            self.scope.record_frame(frame_time, data_ch1, data_ch2, settings)
+            self.scope.demodulate_frame(frame_time, data_ch1, data_ch2, settings)
+            averaged = self.scope.averager.add(data_ch1, data_ch2)
+        
+        # Acquisition time / wall time, refreshed twice a second
+        now = time.perf_counter()
+        if now - self.duty_reported_at > 0.5:
+            self.duty_reported_at = now
+            mode = "pipelined" if settings["pipelined"] else "serial"
+            self.duty_cycle.emit(f"Duty Cycle: {meter.summary()} ({mode})")
+        
+        # Averaging runs on every frame, but only hand a frame to the GUI
+        # once it has drawn the previous one
+        if not self.display_pending:
+            self.display_pending = True
+            self.frame_ready.emit((frame_time, averaged.copy(), self.scope.averager.frame_count, settings))
+    
+    def frame_failed(self, error):
+        """
+        Count a failed frame, which is dropped rather than averaged or recorded
+        
+        Returns False once too many frames in a row have failed and the worker
+        should give up.
+        """
+        self.failed_frames += 1
+        self.consecutive_failures += 1
+        if not self.running:
+            return False
+        if self.consecutive_failures > self.max_consecutive_failures:
+            self.failed.emit(f"{self.consecutive_failures} frames failed in a row: {str(error)}")
+            return False
+        self.message.emit(f"Frame failed ({self.failed_frames} so far): {str(error)}")
+        return True
+    
+    def set_trigger_status(self, status):
+        # Only signal changes, the pipelined loop can run at hundreds of frames/s
+        if status != self.last_status:
+            self.last_status = status
+            self.trigger_status.emit(status)
+
+
 class RedPitayaOscilloscope(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Red Pitaya Dual Channel Oscilloscope")
         self.setGeometry(100, 100, 1200, 800)
         
-        # Initialize VISA resource manager
-        self.rm = pyvisa.ResourceManager('@py')
+        # SCPI transport and GUI-free acquisition core, created on connect
         self.device = None
+        self.acquisition = None
         self.connected = False
         
         # Initialize data for both channels
@@ -56,13 +193,35 @@ class RedPitayaOscilloscope(QMainWindow):
         self.data_ch2 = np.zeros(1024)
         self.time_data = np.linspace(0, 131.072, 1024)
         
+        # Min/max envelope decimation for display, caches time axes per frame size
+        self.plot_decimator = EnvelopeDecimator()
+        
+        # Batched two-channel measurements with cached window and frequency axis
+        self.measurement_engine = MeasurementEngine()
+        
+        # Frame recorder, active while recording
+        self.recorder = None
+        self.history_viewers = []
+        
+        # In-place trace averaging, shared by single and continuous acquisition
+        self.averager = TraceAverager()
+        
+        # Live lock-in of CH1 against the CH2 reference, run on every raw frame
+        self.lockin = FrameLockIn()
+        
+        # Continuous acquisition worker thread
+        self.worker = None
+        
+        # Result of the last segmented capture
+        self.segments = None
+        
+        # Per-phase frame timing, a no-op until enabled
+        self.timer = PhaseTimer()
+        self.timing_reported_at = 0.0
+        
         # Setup UI
         self.setup_ui()
         
-        # Setup timer for updating plot
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_plot)
-        
         # Decimation factors and corresponding sample rates
         self.decimation_factors = {
             "1": "125 MS/s",
@@ -132,6 +291,12 @@ class RedPitayaOscilloscope(QMainWindow):
         self.trigger_test_button.clicked.connect(self.run_trigger_test)
         self.trigger_test_button.setEnabled(False)
         
+        # Pipelined re-arm for continuous acquisition, and its measured duty cycle
+        self.pipelined_checkbox = QCheckBox("Pipelined Re-arm")
+        self.pipelined_checkbox.setChecked(False)
+        self.pipelined_checkbox.setToolTip("Re-arm right after each transfer and process the frame while the next one is collected")
+        self.duty_cycle_display = QLabel("Duty Cycle: N/A")
+        
         # Horizontal settings
         self.decimation_label = QLabel("Decimation:")
         self.decimation_select = QComboBox()
@@ -156,6 +321,32 @@ class RedPitayaOscilloscope(QMainWindow):
         self.pretrigger_input.setSingleStep(128)
         self.pretrigger_input.setValue(0)
         
+        # Recording ring limit
+        self.ring_limit_label = QLabel("Record Ring Limit (frames):")
+        self.ring_limit_input = QSpinBox()
+        self.ring_limit_input.setRange(0, 10000000)
+        self.ring_limit_input.setSingleStep(1000)
+        self.ring_limit_input.setValue(0)
+        self.ring_limit_input.setSpecialValueText("Unlimited")
+        self.ring_limit_input.setToolTip("Keep only the newest N frames on disk (0 = unlimited)")
+        
+        # Trace averaging
+        self.averaging_label = QLabel("Averaging:")
+        self.averaging_select = QComboBox()
+        self.averaging_select.addItems(AVERAGING_MODES)
+        self.averaging_select.currentIndexChanged.connect(self.update_averaging)
+        
+        self.averaging_frames_label = QLabel("Average Frames:")
+        self.averaging_frames_input = QSpinBox()
+        self.averaging_frames_input.setRange(2, 1024)
+        self.averaging_frames_input.setValue(16)
+        self.averaging_frames_input.setToolTip("Window for linear averaging, time constant for exponential")
+        self.averaging_frames_input.valueChanged.connect(self.update_averaging)
+        
+        self.averaging_reset_button = QPushButton("Reset Average")
+        self.averaging_reset_button.clicked.connect(self.reset_averaging)
+        self.averaging_count_display = QLabel("Frames: 0")
+        
         # Grid layout for acquisition settings
         acq_layout.addWidget(self.show_ch1_checkbox, 0, 0)
         acq_layout.addWidget(self.show_ch2_checkbox, 0, 1)
@@ -167,6 +358,8 @@ class RedPitayaOscilloscope(QMainWindow):
         acq_layout.addWidget(self.trigger_indicator_label, 1, 0)
         acq_layout.addWidget(self.trigger_indicator, 1, 1)
         acq_layout.addWidget(self.trigger_test_button, 1, 2)
+        acq_layout.addWidget(self.pipelined_checkbox, 1, 3)
+        acq_layout.addWidget(self.duty_cycle_display, 1, 4, 1, 2)
         
         acq_layout.addWidget(self.decimation_label, 2, 0)
         acq_layout.addWidget(self.decimation_select, 2, 1)
@@ -176,6 +369,14 @@ class RedPitayaOscilloscope(QMainWindow):
         acq_layout.addWidget(self.buffer_size_input, 2, 5)
         acq_layout.addWidget(self.pretrigger_label, 3, 0)
         acq_layout.addWidget(self.pretrigger_input, 3, 1)
+        acq_layout.addWidget(self.ring_limit_label, 3, 2)
+        acq_layout.addWidget(self.ring_limit_input, 3, 3)
+        acq_layout.addWidget(self.averaging_label, 4, 0)
+        acq_layout.addWidget(self.averaging_select, 4, 1)
+        acq_layout.addWidget(self.averaging_frames_label, 4, 2)
+        acq_layout.addWidget(self.averaging_frames_input, 4, 3)
+        acq_layout.addWidget(self.averaging_reset_button, 4, 4)
+        acq_layout.addWidget(self.averaging_count_display, 4, 5)
         
         # Measurement settings
         measure_group = QGroupBox("Measurements")
@@ -187,12 +388,22 @@ class RedPitayaOscilloscope(QMainWindow):
         self.ch1_freq_display = QLabel("Frequency: N/A")
         self.ch1_vpp_display = QLabel("Vpp: N/A")
         self.ch1_vrms_display = QLabel("Vrms: N/A")
+        self.ch1_mean_display = QLabel("DC: N/A")
+        self.ch1_thd_display = QLabel("THD: N/A")
+        self.ch1_snr_display = QLabel("SNR: N/A")
         
         # Channel 2 Measurements
         self.ch2_label = QLabel("Channel 2:")
         self.ch2_freq_display = QLabel("Frequency: N/A")
         self.ch2_vpp_display = QLabel("Vpp: N/A")
         self.ch2_vrms_display = QLabel("Vrms: N/A")
+        self.ch2_mean_display = QLabel("DC: N/A")
+        self.ch2_thd_display = QLabel("THD: N/A")
+        self.ch2_snr_display = QLabel("SNR: N/A")
+        
+        # Channel relationship
+        self.phase_label = QLabel("CH1-CH2:")
+        self.phase_display = QLabel("Phase: N/A")
         
         # Measurement options
         self.show_freq_checkbox = QCheckBox("Measure Frequency")
@@ -201,21 +412,55 @@ class RedPitayaOscilloscope(QMainWindow):
         self.show_vpp_checkbox.setChecked(True)
         self.show_vrms_checkbox = QCheckBox("Measure Vrms")
         self.show_vrms_checkbox.setChecked(True)
+        self.show_dc_checkbox = QCheckBox("Measure DC Mean")
+        self.show_dc_checkbox.setChecked(True)
+        self.show_thd_checkbox = QCheckBox("Measure THD/SNR")
+        self.show_thd_checkbox.setChecked(False)
+        self.show_phase_checkbox = QCheckBox("Measure Phase")
+        self.show_phase_checkbox.setChecked(False)
+        self.zoom_freq_checkbox = QCheckBox("Zoom FFT Frequency")
+        self.zoom_freq_checkbox.setChecked(False)
+        self.zoom_freq_checkbox.setToolTip("Refine the interpolated frequency with a zoom DFT around the peak")
+        
+        # Live lock-in (CH1 signal, CH2 reference)
+        self.lockin_checkbox = QCheckBox("Live Lock-In")
+        self.lockin_checkbox.setChecked(False)
+        self.lockin_checkbox.setToolTip("Demodulate CH1 against the CH2 reference on every frame")
+        self.lockin_checkbox.stateChanged.connect(self.update_lockin_visibility)
+        self.lockin_display = QLabel("X: N/A  Y: N/A  R: N/A  Theta: N/A")
+        self.lockin_reset_button = QPushButton("Reset Lock-In")
+        self.lockin_reset_button.clicked.connect(self.reset_lockin)
         
         # Add to layout
         measure_layout.addWidget(self.show_freq_checkbox, 0, 0)
         measure_layout.addWidget(self.show_vpp_checkbox, 0, 1)
         measure_layout.addWidget(self.show_vrms_checkbox, 0, 2)
+        measure_layout.addWidget(self.show_dc_checkbox, 0, 3)
+        measure_layout.addWidget(self.show_thd_checkbox, 0, 4)
+        measure_layout.addWidget(self.show_phase_checkbox, 0, 5)
+        measure_layout.addWidget(self.zoom_freq_checkbox, 0, 6)
         
         measure_layout.addWidget(self.ch1_label, 1, 0)
         measure_layout.addWidget(self.ch1_freq_display, 1, 1)
         measure_layout.addWidget(self.ch1_vpp_display, 1, 2)
         measure_layout.addWidget(self.ch1_vrms_display, 1, 3)
+        measure_layout.addWidget(self.ch1_mean_display, 1, 4)
+        measure_layout.addWidget(self.ch1_thd_display, 1, 5)
+        measure_layout.addWidget(self.ch1_snr_display, 1, 6)
         
         measure_layout.addWidget(self.ch2_label, 2, 0)
         measure_layout.addWidget(self.ch2_freq_display, 2, 1)
         measure_layout.addWidget(self.ch2_vpp_display, 2, 2)
         measure_layout.addWidget(self.ch2_vrms_display, 2, 3)
+        measure_layout.addWidget(self.ch2_mean_display, 2, 4)
+        measure_layout.addWidget(self.ch2_thd_display, 2, 5)
+        measure_layout.addWidget(self.ch2_snr_display, 2, 6)
+        
+        measure_layout.addWidget(self.phase_label, 3, 0)
+        measure_layout.addWidget(self.phase_display, 3, 1)
+        measure_layout.addWidget(self.lockin_checkbox, 3, 2)
+        measure_layout.addWidget(self.lockin_display, 3, 3, 1, 3)
+        measure_layout.addWidget(self.lockin_reset_button, 3, 6)
         
         # Control buttons
         control_layout = QHBoxLayout()
@@ -233,9 +478,40 @@ class RedPitayaOscilloscope(QMainWindow):
         self.auto_scale_button.clicked.connect(self.auto_scale)
         self.auto_scale_button.setEnabled(False)
         
+        self.record_button = QPushButton("Start Recording")
+        self.record_button.clicked.connect(self.toggle_recording)
+        self.history_button = QPushButton("View History")
+        self.history_button.setToolTip("Browse a finished recording at any zoom level")
+        self.history_button.clicked.connect(self.open_history)
+        
+        # Segmented multi-trigger capture
+        self.segments_label = QLabel("Segments:")
+        self.segments_input = QSpinBox()
+        self.segments_input.setRange(2, 100000)
+        self.segments_input.setValue(100)
+        self.segments_input.setToolTip("Number of triggered frames in a segmented capture")
+        self.segmented_button = QPushButton("Segmented Capture")
+        self.segmented_button.clicked.connect(self.segmented_acquisition)
+        self.segmented_button.setEnabled(False)
+        
+        # Per-phase timing
+        self.timing_checkbox = QCheckBox("Phase Timing")
+        self.timing_checkbox.setChecked(False)
+        self.timing_checkbox.setToolTip("Time setup, trigger wait, transfer, parsing, processing and plotting per frame")
+        self.timing_checkbox.stateChanged.connect(self.update_timing)
+        self.timing_export_button = QPushButton("Export Timing")
+        self.timing_export_button.clicked.connect(self.export_timing)
+        
         control_layout.addWidget(self.acquire_button)
         control_layout.addWidget(self.continuous_button)
         control_layout.addWidget(self.auto_scale_button)
+        control_layout.addWidget(self.record_button)
+        control_layout.addWidget(self.history_button)
+        control_layout.addWidget(self.segments_label)
+        control_layout.addWidget(self.segments_input)
+        control_layout.addWidget(self.segmented_button)
+        control_layout.addWidget(self.timing_checkbox)
+        control_layout.addWidget(self.timing_export_button)
         
         # Plot
         self.plot_widget = pg.PlotWidget()
@@ -258,10 +534,29 @@ class RedPitayaOscilloscope(QMainWindow):
         )
         self.plot_widget.addItem(self.trigger_line)
         
+        # Lock-in trend plots: amplitudes on top, phase below
+        self.lockin_widget = pg.GraphicsLayoutWidget()
+        self.lockin_amplitude_plot = self.lockin_widget.addPlot(row=0, col=0)
+        self.lockin_amplitude_plot.setLabel('left', 'Lock-In', 'V')
+        self.lockin_amplitude_plot.showGrid(x=True, y=True)
+        self.lockin_amplitude_plot.addLegend()
+        self.lockin_curve_x = self.lockin_amplitude_plot.plot(pen=pg.mkPen('y', width=2), name='X')
+        self.lockin_curve_y = self.lockin_amplitude_plot.plot(pen=pg.mkPen('c', width=2), name='Y')
+        self.lockin_curve_r = self.lockin_amplitude_plot.plot(pen=pg.mkPen('w', width=2), name='R')
+        self.lockin_phase_plot = self.lockin_widget.addPlot(row=1, col=0)
+        self.lockin_phase_plot.setLabel('left', 'Theta', 'deg')
+        self.lockin_phase_plot.setLabel('bottom', 'Time', 's')
+        self.lockin_phase_plot.showGrid(x=True, y=True)
+        self.lockin_phase_plot.setXLink(self.lockin_amplitude_plot)
+        self.lockin_curve_theta = self.lockin_phase_plot.plot(pen=pg.mkPen('m', width=2))
+        self.lockin_widget.setVisible(False)
+        
         # Status bar
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Not connected")
+        self.timing_display = QLabel("")
+        self.status_bar.addPermanentWidget(self.timing_display)
         
         # Add widgets to main layout
         main_layout.addWidget(connection_group)
@@ -269,6 +564,7 @@ class RedPitayaOscilloscope(QMainWindow):
         main_layout.addWidget(measure_group)
         main_layout.addLayout(control_layout)
         main_layout.addWidget(self.plot_widget, stretch=1)
+        main_layout.addWidget(self.lockin_widget, stretch=1)
         
         # Connect channel visibility checkboxes
         self.show_ch1_checkbox.stateChanged.connect(self.update_channel_visibility)
@@ -279,6 +575,10 @@ class RedPitayaOscilloscope(QMainWindow):
         self.plot_curve_ch1.setVisible(self.show_ch1_checkbox.isChecked())
         self.plot_curve_ch2.setVisible(self.show_ch2_checkbox.isChecked())
     
+    def update_lockin_visibility(self):
+        """Show the lock-in trend plots only while the lock-in is enabled"""
+        self.lockin_widget.setVisible(self.lockin_checkbox.isChecked())
+    
     def update_sample_rate_display(self):
         decimation = self.decimation_select.currentText()
         sample_rate = self.decimation_factors.get(decimation, "Unknown")
@@ -293,20 +593,19 @@ class RedPitayaOscilloscope(QMainWindow):
             try:
                 ip = self.ip_input.text()
                 port = self.port_input.text()
-                resource_string = f"TCPIP::{ip}::{port}::SOCKET"
-                self.device = self.rm.open_resource(resource_string)
-                self.device.read_termination = '\r\n'
-                self.device.write_termination = '\r\n'
-                self.device.timeout = 5000  # 5 seconds timeout
+                # Reconnects with backoff and replays settings if the link drops
+                self.device = ScpiTransport(ip, int(port), timeout_ms=5000)
                 
                 # Test connection
-                idn = self.device.query("*IDN?")
+                idn = self.device.open()
+                self.acquisition = RedPitayaAcquisition(self.device, self.timer)
                 self.status_bar.showMessage(f"Connected to: {idn}")
                 self.connected = True
                 self.connect_button.setText("Disconnect")
                 
                 # Enable control buttons
                 self.acquire_button.setEnabled(True)
+                self.segmented_button.setEnabled(True)
                 self.continuous_button.setEnabled(True)
                 self.auto_scale_button.setEnabled(True)
                 self.trigger_test_button.setEnabled(True)
@@ -326,9 +625,11 @@ class RedPitayaOscilloscope(QMainWindow):
                 
                 self.device.close()
                 self.device = None
+                self.acquisition = None
                 self.connected = False
                 self.connect_button.setText("Connect")
                 self.acquire_button.setEnabled(False)
+                self.segmented_button.setEnabled(False)
                 self.continuous_button.setEnabled(False)
                 self.auto_scale_button.setEnabled(False)
                 self.trigger_test_button.setEnabled(False)
@@ -337,53 +638,25 @@ class RedPitayaOscilloscope(QMainWindow):
             except Exception as e:
                 QMessageBox.warning(self, "Disconnection Error", f"Error during disconnection: {str(e)}")
     
+    def acquisition_settings(self):
+        """Snapshot of the acquisition settings, safe to hand to the worker thread"""
+        return {
+            "decimation": int(self.decimation_select.currentText()),
+            "buffer_size": self.buffer_size_input.value(),
+            "pretrigger": self.pretrigger_input.value(),
+            "trigger_source": self.trigger_source_select.currentText(),
+            "trigger_level": self.trigger_level_input.value(),
+            "lockin": self.lockin_checkbox.isChecked(),
+            "pipelined": self.pipelined_checkbox.isChecked(),
+        }
+    
+    def configure_device(self, settings):
+        """Send acquisition settings to the device (no widget access)"""
+        self.acquisition.configure(settings)
+    
     def setup_acquisition(self):
         try:
-            # Reset acquisition
-            self.device.write("ACQ:RST")
-            time.sleep(0.1)  # Add small delay to ensure command is processed
-            
-            # Make sure to stop any previous acquisition
-            self.device.write("ACQ:STOP")
-            time.sleep(0.1)
-            
-            # Set decimation
-            decimation = self.decimation_select.currentText()
-            self.device.write(f"ACQ:DEC {decimation}")
-            
-            # Set buffer size (custom acquisition points)
-            buffer_size = self.buffer_size_input.value()
-            self.device.write(f"ACQ:BUF:SIZE {buffer_size}")
-            
-            # Set pre-trigger samples
-            pretrigger = self.pretrigger_input.value()
-            self.device.write(f"ACQ:TRIG:DLY -{pretrigger}")
-            
-            # Configure trigger source
-            trigger_source = self.trigger_source_select.currentText()
-            if trigger_source != "DISABLED":
-                self.device.write(f"ACQ:TRIG {trigger_source}")
-                
-                # Set trigger level (convert from volts to normalized)
-                trigger_level_v = self.trigger_level_input.value()
-                
-                # Different scaling for different trigger sources
-                if trigger_source.startswith("EXT"):
-                    # External trigger range is typically 0V to 3.3V
-                    normalized_level = trigger_level_v / 3.3
-                    # Clamp between 0 and 1
-                    normalized_level = max(0.0, min(1.0, normalized_level))
-                else:
-                    # Channel triggers use full ADC range (-1 to 1)
-                    normalized_level = trigger_level_v / 20.0  # Convert from ±20V to ±1
-                    # Clamp between -1 and 1
-                    normalized_level = max(-1.0, min(1.0, normalized_level))
-                
-                self.device.write(f"ACQ:TRIG:LEV {normalized_level}")
-            else:
-                # Disable trigger for immediate acquisition
-                self.device.write("ACQ:TRIG:DIS")
-            
+            self.configure_device(self.acquisition_settings())
             self.status_bar.showMessage("Acquisition setup completed")
             self.trigger_indicator.set_status("WAITING")
         except Exception as e:
@@ -464,54 +737,23 @@ class RedPitayaOscilloscope(QMainWindow):
             return
         
         try:
-            # Update acquisition settings
-            self.setup_acquisition()
-            
-            # Start acquisition
-            self.device.write("ACQ:START")
+            settings = self.acquisition_settings()
+            self.trigger_indicator.set_status("WAITING")
             
-            trigger_source = self.trigger_source_select.currentText()
-            if trigger_source != "DISABLED":
-                # Wait for trigger with better status reporting
-                self.status_bar.showMessage("Waiting for trigger...")
-                self.trigger_indicator.set_status("WAITING")
-                
-                # Clear any buffer before checking trigger
-                self.device.clear()
-                
-                # Check if trigger has occurred
-                trigger_state = ""
-                timeout_counter = 0
-                while trigger_state != "TD":
-                    trigger_state = self.device.query("ACQ:TRIG:STAT?").strip()
-                    self.status_bar.showMessage(f"Waiting for trigger... State: {trigger_state}")
-                    time.sleep(0.1)
-                    timeout_counter += 1
-                    if timeout_counter > 50:  # 5 second timeout
-                        self.status_bar.showMessage("Trigger timeout - no trigger detected")
-                        self.trigger_indicator.set_status("TIMEOUT")
-                        self.device.write("ACQ:STOP")
-                        return
-                
-                # Trigger occurred
+            with self.timer.phase("frame"):
+                frame = self.acquire_frame(settings, self.status_bar.showMessage)
+                if frame is None:
+                    self.status_bar.showMessage("Trigger timeout - no trigger detected")
+                    self.trigger_indicator.set_status("TIMEOUT")
+                    return
                 self.trigger_indicator.set_status("TRIGGERED")
-                self.status_bar.showMessage("Trigger detected! Retrieving data...")
-            else:
-                # In disabled trigger mode, just wait a bit for data
-                time.sleep(0.5)
-                self.trigger_indicator.set_status("TRIGGERED")  # Consider it "triggered" for UI consistency
-                self.status_bar.showMessage("Acquiring data without trigger...")
-            
-            # Get data from both channels
-            self.get_channel_data(1)  # Channel 1
-            self.get_channel_data(2)  # Channel 2
-            
-            # Update plot
-            self.plot_curve_ch1.setData(self.time_data, self.data_ch1)
-            self.plot_curve_ch2.setData(self.time_data, self.data_ch2)
-            
-            # Update measurements
-            self.update_measurements()
+                
+                frame_time, data_ch1, data_ch2 = frame
+                with self.timer.phase("process"):
+                    self.record_frame(frame_time, data_ch1, data_ch2, settings)
+                    self.demodulate_frame(frame_time, data_ch1, data_ch2, settings)
+                    averaged = self.averager.add(data_ch1, data_ch2)
+                self.show_frame(averaged.copy(), self.averager.frame_count, settings)
             
             self.status_bar.showMessage(f"Acquisition complete: {len(self.data_ch1)} points per channel")
             
@@ -519,152 +761,308 @@ class RedPitayaOscilloscope(QMainWindow):
             QMessageBox.warning(self, "Acquisition Error", f"Error during acquisition: {str(e)}")
             self.status_bar.showMessage("Acquisition failed")
     
-    def get_channel_data(self, channel_num):
-        """Get data for a specific channel"""
+    def segmented_acquisition(self):
+        """Capture K triggered frames back to back into a (K, 2, samples) array"""
+        if not self.connected:
+            return
+        
         try:
-            # Try with better error handling
-            try:
-                data_str = self.device.query(f"ACQ:SOUR{channel_num}:DATA?")
-            except Exception as query_error:
-                print(f"Error querying CH{channel_num} data: {str(query_error)}")
-                # Try to clear the interface and retry
-                self.device.clear()
-                time.sleep(0.5)
-                data_str = self.device.query(f"ACQ:SOUR{channel_num}:DATA?")
-            
-            # Process data with more robust parsing
-            try:
-                # Replace error markers and clean up the data string
-                clean_data_str = data_str.replace("ERR!", "").replace("{", "").replace("}", "")
-                
-                # Split by commas and handle potential empty strings or non-numeric values
-                values = clean_data_str.split(',')
-                data_list = []
-                for val in values:
-                    val = val.strip()
-                    if val:  # Check if value is not empty
-                        try:
-                            data_list.append(float(val))
-                        except ValueError:
-                            pass  # Skip invalid values
-                
-                if not data_list:
-                    raise ValueError(f"No valid data points received for CH{channel_num}")
-                
-                # Assign data to appropriate channel
-                if channel_num == 1:
-                    self.data_ch1 = np.array(data_list)
-                else:
-                    self.data_ch2 = np.array(data_list)
-                
-                # Calculate time base based on decimation and buffer size
-                decimation = int(self.decimation_select.currentText())
-                sample_time = 8e-9  # 8ns base sample time for Red Pitaya 125-14/10
-                self.time_data = np.linspace(0, len(data_list) * sample_time * decimation, len(data_list))
-                
-            except Exception as e:
-                # Print raw data for debugging
-                print(f"Raw CH{channel_num} data received: {data_str[:100]}..." if len(data_str) > 100 else data_str)
-                raise ValueError(f"CH{channel_num} data parsing error: {str(e)}")
-                
-        except Exception as e:
-            print(f"Error getting CH{channel_num} data: {str(e)}")
-            if channel_num == 1:
-                self.data_ch1 = np.zeros(1024)
-            else:
-                self.data_ch2 = np.zeros(1024)
-    
-    def update_measurements(self):
-        # Update Channel 1 measurements
-        if self.show_ch1_checkbox.isChecked() and len(self.data_ch1) > 0:
-            # Calculate Vpp
-            if self.show_vpp_checkbox.isChecked():
-                vpp = np.max(self.data_ch1) - np.min(self.data_ch1)
-                self.ch1_vpp_display.setText(f"Vpp: {vpp:.3f} V")
+            settings = self.acquisition_settings()
+            n_segments = self.segments_input.value()
+            self.trigger_indicator.set_status("WAITING")
+            result = self.acquisition.segmented(settings, n_segments, self.status_bar.showMessage)
+            data = result["data"]
+            if len(data) == 0:
+                self.status_bar.showMessage("Trigger timeout - no trigger detected")
+                self.trigger_indicator.set_status("TIMEOUT")
+                return
+            self.trigger_indicator.set_status("TRIGGERED" if result["complete"] else "TIMEOUT")
+            self.segments = result
             
-            # Calculate Vrms
-            if self.show_vrms_checkbox.isChecked():
-                vrms = np.sqrt(np.mean(np.square(self.data_ch1)))
-                self.ch1_vrms_display.setText(f"Vrms: {vrms:.3f} V")
+            for frame_time, segment in zip(result["timestamps"], data):
+                self.record_frame(frame_time, segment[0], segment[1], settings)
             
-            # Calculate frequency (using FFT)
-            if self.show_freq_checkbox.isChecked():
-                freq = self.calculate_frequency(self.data_ch1)
-                if freq is not None:
-                    self.ch1_freq_display.setText(freq)
-                else:
-                    self.ch1_freq_display.setText("Frequency: N/A")
-        
-        # Update Channel 2 measurements
-        if self.show_ch2_checkbox.isChecked() and len(self.data_ch2) > 0:
-            # Calculate Vpp
-            if self.show_vpp_checkbox.isChecked():
-                vpp = np.max(self.data_ch2) - np.min(self.data_ch2)
-                self.ch2_vpp_display.setText(f"Vpp: {vpp:.3f} V")
+            # Show the last segment
+            self.show_frame(data[-1], 1, settings)
             
-            # Calculate Vrms
-            if self.show_vrms_checkbox.isChecked():
-                vrms = np.sqrt(np.mean(np.square(self.data_ch2)))
-                self.ch2_vrms_display.setText(f"Vrms: {vrms:.3f} V")
+            self.status_bar.showMessage(
+                f"Segmented capture: {len(data)}/{n_segments} frames, "
+                f"{result['fps']:.1f} frames/s, "
+                f"dead time {result['dead_time']*1e3:.2f} ms per frame"
+            )
             
-            # Calculate frequency (using FFT)
-            if self.show_freq_checkbox.isChecked():
-                freq = self.calculate_frequency(self.data_ch2)
-                if freq is not None:
-                    self.ch2_freq_display.setText(freq)
-                else:
-                    self.ch2_freq_display.setText("Frequency: N/A")
-    
-    def calculate_frequency(self, data):
+        except Exception as e:
+            QMessageBox.warning(self, "Acquisition Error", f"Error during segmented capture: {str(e)}")
+            self.status_bar.showMessage("Segmented capture failed")
+    
+    def acquire_frame(self, settings, report=None, should_stop=None):
+        """
+        Run one acquisition without touching any widgets
+        
+        Returns (frame_time, data_ch1, data_ch2), or None if the trigger timed
+        out or should_stop() became true while waiting for it.
+        Progress messages are passed to report().
+        """
+        return self.acquisition.acquire_frame(settings, report, should_stop)
+    
+    def record_frame(self, frame_time, data_ch1, data_ch2, settings):
+        """Hand a raw frame to the recorder, which writes it off the calling thread"""
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.append(
+                data_ch1, data_ch2,
+                timestamp=frame_time,
+                decimation=settings["decimation"],
+                pretrigger=settings["pretrigger"],
+                trigger_level=settings["trigger_level"],
+                trigger_source=settings["trigger_source"]
+            )
+    
+    def demodulate_frame(self, frame_time, data_ch1, data_ch2, settings):
+        """Run the live lock-in on a raw (unaveraged) frame if it is enabled"""
+        if not settings.get("lockin"):
+            return
+        sample_rate = 125e6 / settings["decimation"]
         try:
-            # Calculate sample rate
-            decimation = int(self.decimation_select.currentText())
-            sample_rate = 125e6 / decimation  # 125 MHz / decimation
-            
-            # Remove DC component
-            data_ac = data - np.mean(data)
-            
-            # Apply window to reduce spectral leakage
-            windowed_data = data_ac * np.hanning(len(data_ac))
-            
-            # Compute FFT
-            fft_data = np.abs(np.fft.rfft(windowed_data))
-            
-            # Get frequency bins
-            freq_bins = np.fft.rfftfreq(len(windowed_data), 1/sample_rate)
-            
-            # Find peak frequency, ignoring DC component
-            peak_idx = np.argmax(fft_data[1:]) + 1
-            peak_freq = freq_bins[peak_idx]
-            
-            # Format frequency display
-            if peak_freq > 1e6:
-                return f"Frequency: {peak_freq/1e6:.3f} MHz"
-            elif peak_freq > 1e3:
-                return f"Frequency: {peak_freq/1e3:.3f} kHz"
-            else:
-                return f"Frequency: {peak_freq:.3f} Hz"
-                
+            self.lockin.process(data_ch1, data_ch2, sample_rate, frame_time)
         except Exception as e:
-            print(f"Frequency calculation error: {str(e)}")
-            return None
+            print(f"Lock-in error: {str(e)}")
+    
+    def show_frame(self, data, frames_averaged, settings):
+        """Display an (averaged) two-channel frame and update measurements"""
+        self.data_ch1 = data[0]
+        self.data_ch2 = data[1]
+        
+        # Time base for this decimation and buffer size (cached between frames)
+        sample_time = 8e-9  # 8ns base sample time for Red Pitaya 125-14/10
+        self.time_data = self.plot_decimator.time_axis(data.shape[1], sample_time * settings["decimation"])
+        
+        # Update plot
+        with self.timer.phase("plot"):
+            self.update_plot_curves()
+        
+        # Update measurements
+        with self.timer.phase("measure"):
+            self.update_measurements(settings["decimation"])
+        
+        if settings.get("lockin"):
+            self.update_lockin_plot()
+        
+        self.averaging_count_display.setText(f"Frames: {frames_averaged}")
+        
+        # Timing summary in the status bar, refreshed at most twice a second
+        if self.timer.enabled:
+            now = time.perf_counter()
+            if now - self.timing_reported_at > 0.5:
+                self.timing_reported_at = now
+                self.timing_display.setText(self.timer.summary())
+    
+    def update_plot_curves(self):
+        """Draw both channels as a min/max envelope of about two points per pixel"""
+        pixels = max(1, self.plot_widget.width())
+        t1, y1 = self.plot_decimator.decimate(self.time_data, self.data_ch1, pixels, key=1)
+        t2, y2 = self.plot_decimator.decimate(self.time_data, self.data_ch2, pixels, key=2)
+        self.plot_curve_ch1.setData(t1, y1)
+        self.plot_curve_ch2.setData(t2, y2)
+    
+    def update_lockin_plot(self):
+        """Redraw the X/Y/R/theta trends and the latest lock-in values"""
+        if self.lockin.last is None:
+            return
+        x, y, r, theta, ref_freq = self.lockin.last
+        self.lockin_display.setText(
+            f"X: {x:.4f} V  Y: {y:.4f} V  R: {r:.4f} V  Theta: {theta:.1f} deg  "
+            f"(ref {format_frequency(ref_freq)})"
+        )
+        trend = self.lockin.trend()
+        self.lockin_curve_x.setData(trend[0], trend[1])
+        self.lockin_curve_y.setData(trend[0], trend[2])
+        self.lockin_curve_r.setData(trend[0], trend[3])
+        self.lockin_curve_theta.setData(trend[0], trend[4])
+    
+    def reset_lockin(self):
+        self.lockin.reset()
+        self.lockin_display.setText("X: N/A  Y: N/A  R: N/A  Theta: N/A")
+        for curve in (self.lockin_curve_x, self.lockin_curve_y, self.lockin_curve_r, self.lockin_curve_theta):
+            curve.setData([], [])
+    
+    def update_measurements(self, decimation):
+        """Measure the displayed frame, acquired at the given decimation"""
+        # Read the measurement options once per frame
+        show_channel = (self.show_ch1_checkbox.isChecked(), self.show_ch2_checkbox.isChecked())
+        show_freq = self.show_freq_checkbox.isChecked()
+        show_vpp = self.show_vpp_checkbox.isChecked()
+        show_vrms = self.show_vrms_checkbox.isChecked()
+        show_dc = self.show_dc_checkbox.isChecked()
+        show_thd = self.show_thd_checkbox.isChecked()
+        show_phase = self.show_phase_checkbox.isChecked()
+        frequency_mode = "zoom" if self.zoom_freq_checkbox.isChecked() else "interpolate"
+        
+        if not any(show_channel):
+            return
+        
+        # Both channels in one vectorised pass, at the frame's own sample rate
+        # (the decimation box may have changed since it was acquired)
+        sample_rate = 125e6 / decimation  # 125 MHz / decimation
+        results = self.measurement_engine.measure(
+            [self.data_ch1, self.data_ch2],
+            sample_rate,
+            amplitude=show_vpp or show_vrms,
+            spectrum=show_freq or show_thd or show_phase,
+            distortion=show_thd,
+            frequency_mode=frequency_mode
+        )
+        if not results:
+            return
+        
+        displays = (
+            (self.ch1_freq_display, self.ch1_vpp_display, self.ch1_vrms_display,
+             self.ch1_mean_display, self.ch1_thd_display, self.ch1_snr_display),
+            (self.ch2_freq_display, self.ch2_vpp_display, self.ch2_vrms_display,
+             self.ch2_mean_display, self.ch2_thd_display, self.ch2_snr_display),
+        )
+        for i, (freq_display, vpp_display, vrms_display,
+                mean_display, thd_display, snr_display) in enumerate(displays):
+            if not show_channel[i]:
+                continue
+            if show_vpp:
+                vpp_display.setText(f"Vpp: {results['vpp'][i]:.3f} V")
+            if show_vrms:
+                vrms_display.setText(f"Vrms: {results['vrms'][i]:.3f} V")
+            if show_dc:
+                mean_display.setText(f"DC: {results['mean'][i]:.3f} V")
+            if show_freq:
+                freq_display.setText(f"Frequency: {format_frequency(results['frequency'][i])}")
+            if show_thd:
+                thd_display.setText(f"THD: {results['thd'][i]:.2f} %")
+                snr_display.setText(f"SNR: {results['snr'][i]:.1f} dB")
+        
+        if show_phase and all(show_channel):
+            self.phase_display.setText(f"Phase: {results['phase']:.2f} deg")
     
     def toggle_continuous(self):
         if not self.continuous_mode:
-            # Start continuous mode
+            # Start continuous mode on the acquisition worker thread
             self.continuous_mode = True
             self.continuous_button.setText("Stop Continuous")
             self.acquire_button.setEnabled(False)
-            self.timer.start(500)  # Update every 500ms
+            self.segmented_button.setEnabled(False)
+            self.worker = AcquisitionWorker(self)
+            self.worker.frame_ready.connect(self.on_worker_frame)
+            self.worker.trigger_status.connect(self.trigger_indicator.set_status)
+            self.worker.message.connect(self.status_bar.showMessage)
+            self.worker.failed.connect(self.on_worker_failed)
+            self.worker.duty_cycle.connect(self.duty_cycle_display.setText)
+            self.worker.start()
             self.status_bar.showMessage("Continuous acquisition started")
         else:
             # Stop continuous mode
             self.continuous_mode = False
             self.continuous_button.setText("Start Continuous")
             self.acquire_button.setEnabled(True)
-            self.timer.stop()
+            self.segmented_button.setEnabled(True)
+            if self.worker is not None:
+                self.worker.stop()
+                self.worker = None
             self.status_bar.showMessage("Continuous acquisition stopped")
     
+    def on_worker_frame(self, payload):
+        frame_time, data, frames_averaged, settings = payload
+        worker = self.worker
+        if worker is None:
+            return
+        self.show_frame(data, frames_averaged, settings)
+        
+        # Pick up any settings changed since the last frame, then accept the next one
+        worker.settings = self.acquisition_settings()
+        worker.display_pending = False
+    
+    def on_worker_failed(self, message):
+        if self.continuous_mode:
+            self.toggle_continuous()
+        QMessageBox.warning(self, "Acquisition Error", f"Error during acquisition: {message}")
+        self.status_bar.showMessage("Acquisition failed")
+    
+    def update_averaging(self):
+        self.averager.configure(self.averaging_select.currentText(), self.averaging_frames_input.value())
+        self.averaging_count_display.setText(f"Frames: {self.averager.frame_count}")
+    
+    def reset_averaging(self):
+        self.averager.reset()
+        self.averaging_count_display.setText("Frames: 0")
+    
+    def update_timing(self):
+        self.timer.enabled = self.timing_checkbox.isChecked()
+        if self.timer.enabled:
+            self.timer.reset()
+            self.timing_display.setText(self.timer.summary())
+        else:
+            self.timing_display.setText("")
+    
+    def export_timing(self):
+        """Write the timing statistics to timestamped CSV and JSON files"""
+        path = time.strftime("timing_%Y%m%d_%H%M%S")
+        try:
+            self.timer.export_csv(path + ".csv")
+            self.timer.export_json(path + ".json")
+            self.status_bar.showMessage(f"Timing exported to {path}.csv and {path}.json")
+        except Exception as e:
+            QMessageBox.warning(self, "Export Error", f"Failed to export timing: {str(e)}")
+    
+    def toggle_recording(self):
+        if self.recorder is None:
+            # Start recording to a timestamped file set in the working directory
+            path = time.strftime("recording_%Y%m%d_%H%M%S")
+            ring_frames = self.ring_limit_input.value() or None
+            try:
+                self.recorder = FrameRecorder(
+                    path,
+                    n_samples=self.buffer_size_input.value(),
+                    ring_frames=ring_frames
+                )
+            except Exception as e:
+                QMessageBox.warning(self, "Recording Error", f"Failed to start recording: {str(e)}")
+                return
+            # Frame size is fixed for the duration of a recording
+            self.buffer_size_input.setEnabled(False)
+            self.ring_limit_input.setEnabled(False)
+            self.record_button.setText("Stop Recording")
+            self.status_bar.showMessage(f"Recording to {path}.i16")
+        else:
+            self.stop_recording()
+    
+    def stop_recording(self):
+        if self.recorder is None:
+            return
+        recorder = self.recorder
+        self.recorder = None
+        recorder.close()
+        self.buffer_size_input.setEnabled(True)
+        self.ring_limit_input.setEnabled(True)
+        self.record_button.setText("Start Recording")
+        self.status_bar.showMessage(
+            f"Recording stopped: {recorder.frames_written} frames written, "
+            f"{recorder.frames_dropped} dropped ({recorder.path}.i16)"
+        )
+    
+    def open_history(self):
+        """Open a recording in the history viewer"""
+        path, _ = QFileDialog.getOpenFileName(self, "Open Recording", "", "Recordings (*.json)")
+        if not path:
+            return
+        for suffix in (".lod.json", ".json"):
+            if path.endswith(suffix):
+                path = path[:-len(suffix)]
+                break
+        try:
+            viewer = HistoryViewer(path)
+        except Exception as e:
+            QMessageBox.warning(self, "History Error", f"Failed to open recording history: {str(e)}")
+            return
+        # Keep a reference so the window is not garbage collected
+        self.history_viewers.append(viewer)
+        viewer.show()
+    
     def auto_scale(self):
         """Auto-scale the y-axis based on the current data"""
         # Calculate min and max values from both channels if visible
@@ -685,15 +1083,13 @@ class RedPitayaOscilloscope(QMainWindow):
             padding = (max_val - min_val) * 0.1  # 10% padding
             self.plot_widget.setYRange(min_val - padding, max_val + padding)
     
-    def update_plot(self):
-        if self.continuous_mode:
-            self.single_acquisition()
-    
     def closeEvent(self, event):
         # Clean up when closing
         if self.continuous_mode:
             self.toggle_continuous()
         
+        self.stop_recording()
+        
         if self.connected:
             try:
                 self.device.write("ACQ:STOP")
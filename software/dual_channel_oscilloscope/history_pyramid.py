@@ -0,0 +1,381 @@
+"""
+Min/max level-of-detail pyramid for long oscilloscope recordings.
+
+A recording is viewed as one long trace per channel: frame after frame, each
+contributing n_samples positions. Level k of the pyramid holds one [min, max]
+pair per channel for every factor**k samples, stored next to the recording:
+
+    <base>.lod1, <base>.lod2, ...  float32 records, shape (buckets, n_channels, 2)
+    <base>.lod.json                header (factor, levels, samples covered)
+
+PyramidBuilder extends the levels frame by frame while FrameRecorder writes,
+so a finished recording is ready to browse. HistoryPyramid reads the levels
+back in fixed-size tiles and, for a visible range, picks the coarsest level
+that still has at least one bucket per pixel, then merges buckets down to the
+pixel count. A redraw touches only a few tiles whether the recording lasts
+seconds or hours; zoomed in far enough it reads the raw samples instead.
+
+    python history_pyramid.py --build recording_20250101_120000
+    python history_pyramid.py --bench
+"""
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+from scope_segmented import BASE_SAMPLE_RATE
+
+
+DEFAULT_FACTOR = 16
+
+
+def _reduce(entries, factor):
+    """Combine groups of factor (min, max) entries into one"""
+    n_channels = entries.shape[1]
+    grouped = entries.reshape(-1, factor, n_channels, 2)
+    reduced = np.empty((grouped.shape[0], n_channels, 2), dtype=np.float32)
+    np.min(grouped[..., 0], axis=1, out=reduced[..., 0])
+    np.max(grouped[..., 1], axis=1, out=reduced[..., 1])
+    return reduced
+
+
+class PyramidBuilder:
+    """
+    Builds the min/max pyramid incrementally as frames are added
+
+    Parameters:
+    path: Base path of the recording, without extension
+    n_channels: Number of channels per frame
+    factor: Samples (or buckets) combined per bucket of the next level
+    """
+    def __init__(self, path, n_channels, factor=DEFAULT_FACTOR):
+        self.path = path
+        self.n_channels = int(n_channels)
+        self.factor = int(factor)
+        self.header_path = path + ".lod.json"
+        self.samples = 0
+        # _pending[k] holds level k-1 entries not yet combined into level k
+        self._pending = {}
+        self._files = {}
+        self._counts = {}
+
+        # Remove levels left over from an earlier recording with the same name
+        level = 1
+        while os.path.exists(self.level_path(level)):
+            os.remove(self.level_path(level))
+            level += 1
+        self._write_header()
+
+    def level_path(self, level):
+        return f"{self.path}.lod{level}"
+
+    @property
+    def levels(self):
+        return len(self._counts)
+
+    def add(self, frame):
+        """Add one frame of shape (n_channels, n_samples) in volts"""
+        frame = np.asarray(frame, dtype=np.float32)
+        entries = np.empty((frame.shape[1], self.n_channels, 2), dtype=np.float32)
+        entries[..., 0] = frame.T
+        entries[..., 1] = frame.T
+        self.samples += frame.shape[1]
+        self._push(1, entries)
+
+    def _push(self, level, entries):
+        pending = self._pending.get(level)
+        if pending is not None and len(pending):
+            entries = np.concatenate((pending, entries))
+        n_full = len(entries) - len(entries) % self.factor
+        self._pending[level] = entries[n_full:].copy()
+        if n_full:
+            reduced = _reduce(entries[:n_full], self.factor)
+            self._write(level, reduced)
+            self._push(level + 1, reduced)
+
+    def _write(self, level, entries):
+        f = self._files.get(level)
+        if f is None:
+            f = self._files[level] = open(self.level_path(level), "ab")
+            self._counts[level] = 0
+        f.write(entries.tobytes())
+        self._counts[level] += len(entries)
+
+    def close(self):
+        """Write the partial buckets at the end of every level and the header"""
+        if self._files is None:
+            return
+        level = 1
+        while True:
+            pending = self._pending.get(level)
+            if pending is not None and len(pending):
+                # Pad with the last entry so the partial bucket reduces like a full one
+                padded = np.concatenate((pending, np.repeat(pending[-1:], self.factor - len(pending), axis=0)))
+                reduced = _reduce(padded, self.factor)
+                self._pending[level] = pending[:0]
+                self._write(level, reduced)
+                self._pending[level + 1] = np.concatenate(
+                    (self._pending.get(level + 1, reduced[:0]), reduced))
+            if self._counts.get(level, 0) <= 1:
+                break
+            level += 1
+        for f in self._files.values():
+            f.close()
+        self._files = None
+        self._write_header()
+
+    def _write_header(self):
+        header = {
+            "version": 1,
+            "factor": self.factor,
+            "n_channels": self.n_channels,
+            "levels": self.levels,
+            "samples": self.samples,
+        }
+        tmp_path = self.header_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(header, f, indent=2)
+        os.replace(tmp_path, self.header_path)
+
+
+def build_pyramid(path, factor=DEFAULT_FACTOR, frames_per_batch=64):
+    """Build the pyramid for an existing recording, e.g. one made before pyramids existed"""
+    from scope_recorder import load_recording
+
+    data, index = load_recording(path, volts=False)
+    builder = PyramidBuilder(path, data.shape[1], factor)
+    try:
+        for start in range(0, len(data), frames_per_batch):
+            batch = data[start:start + frames_per_batch].astype(np.float32)
+            batch *= index["scale"][start:start + frames_per_batch, None, None]
+            for frame in batch:
+                builder.add(frame)
+    finally:
+        builder.close()
+    return builder
+
+
+class HistoryPyramid:
+    """
+    Tile-cached reader for a recording and its min/max pyramid
+
+    Parameters:
+    path: Base path of the recording, without extension
+    tile_size: Buckets (or raw samples) per cached tile
+    max_tiles: Tiles kept in the cache
+    """
+    def __init__(self, path, tile_size=4096, max_tiles=256):
+        from scope_recorder import recorded_index
+
+        self.path = path
+        self.tile_size = int(tile_size)
+        self.max_tiles = int(max_tiles)
+        self._tiles = OrderedDict()
+        self.tiles_read = 0
+
+        with open(path + ".json") as f:
+            header = json.load(f)
+        if header.get("ring_frames"):
+            raise ValueError("ring recordings have no history pyramid")
+        self.n_channels = header["n_channels"]
+        self.n_samples = header["n_samples"]
+        # Counted from the index records, so a crashed recording shows its last frames
+        self.index = recorded_index(path, header)
+        frames = len(self.index)
+        self.frames = frames
+        self.total_samples = frames * self.n_samples
+        self._raw = np.memmap(path + ".i16", dtype=np.int16, mode="r",
+                              shape=(frames, self.n_channels, self.n_samples)) if frames else None
+        decimation = int(self.index["decimation"][0]) if frames else 1
+        self.sample_rate = BASE_SAMPLE_RATE / max(decimation, 1)
+
+        with open(path + ".lod.json") as f:
+            lod = json.load(f)
+        self.factor = lod["factor"]
+        self._levels = [None]
+        record_bytes = self.n_channels * 2 * 4
+        level = 1
+        while os.path.exists(f"{path}.lod{level}"):
+            count = os.path.getsize(f"{path}.lod{level}") // record_bytes
+            if count == 0:
+                break
+            self._levels.append(np.memmap(f"{path}.lod{level}", dtype=np.float32, mode="r",
+                                          shape=(count, self.n_channels, 2)))
+            level += 1
+
+    @property
+    def levels(self):
+        """Number of levels including the raw samples (level 0)"""
+        return len(self._levels)
+
+    @property
+    def duration(self):
+        return self.total_samples / self.sample_rate
+
+    def bucket_size(self, level):
+        return self.factor ** level
+
+    def choose_level(self, n_visible, max_points):
+        """Coarsest level that still gives at least max_points buckets"""
+        level = 0
+        while level + 1 < self.levels and n_visible / self.bucket_size(level + 1) >= max_points:
+            level += 1
+        return level
+
+    def tile(self, level, number):
+        """
+        One cached tile: (n_channels, m) volts at level 0, (m, n_channels, 2)
+        min/max pairs above
+        """
+        key = (level, number)
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+        start = number * self.tile_size
+        stop = start + self.tile_size
+        if level == 0:
+            tile = self._read_raw(start, min(stop, self.total_samples))
+        else:
+            tile = np.array(self._levels[level][start:stop])
+        self._tiles[key] = tile
+        self.tiles_read += 1
+        if len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def _read_raw(self, start, stop):
+        first = start // self.n_samples
+        last = (stop - 1) // self.n_samples
+        frames = self._raw[first:last + 1].astype(np.float32)
+        frames *= self.index["scale"][first:last + 1, None, None]
+        trace = frames.transpose(1, 0, 2).reshape(self.n_channels, -1)
+        offset = first * self.n_samples
+        return trace[:, start - offset:stop - offset]
+
+    def fetch(self, start, stop, max_points=2000):
+        """
+        Trace data for samples [start, stop) with at most max_points buckets
+
+        Returns (level, x, y): x in seconds of recorded time, y of shape
+        (n_channels, len(x)). Raw samples are returned as they are when they
+        fit; otherwise each bucket appears twice, as its minimum and its
+        maximum at the same x, drawing a vertical bar.
+        """
+        start = max(0, int(start))
+        stop = min(self.total_samples, int(np.ceil(stop)))
+        if stop <= start:
+            return 0, np.zeros(0), np.zeros((self.n_channels, 0), dtype=np.float32)
+
+        level = self.choose_level(stop - start, max_points)
+        bucket = self.bucket_size(level)
+        first = start // bucket
+        last = -(-stop // bucket)
+        if level:
+            last = min(last, len(self._levels[level]))
+        tiles = [self.tile(level, n) for n in range(first // self.tile_size,
+                                                    (last - 1) // self.tile_size + 1)]
+        offset = first - (first // self.tile_size) * self.tile_size
+        count = last - first
+
+        if level == 0:
+            y = np.concatenate(tiles, axis=1)[:, offset:offset + count]
+            if y.shape[1] <= max_points:
+                x = (first + np.arange(y.shape[1])) / self.sample_rate
+                return level, x, y
+            mins, maxs = y, y
+        else:
+            pairs = np.concatenate(tiles)[offset:offset + count]
+            mins, maxs = pairs[..., 0].T, pairs[..., 1].T
+
+        # Merge neighbouring buckets down to max_points, as EnvelopeDecimator does per frame
+        merge = -(-mins.shape[1] // max_points)
+        starts = np.arange(0, mins.shape[1], merge)
+        y = np.empty((self.n_channels, 2 * len(starts)), dtype=np.float32)
+        y[:, 0::2] = np.minimum.reduceat(mins, starts, axis=1)
+        y[:, 1::2] = np.maximum.reduceat(maxs, starts, axis=1)
+        x = np.repeat((first + starts) * bucket / self.sample_rate, 2)
+        return level, x, y
+
+    def frame_at(self, sample):
+        """Index record of the frame containing a sample position"""
+        frame = min(max(int(sample) // self.n_samples, 0), self.frames - 1)
+        return self.index[frame]
+
+
+def benchmark(path, frames=1000, n_samples=16384, decimation=64):
+    """Record a synthetic run with the pyramid, check it and time fetches at every zoom"""
+    from scope_recorder import FrameRecorder, load_recording
+
+    rng = np.random.default_rng(0)
+    t = np.arange(n_samples) / (BASE_SAMPLE_RATE / decimation)
+    recorder = FrameRecorder(path, n_samples, chunk_frames=1024, queue_size=frames)
+    started = time.perf_counter()
+    for i in range(frames):
+        ch1 = 0.4 * np.sin(2 * np.pi * 1e3 * (t + i * t[-1])) + 0.01 * rng.standard_normal(n_samples)
+        ch2 = 0.2 * np.sign(np.sin(2 * np.pi * 50 * (t + i * t[-1])))
+        if i == frames // 3:
+            ch1[1234] = 0.9  # single-sample spike that every level must keep
+        recorder.append(ch1, ch2, timestamp=time.time(), decimation=decimation)
+    recorder.close()
+    print(f"Recorded {frames} frames x {n_samples} samples with pyramid "
+          f"in {time.perf_counter() - started:.2f} s")
+
+    history = HistoryPyramid(path)
+    print(f"{history.total_samples} samples per channel ({history.duration:.1f} s), "
+          f"{history.levels} levels")
+
+    # The envelope at every level must match a brute-force min/max of the raw data
+    data, _ = load_recording(path)
+    trace = data.transpose(1, 0, 2).reshape(2, -1)
+    for level in range(1, history.levels):
+        bucket = history.bucket_size(level)
+        n = len(history._levels[level])
+        for b in rng.integers(0, n, 20):
+            chunk = trace[:, b * bucket:(b + 1) * bucket]
+            expected = np.stack((chunk.min(axis=1), chunk.max(axis=1)), axis=1)
+            assert np.array_equal(history._levels[level][b], expected), (level, b)
+    spike = frames // 3 * n_samples + 1234
+    level, x, y = history.fetch(0, history.total_samples, 1000)
+    assert y[0].max() == trace[0].max() and abs(y[0].max() - 0.9) < 1e-3, "spike lost"
+    print("Envelopes match the raw data at every level")
+
+    center = spike
+    span = history.total_samples
+    while span >= 50:
+        history._tiles.clear()
+        history.tiles_read = 0
+        start = max(0, center - span // 2)
+        t0 = time.perf_counter()
+        level, x, y = history.fetch(start, start + span, 2000)
+        cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        history.fetch(start + span // 10, start + span // 10 + span, 2000)
+        pan = time.perf_counter() - t0
+        print(f"span {span:>11d} samples: level {level}, {len(x):5d} points, "
+              f"{history.tiles_read} tiles, {1e3 * cold:6.2f} ms cold, {1e3 * pan:6.2f} ms pan")
+        span //= 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Min/max history pyramid for oscilloscope recordings")
+    parser.add_argument("--build", metavar="BASE", help="Build the pyramid for an existing recording")
+    parser.add_argument("--bench", action="store_true", help="Check and time a synthetic recording")
+    parser.add_argument("--frames", type=int, default=1000, help="Frames in the benchmark recording")
+    parser.add_argument("--output", default="recording_pyramid_bench", help="Benchmark recording path")
+    args = parser.parse_args()
+
+    if args.build:
+        started = time.perf_counter()
+        builder = build_pyramid(args.build)
+        print(f"Built {builder.levels} levels over {builder.samples} samples "
+              f"in {time.perf_counter() - started:.2f} s")
+    elif args.bench:
+        benchmark(args.output, args.frames)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
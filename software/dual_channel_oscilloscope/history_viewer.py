@@ -0,0 +1,105 @@
+"""
+Scroll-and-zoom viewer for long oscilloscope recordings.
+
+Shows a whole recording as one continuous trace per channel. On every pan or
+zoom only the tiles of the history pyramid covering the visible range are
+fetched, at the level matching the plot width, so the view stays interactive
+from the full run down to single samples.
+
+Usage:
+    python history_viewer.py recording_20250101_120000
+"""
+import sys
+import time
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel
+from PyQt5.QtCore import QTimer
+import pyqtgraph as pg
+from history_pyramid import HistoryPyramid
+
+
+class HistoryViewer(QWidget):
+    """
+    Level-of-detail plot of a recording
+
+    Parameters:
+    path: Base path of the recording, without extension
+    """
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.history = HistoryPyramid(path)
+        self.setWindowTitle(f"Recording History - {path}")
+        self.resize(1200, 500)
+
+        layout = QVBoxLayout(self)
+        self.plot_widget = pg.PlotWidget()
+        self.plot_widget.setBackground('k')
+        self.plot_widget.setLabel('left', 'Voltage', 'V')
+        self.plot_widget.setLabel('bottom', 'Recorded Time', 's')
+        self.plot_widget.showGrid(x=True, y=True)
+        self.plot_widget.addLegend()
+        self.curves = [
+            self.plot_widget.plot(pen=pg.mkPen('y', width=1), name='CH1'),
+            self.plot_widget.plot(pen=pg.mkPen('c', width=1), name='CH2'),
+        ][:self.history.n_channels]
+        layout.addWidget(self.plot_widget)
+
+        self.info_label = QLabel()
+        layout.addWidget(self.info_label)
+
+        # Keep the view inside the recording, down to a few samples across
+        duration = max(self.history.duration, 1 / self.history.sample_rate)
+        view_box = self.plot_widget.getViewBox()
+        view_box.setLimits(xMin=0, xMax=duration, minXRange=8 / self.history.sample_rate)
+        view_box.setXRange(0, duration, padding=0)
+
+        # Coalesce the range changes of a drag or wheel burst into one redraw
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(15)
+        self.update_timer.timeout.connect(self.update_view)
+        view_box.sigXRangeChanged.connect(lambda *args: self.update_timer.start())
+        self.update_view()
+
+    def update_view(self):
+        """Fetch the visible range at the resolution of the plot width"""
+        view_box = self.plot_widget.getViewBox()
+        x_min, x_max = view_box.viewRange()[0]
+        sample_rate = self.history.sample_rate
+        pixels = max(100, int(view_box.width()))
+
+        started = time.perf_counter()
+        level, x, y = self.history.fetch(x_min * sample_rate, x_max * sample_rate, pixels)
+        for curve, trace in zip(self.curves, y):
+            curve.setData(x, trace)
+        elapsed = time.perf_counter() - started
+
+        if self.history.frames:
+            frame = self.history.frame_at(x_min * sample_rate)
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(frame["timestamp"]))
+            self.info_label.setText(
+                f"Frame {frame['seq']} at {when}  |  level {level} "
+                f"({self.history.bucket_size(level)} samples/bucket), {len(x)} points, "
+                f"{1e3 * elapsed:.1f} ms  |  {self.history.frames} frames, "
+                f"{self.history.duration:.1f} s recorded"
+            )
+        else:
+            self.info_label.setText("Empty recording")
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[1]
+    for suffix in (".lod.json", ".json", ".i16", ".idx"):
+        if path.endswith(suffix):
+            path = path[:-len(suffix)]
+            break
+    app = QApplication(sys.argv)
+    viewer = HistoryViewer(path)
+    viewer.show()
+    sys.exit(app.exec_())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Concurrent acquisition from several Red Pitaya units.
+
+MultiUnitAcquisition runs one thread per unit. Each thread connects through
+the GUI-free acquisition core, configures its board and then waits on a
+shared barrier, so all units start acquiring together. Frames come from the
+pipelined raw binary loop and are tagged with the unit name, a per-unit
+sequence number and the host trigger-detection time, then merged into one
+queue:
+
+    manager = MultiUnitAcquisition([("reference", "10.0.0.2", 5000),
+                                    ("signal", "10.0.0.3", 5000)], settings)
+    manager.start()
+    for frame in manager.frames(timeout=1.0):
+        print(frame["unit"], frame["seq"], frame["timestamp"])
+    manager.stop()
+
+The per-unit work (socket I/O, decoding) releases the GIL for most of its
+time, so aggregate throughput scales with the number of units:
+
+    python multi_unit.py --units 1 2 4
+"""
+import argparse
+import queue
+import threading
+import time
+import numpy as np
+from redpitaya_acquisition import RedPitayaAcquisition, make_settings
+
+
+class UnitWorker(threading.Thread):
+    """Acquisition thread for one unit"""
+    def __init__(self, manager, name, host, port):
+        super().__init__(daemon=True)
+        self.manager = manager
+        self.unit = name
+        self.host = host
+        self.port = port
+        self.frames = 0
+        self.error = None
+        self.meter = None
+
+    def run(self):
+        manager = self.manager
+        acquisition = None
+        try:
+            acquisition = RedPitayaAcquisition.connect(self.host, self.port)
+            loop = acquisition.pipelined(manager.settings, self.on_frame)
+        except Exception as e:
+            self.error = e
+            manager.barrier.abort()
+            if acquisition is not None:
+                acquisition.close()
+            return
+
+        try:
+            # Shared start: every unit is configured before any of them arms
+            manager.barrier.wait()
+            self.meter = loop.meter
+            loop.run(should_stop=manager.stop_event.is_set)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            acquisition.close()
+
+    def on_frame(self, frame_time, data_ch1, data_ch2):
+        frame = {
+            "unit": self.unit,
+            "seq": self.frames,
+            "timestamp": frame_time,
+            "t": frame_time - self.manager.start_time,
+            "data": np.stack((data_ch1, data_ch2)).astype(np.float32),
+        }
+        self.frames += 1
+        self.manager.publish(frame)
+
+
+class MultiUnitAcquisition:
+    """
+    Drive several units concurrently into one time-tagged frame stream
+
+    Parameters:
+    units: List of (name, host, port)
+    settings: Acquisition settings shared by all units (see make_settings)
+    queue_size: Frames buffered in the aggregated stream before dropping
+    """
+    def __init__(self, units, settings, queue_size=1024):
+        self.units = list(units)
+        self.settings = settings
+        self.stream = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.barrier = threading.Barrier(len(self.units), action=self._mark_start)
+        self.start_time = None
+        self.frames_dropped = 0
+        self.workers = []
+
+    def _mark_start(self):
+        # Runs once, in the last thread to reach the barrier
+        self.start_time = time.time()
+
+    def start(self):
+        self.stop_event.clear()
+        self.workers = [UnitWorker(self, name, host, port) for name, host, port in self.units]
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.barrier.abort()
+        for worker in self.workers:
+            worker.join(timeout=5.0)
+
+    def publish(self, frame):
+        try:
+            self.stream.put_nowait(frame)
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def frames(self, timeout=1.0):
+        """Yield aggregated frames until stopped and drained, or nothing arrives within timeout"""
+        idle_since = time.perf_counter()
+        while True:
+            try:
+                frame = self.stream.get(timeout=0.05)
+            except queue.Empty:
+                if self.stop_event.is_set() or not any(w.is_alive() for w in self.workers):
+                    return
+                if time.perf_counter() - idle_since > timeout:
+                    return
+                continue
+            idle_since = time.perf_counter()
+            yield frame
+
+    def errors(self):
+        return {w.unit: w.error for w in self.workers if w.error is not None}
+
+    def stats(self):
+        """Frames, frame rate and duty cycle per unit"""
+        return {
+            w.unit: {
+                "frames": w.frames,
+                "fps": w.meter.fps if w.meter else 0.0,
+                "duty_cycle": w.meter.duty_cycle if w.meter else 0.0,
+            }
+            for w in self.workers
+        }
+
+
+def run_scaling_test(unit_counts, duration, settings):
+    """Measure aggregate frame rate against 1..N local stand-in servers"""
+    from redpitaya_stub import RedPitayaStub
+
+    baseline = None
+    for count in unit_counts:
+        stubs = [RedPitayaStub(port=0, realtime=True, seed=i) for i in range(count)]
+        units = [(f"unit{i}",) + stub.start() for i, stub in enumerate(stubs)]
+        manager = MultiUnitAcquisition(units, settings)
+        manager.start()
+
+        # Count frames triggered within the test window after the shared start
+        received = 0
+        skew = []
+        last_seen = {}
+        for frame in manager.frames(timeout=5.0):
+            if frame["t"] > duration:
+                manager.stop()
+                continue
+            received += 1
+            last_seen[frame["unit"]] = frame["timestamp"]
+            if len(last_seen) == count:
+                skew.append(max(last_seen.values()) - min(last_seen.values()))
+        for stub in stubs:
+            stub.stop()
+
+        if manager.errors():
+            print(f"{count} units: errors {manager.errors()}")
+            continue
+        rate = received / duration
+        if baseline is None:
+            baseline = rate / count
+        print(f"{count} units: {rate:7.1f} frames/s aggregate "
+              f"({rate / (baseline * count):.2f} of linear), "
+              f"median timestamp spread {1e3 * np.median(skew) if skew else 0:.2f} ms, "
+              f"dropped {manager.frames_dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent multi-unit Red Pitaya acquisition")
+    parser.add_argument("--units", type=int, nargs="+", default=[1, 2, 4],
+                        help="Unit counts for the stand-in scaling test")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per test")
+    parser.add_argument("--decimation", type=int, default=64, help="Decimation factor")
+    parser.add_argument("--buffer-size", type=int, default=16384, help="Samples per channel")
+    args = parser.parse_args()
+
+    settings = make_settings(decimation=args.decimation, buffer_size=args.buffer_size)
+    run_scaling_test(args.units, args.duration, settings)
+
+
+if __name__ == "__main__":
+    main()
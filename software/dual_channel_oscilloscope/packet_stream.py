@@ -0,0 +1,261 @@
+"""
+Receive side of a continuous int16 packet stream, prototyped against a stub.
+
+This is not a client for the Red Pitaya streaming mode. The packet format
+below is this repository's own and only StreamingStub in redpitaya_stub.py
+sends it; the Red Pitaya streaming server (streaming-server / rpsa_client)
+uses a different framing and is configured, decimation included, through
+its own application. For gap-free data from a board use that vendor
+client. What this module holds is the part that would carry over to a
+decoder for that framing: a ring of preallocated buffers, packet gap
+accounting and the consumer callback.
+
+Each packet is a fixed header followed by int16 samples, one contiguous
+block per channel:
+
+    magic          4s   b"RPSD"
+    seq            u64  packet counter, increments by one per packet
+    device_lost    u32  samples the board had to drop before this packet
+    n_channels     u16
+    decimation     u16
+    n_samples      u32  samples per channel in this packet
+
+StreamClient decodes packets straight into a small ring of preallocated
+NumPy buffers (no per-packet allocation), detects gaps in the packet counter
+and hands every chunk to a consumer callback such as a lock-in or recorder.
+
+Usage:
+    python packet_stream.py --bench
+times the decoder against the stub over loopback; that is the cost of the
+receive path on this host, not a rate any board delivers.
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+import numpy as np
+
+
+PACKET_MAGIC = b"RPSD"
+PACKET_HEADER = struct.Struct("<4sQIHHI")
+DEFAULT_PORT = 8900
+BASE_SAMPLE_RATE = 125e6
+ADC_BITS = 14
+
+
+class StreamError(Exception):
+    """Raised when the stream is malformed or the connection is lost"""
+
+
+class StreamClient:
+    """
+    Receives the StreamingStub packet stream
+
+    Parameters:
+    host, port: Streaming server address
+    on_chunk: Callback on_chunk(volts, seq, client) called for every packet.
+              volts is a float32 (n_channels, n_samples) view into a reused
+              buffer, valid until the callback returns.
+    full_scale: ADC full-scale voltage used to convert int16 to volts
+    n_buffers: Size of the receive buffer ring
+    on_error: Callback on_error(exception, client) when the receive thread
+              ends on an error; the exception is also kept in client.error
+    """
+    def __init__(self, host, port=DEFAULT_PORT, on_chunk=None, full_scale=1.0,
+                 n_buffers=4, timeout=2.0, on_error=None):
+        self.host = host
+        self.port = port
+        self.on_chunk = on_chunk
+        self.on_error = on_error
+        self.scale = full_scale / 2 ** (ADC_BITS - 1)
+        self.n_buffers = n_buffers
+        self.timeout = timeout
+
+        self.sock = None
+        self.running = False
+        self.thread = None
+        self.error = None
+
+        self._header = bytearray(PACKET_HEADER.size)
+        self._raw = []
+        self._volts = []
+        self._shape = None
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.packets = 0
+        self.samples = 0
+        self.bytes_received = 0
+        self.dropped_packets = 0
+        self.device_lost_samples = 0
+        self.decimation = None
+        self.expected_seq = None
+        self.started_at = None
+        self.last_packet_at = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def start(self):
+        """Connect and receive in a background thread"""
+        if self.sock is None:
+            self.connect()
+        self.running = True
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.close()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def _run(self):
+        try:
+            while self.running:
+                self.receive_packet()
+        except Exception as e:
+            if self.running:
+                self.error = e
+                if self.on_error is not None:
+                    self.on_error(e, self)
+        finally:
+            self.running = False
+
+    def receive_packet(self):
+        """Receive, decode and dispatch one packet; returns (volts, seq)"""
+        self._recv_exact(memoryview(self._header))
+        magic, seq, lost, n_channels, decimation, n_samples = PACKET_HEADER.unpack(self._header)
+        if magic != PACKET_MAGIC:
+            raise StreamError("Stream out of sync (bad packet magic)")
+
+        shape = (n_channels, n_samples)
+        if shape != self._shape:
+            self._allocate(shape)
+        slot = self.packets % self.n_buffers
+        raw = self._raw[slot]
+        volts = self._volts[slot]
+        self._recv_exact(memoryview(raw).cast("B"))
+        np.multiply(raw, self.scale, out=volts)
+
+        if self.expected_seq is not None and seq != self.expected_seq:
+            # Packets missing on the host side (seq jumps forward)
+            self.dropped_packets += max(0, seq - self.expected_seq)
+        self.expected_seq = seq + 1
+        now = time.perf_counter()
+        if self.started_at is None:
+            self.started_at = now
+        self.last_packet_at = now
+        self.device_lost_samples += lost
+        self.decimation = decimation
+        self.packets += 1
+        self.samples += n_samples
+        self.bytes_received += PACKET_HEADER.size + raw.nbytes
+
+        if self.on_chunk is not None:
+            self.on_chunk(volts, seq, self)
+        return volts, seq
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self._raw = [np.empty(shape, dtype="<i2") for _ in range(self.n_buffers)]
+        self._volts = [np.empty(shape, dtype=np.float32) for _ in range(self.n_buffers)]
+
+    def _recv_exact(self, view):
+        received = 0
+        total = len(view)
+        while received < total:
+            n = self.sock.recv_into(view[received:], total - received)
+            if n == 0:
+                raise StreamError("Connection closed by streaming server")
+            received += n
+
+    @property
+    def sample_rate(self):
+        if not self.decimation:
+            return None
+        return BASE_SAMPLE_RATE / self.decimation
+
+    def throughput(self):
+        """Sustained samples per second per channel since the first packet"""
+        if self.started_at is None or self.packets < 2:
+            return 0.0
+        # The first packet only marks the start of the measurement window
+        elapsed = self.last_packet_at - self.started_at
+        return (self.samples - self.samples / self.packets) / elapsed if elapsed > 0 else 0.0
+
+
+def run_benchmark(duration=3.0, decimation=8, packet_samples=16384, paced=False):
+    """Time the receive path against the stub over loopback"""
+    from redpitaya_stub import StreamingStub
+
+    stub = StreamingStub(port=0, decimation=decimation,
+                         packet_samples=packet_samples, paced=paced)
+    host, port = stub.start()
+
+    checksum = [0.0]
+
+    def consume(volts, seq, client):
+        # Touch the data like a real consumer would
+        checksum[0] += float(volts[0, 0])
+
+    client = StreamClient(host, port, on_chunk=consume)
+    client.start()
+    time.sleep(duration)
+    client.stop()
+    stub.stop()
+
+    rate = client.throughput()
+    print(f"Packets received: {client.packets}")
+    print(f"Dropped packets: {client.dropped_packets}")
+    print(f"Loopback decode rate: {rate / 1e6:.2f} MS/s per channel "
+          f"({rate * client._shape[0] * 2 / 1e6:.1f} MB/s)")
+    if paced:
+        target = BASE_SAMPLE_RATE / decimation
+        print(f"Target rate: {target / 1e6:.2f} MS/s per channel")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packet stream receiver (StreamingStub format)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--bench", action="store_true",
+                        help="Run against a local stand-in streamer")
+    parser.add_argument("--decimation", type=int, default=8,
+                        help="Stand-in decimation for --bench")
+    parser.add_argument("--paced", action="store_true",
+                        help="Pace the stand-in at the real sample rate")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.duration, args.decimation, paced=args.paced)
+        return
+
+    client = StreamClient(args.host, args.port)
+    client.start()
+    time.sleep(args.duration)
+    client.stop()
+    if client.error is not None:
+        print(f"Streaming error: {client.error}")
+    print(f"Received {client.samples} samples per channel, "
+          f"{client.dropped_packets} packets dropped, "
+          f"{client.device_lost_samples} samples lost on the device")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Display decimation for the oscilloscope plots.
+
+A plot can only show about one value per horizontal pixel, so sending every
+sample to pyqtgraph wastes time once the buffer is larger than the widget.
+EnvelopeDecimator reduces a trace to a min/max pair per pixel column, which
+keeps spikes and the signal envelope visible, and caches the time axes and
+float32 output buffers so a redraw allocates almost nothing.
+"""
+import numpy as np
+
+
+class EnvelopeDecimator:
+    """Pixel-aware min/max envelope downsampling with cached time axes"""
+    def __init__(self, max_cached_axes=8, max_cached_buffers=32):
+        self.max_cached_axes = max_cached_axes
+        self.max_cached_buffers = max_cached_buffers
+        self._axes = {}
+        self._envelopes = {}
+
+    def time_axis(self, n_samples, sample_time):
+        """
+        Return the time axis for a frame, reusing it while the decimation
+        and buffer size are unchanged. The array is shared, do not modify it.
+        """
+        key = (int(n_samples), float(sample_time))
+        axis = self._axes.get(key)
+        if axis is None:
+            if len(self._axes) >= self.max_cached_axes:
+                self._axes.clear()
+                self._envelopes.clear()
+            axis = np.linspace(0, n_samples * sample_time, n_samples)
+            axis.flags.writeable = False
+            self._axes[key] = axis
+        return axis
+
+    def decimate(self, time_data, data, pixels, key=None):
+        """
+        Reduce (time_data, data) to at most two points per pixel
+
+        Returns float32 arrays for plotting. Traces that already fit are
+        returned as float32 views (no copy when the input is float32).
+        key identifies the trace (e.g. the channel) so each trace gets its
+        own reusable output buffer.
+        """
+        n = min(len(time_data), len(data))
+        pixels = max(1, int(pixels))
+        if n <= 2 * pixels:
+            return self._as_float32(time_data[:n], ("t", key)), self._as_float32(data[:n], ("y", key))
+
+        bucket = -(-n // pixels)  # ceil division
+        starts = np.arange(0, n, bucket)
+        n_buckets = len(starts)
+
+        t_out, y_out = self._buffers(key, n, bucket, n_buckets, time_data)
+        y = data[:n]
+        y_out[0::2] = np.minimum.reduceat(y, starts)
+        y_out[1::2] = np.maximum.reduceat(y, starts)
+        return t_out, y_out
+
+    def _buffers(self, key, n, bucket, n_buckets, time_data):
+        """Preallocated float32 envelope buffers, time values filled once"""
+        cache_key = (key, n, bucket, float(time_data[1] - time_data[0]) if n > 1 else 0.0)
+        buffers = self._envelopes.get(cache_key)
+        if buffers is None:
+            self._limit_buffers()
+            starts = np.arange(0, n, bucket)
+            t_out = np.empty(2 * n_buckets, dtype=np.float32)
+            # Both points of a bucket share the same x, drawing a vertical bar
+            t_out[0::2] = time_data[starts]
+            t_out[1::2] = time_data[starts]
+            y_out = np.empty(2 * n_buckets, dtype=np.float32)
+            buffers = (t_out, y_out)
+            self._envelopes[cache_key] = buffers
+        return buffers
+
+    def _as_float32(self, array, key):
+        array = np.asarray(array)
+        if array.dtype == np.float32:
+            return array
+        cache_key = (key, len(array))
+        out = self._envelopes.get(cache_key)
+        if out is None:
+            self._limit_buffers()
+            out = np.empty(len(array), dtype=np.float32)
+            self._envelopes[cache_key] = out
+        out[:] = array
+        return out
+
+    def _limit_buffers(self):
+        # Window resizes change the bucket size; drop stale buffers now and then
+        if len(self._envelopes) >= self.max_cached_buffers:
+            self._envelopes.clear()
@@ -0,0 +1,204 @@
+"""
+GUI-free Red Pitaya acquisition core.
+
+Everything needed to configure the board, wait for a trigger and read both
+channels, without PyQt or pyqtgraph, so scripted captures can run on headless
+lab machines. The oscilloscope window drives the same class.
+
+    from redpitaya_acquisition import RedPitayaAcquisition, make_settings
+
+    acq = RedPitayaAcquisition.connect("169.254.195.129")
+    settings = make_settings(decimation=64, buffer_size=4096, trigger_source="CH1_PE")
+    frame_time, ch1, ch2 = acq.acquire_frame(settings)
+    acq.close()
+
+For high frame rates use acq.pipelined() or acq.segmented(), which read raw
+int16 binary blocks, or the redpitaya_capture.py command line tool.
+"""
+import time
+import numpy as np
+from scope_transport import ScpiTransport
+from scope_timing import PhaseTimer
+from scope_segmented import BASE_SAMPLE_RATE, SegmentedCapture, normalized_trigger_level
+from scope_pipeline import PipelinedAcquisition
+
+
+DEFAULT_SETTINGS = {
+    "decimation": 1,
+    "buffer_size": 1024,
+    "pretrigger": 0,
+    "trigger_source": "DISABLED",
+    "trigger_level": 0.5,
+}
+
+
+def make_settings(**overrides):
+    """Acquisition settings dict with defaults for anything not given"""
+    unknown = set(overrides) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown acquisition settings: {', '.join(sorted(unknown))}")
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(overrides)
+    return settings
+
+
+class RedPitayaAcquisition:
+    """
+    Configure, trigger and read frames from a Red Pitaya without any GUI
+
+    Parameters:
+    device: Open ScpiTransport (or pyvisa resource)
+    timer: Optional PhaseTimer for per-phase timing
+    """
+    def __init__(self, device, timer=None):
+        self.device = device
+        self.timer = timer if timer is not None else PhaseTimer()
+        self.idn = None
+
+    @classmethod
+    def connect(cls, host, port=5000, timer=None, **transport_options):
+        """Open a self-healing transport to host:port and return an acquisition object"""
+        device = ScpiTransport(host, port, **transport_options)
+        acquisition = cls(device, timer)
+        acquisition.idn = device.open()
+        return acquisition
+
+    def close(self):
+        try:
+            self.device.write("ACQ:STOP")
+        finally:
+            self.device.close()
+
+    @staticmethod
+    def sample_rate(settings):
+        return BASE_SAMPLE_RATE / settings["decimation"]
+
+    def configure(self, settings):
+        """Send acquisition settings to the device"""
+        device = self.device
+        # Reset acquisition
+        device.write("ACQ:RST")
+        time.sleep(0.1)  # Add small delay to ensure command is processed
+
+        # Make sure to stop any previous acquisition
+        device.write("ACQ:STOP")
+        time.sleep(0.1)
+
+        device.write(f"ACQ:DEC {settings['decimation']}")
+        # Custom acquisition points
+        device.write(f"ACQ:BUF:SIZE {settings['buffer_size']}")
+        # Pre-trigger samples
+        device.write(f"ACQ:TRIG:DLY -{settings['pretrigger']}")
+
+        trigger_source = settings["trigger_source"]
+        if trigger_source != "DISABLED":
+            device.write(f"ACQ:TRIG {trigger_source}")
+            level = normalized_trigger_level(trigger_source, settings["trigger_level"])
+            device.write(f"ACQ:TRIG:LEV {level}")
+        else:
+            # Disable trigger for immediate acquisition
+            device.write("ACQ:TRIG:DIS")
+
+    def acquire_frame(self, settings, report=None, should_stop=None):
+        """
+        Run one acquisition
+
+        Returns (frame_time, data_ch1, data_ch2), or None if the trigger timed
+        out or should_stop() became true while waiting for it.
+        Progress messages are passed to report().
+        """
+        if report is None:
+            report = lambda message: None
+
+        with self.timer.phase("setup"):
+            self.configure(settings)
+            self.device.write("ACQ:START")
+
+        if settings["trigger_source"] != "DISABLED":
+            report("Waiting for trigger...")
+
+            with self.timer.phase("trigger"):
+                # Clear any buffer before checking trigger
+                self.device.clear()
+
+                trigger_state = ""
+                timeout_counter = 0
+                while trigger_state != "TD":
+                    if should_stop is not None and should_stop():
+                        self.device.write("ACQ:STOP")
+                        return None
+                    trigger_state = self.device.query("ACQ:TRIG:STAT?").strip()
+                    report(f"Waiting for trigger... State: {trigger_state}")
+                    time.sleep(0.1)
+                    timeout_counter += 1
+                    if timeout_counter > 50:  # 5 second timeout
+                        self.device.write("ACQ:STOP")
+                        return None
+
+            frame_time = time.time()
+            report("Trigger detected! Retrieving data...")
+        else:
+            # In disabled trigger mode, just wait a bit for data
+            with self.timer.phase("trigger"):
+                time.sleep(0.5)
+            frame_time = time.time()
+            report("Acquiring data without trigger...")
+
+        data_ch1 = self.get_channel_data(1)
+        data_ch2 = self.get_channel_data(2)
+        return frame_time, data_ch1, data_ch2
+
+    def get_channel_data(self, channel_num, retries=1):
+        """
+        Get data for a specific channel
+
+        The transport reconnects and retries on I/O errors. A corrupted reply
+        (ERR! markers or unparsable values) is queried again up to retries
+        times and then raises ValueError, so a failed frame is never zero-filled.
+        """
+        error = None
+        for attempt in range(retries + 1):
+            with self.timer.phase("transfer"):
+                data_str = self.device.query(f"ACQ:SOUR{channel_num}:DATA?")
+            try:
+                with self.timer.phase("parse"):
+                    return self.parse_channel_data(data_str)
+            except ValueError as e:
+                # Print raw data for debugging
+                print(f"Raw CH{channel_num} data received: {data_str[:100]}..." if len(data_str) > 100 else data_str)
+                error = e
+        raise ValueError(f"CH{channel_num} data parsing error: {str(error)}")
+
+    @staticmethod
+    def parse_channel_data(data_str):
+        """Parse an ASCII '{v1,v2,...}' reply, rejecting it if any value is invalid"""
+        if "ERR!" in data_str:
+            raise ValueError("instrument returned ERR!")
+        body = data_str.strip().lstrip("{").rstrip("}")
+        if not body:
+            raise ValueError("no data points received")
+        return np.array(body.split(","), dtype=np.float64)
+
+    def segmented(self, settings, n_segments, report=None, should_stop=None):
+        """Configure once and capture n_segments triggered frames (see SegmentedCapture)"""
+        self.configure(settings)
+        capture = SegmentedCapture(
+            self.device,
+            settings["decimation"],
+            settings["buffer_size"],
+            settings["trigger_source"]
+        )
+        return capture.capture(n_segments, report, should_stop)
+
+    def pipelined(self, settings, on_frame, pipelined=True):
+        """Configure and return a PipelinedAcquisition calling on_frame(frame_time, ch1, ch2)"""
+        self.configure(settings)
+        return PipelinedAcquisition(
+            self.device,
+            settings["decimation"],
+            settings["buffer_size"],
+            settings["trigger_source"],
+            on_frame,
+            pipelined=pipelined,
+            timer=self.timer
+        )
@@ -0,0 +1,109 @@
+"""
+Headless high-rate Red Pitaya capture to binary files.
+
+Uses the GUI-free acquisition core with the pipelined raw binary loop and
+writes every frame with FrameRecorder (<output>.i16 / .idx / .json, readable
+with scope_recorder.load_recording).
+
+Usage:
+    python redpitaya_capture.py --ip 169.254.195.129 --decimation 64 \\
+        --buffer-size 16384 --trigger CH1_PE --frames 10000 --output run1
+    python redpitaya_capture.py --stub --duration 5
+"""
+import argparse
+import time
+from redpitaya_acquisition import RedPitayaAcquisition, make_settings
+from scope_recorder import FrameRecorder
+
+
+def capture(acquisition, settings, output, n_frames=None, duration=None,
+            ring_frames=None, pipelined=True, report=print):
+    """
+    Capture frames to a recording until n_frames or duration is reached
+
+    Returns a dict of run statistics.
+    """
+    recorder = FrameRecorder(output, n_samples=settings["buffer_size"], ring_frames=ring_frames)
+
+    def on_frame(frame_time, data_ch1, data_ch2):
+        # The acquisition reuses its buffers, the recorder keeps the frame
+        recorder.append(
+            data_ch1.copy(), data_ch2.copy(),
+            timestamp=frame_time,
+            decimation=settings["decimation"],
+            pretrigger=settings["pretrigger"],
+            trigger_level=settings["trigger_level"],
+            trigger_source=settings["trigger_source"]
+        )
+
+    loop = acquisition.pipelined(settings, on_frame, pipelined=pipelined)
+    deadline = None if duration is None else time.perf_counter() + duration
+    should_stop = None if deadline is None else (lambda: time.perf_counter() >= deadline)
+    try:
+        meter = loop.run(n_frames, should_stop=should_stop, report=report)
+    finally:
+        recorder.close()
+
+    return {
+        "frames": meter.frames,
+        "elapsed": meter.elapsed,
+        "fps": meter.fps,
+        "duty_cycle": meter.duty_cycle,
+        "trigger_timeouts": loop.timeouts,
+        "frames_written": recorder.frames_written,
+        "frames_dropped": recorder.frames_dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Red Pitaya capture to binary files")
+    parser.add_argument("--ip", default="169.254.195.129", help="Red Pitaya IP address")
+    parser.add_argument("--port", type=int, default=5000, help="SCPI port")
+    parser.add_argument("--stub", action="store_true", help="Capture from a local stand-in server")
+    parser.add_argument("--decimation", type=int, default=64, help="Decimation factor")
+    parser.add_argument("--buffer-size", type=int, default=16384, help="Samples per channel")
+    parser.add_argument("--trigger", default="DISABLED", help="Trigger source, e.g. CH1_PE or EXT_PE")
+    parser.add_argument("--level", type=float, default=0.5, help="Trigger level (V)")
+    parser.add_argument("--frames", type=int, help="Number of frames to capture")
+    parser.add_argument("--duration", type=float, help="Capture duration in seconds")
+    parser.add_argument("--ring", type=int, help="Keep only the newest N frames on disk")
+    parser.add_argument("--serial", action="store_true", help="Process each frame before re-arming")
+    parser.add_argument("--output", default=time.strftime("recording_%Y%m%d_%H%M%S"),
+                        help="Output base path (without extension)")
+    args = parser.parse_args()
+
+    if args.frames is None and args.duration is None:
+        parser.error("give --frames and/or --duration")
+
+    stub = None
+    host, port = args.ip, args.port
+    if args.stub:
+        from redpitaya_stub import RedPitayaStub
+        stub = RedPitayaStub(port=0, realtime=True)
+        host, port = stub.start()
+
+    settings = make_settings(
+        decimation=args.decimation,
+        buffer_size=args.buffer_size,
+        trigger_source=args.trigger,
+        trigger_level=args.level
+    )
+    acquisition = RedPitayaAcquisition.connect(host, port)
+    print(f"Connected to: {acquisition.idn}")
+    try:
+        stats = capture(acquisition, settings, args.output, args.frames, args.duration,
+                        ring_frames=args.ring, pipelined=not args.serial)
+    finally:
+        acquisition.close()
+        if stub is not None:
+            stub.stop()
+
+    print(f"Captured {stats['frames']} frames in {stats['elapsed']:.2f} s "
+          f"({stats['fps']:.1f} frames/s, duty cycle {100 * stats['duty_cycle']:.1f} %)")
+    print(f"Written: {stats['frames_written']}, dropped by writer: {stats['frames_dropped']}, "
+          f"trigger timeouts: {stats['trigger_timeouts']}")
+    print(f"Saved to {args.output}.i16")
+
+
+if __name__ == "__main__":
+    main()
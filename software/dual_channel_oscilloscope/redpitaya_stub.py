@@ -0,0 +1,439 @@
+"""
+Local stand-in for the Red Pitaya SCPI server.
+
+Implements the subset of SCPI commands used by the dual channel oscilloscope
+so the GUI and acquisition scripts can be exercised without a STEMlab:
+
+    *IDN?
+    ACQ:RST, ACQ:START, ACQ:STOP, ACQ:DEC <n>, ACQ:DEC?
+    ACQ:BUF:SIZE <n>, ACQ:BUF:SIZE?
+    ACQ:TRIG <source>, ACQ:TRIG:DIS, ACQ:TRIG:LEV <v>, ACQ:TRIG:DLY <n>
+    ACQ:TRIG:STAT?
+    ACQ:DATA:FORMAT ASCII|BIN, ACQ:DATA:UNITS VOLTS|RAW
+    ACQ:SOUR<n>:DATA?
+
+Synthetic frames are generated once per (decimation, buffer size) and their
+encoded replies are cached, so serving a frame is a single sendall() and the
+client is always the bottleneck in throughput tests.
+
+StreamingStub pushes an endless packet stream in the format decoded by
+packet_stream.StreamClient (the repository's own, not the Red Pitaya
+streaming server's).
+
+Usage:
+    python redpitaya_stub.py --port 5000 --trigger-delay 0.01
+then connect the oscilloscope to 127.0.0.1:5000.
+"""
+import argparse
+import random
+import socket
+import socketserver
+import threading
+import time
+import numpy as np
+
+
+BASE_SAMPLE_RATE = 125e6  # Red Pitaya ADC clock
+ADC_BITS = 14
+FULL_SCALE_V = 1.0  # LV jumper setting
+
+
+class WaveformBank:
+    """Pre-computed synthetic frames and their cached SCPI encodings"""
+    def __init__(self, decimation, buffer_size, signal_freq=10e3, amplitude=0.5,
+                 noise=0.01, phase_offset=np.pi / 4, bank_size=8, seed=0):
+        self.decimation = decimation
+        self.buffer_size = buffer_size
+        sample_rate = BASE_SAMPLE_RATE / decimation
+        rng = np.random.default_rng(seed)
+        t = np.arange(buffer_size) / sample_rate
+
+        # One row per frame, each starting at a random point of the waveform
+        # so consecutive frames are not identical
+        phases = rng.uniform(0, 2 * np.pi, size=(bank_size, 1))
+        arg = 2 * np.pi * signal_freq * t + phases
+        ch1 = 0.1 + amplitude * 0.2 * np.sin(arg + phase_offset)  # photodiode
+        ch2 = amplitude * np.sin(arg)  # modulation reference
+        ch1 += noise * rng.standard_normal(ch1.shape)
+        ch2 += noise * rng.standard_normal(ch2.shape)
+
+        lsb = FULL_SCALE_V / 2 ** (ADC_BITS - 1)
+        limit = 2 ** (ADC_BITS - 1)
+        self.raw = {
+            1: np.clip(np.rint(ch1 / lsb), -limit, limit - 1).astype(np.int16),
+            2: np.clip(np.rint(ch2 / lsb), -limit, limit - 1).astype(np.int16),
+        }
+        self.volts = {ch: raw.astype(np.float32) * lsb for ch, raw in self.raw.items()}
+        self.bank_size = bank_size
+        self._encoded = {}
+
+    def encoded(self, channel, index, data_format, units):
+        """Return the reply bytes for one channel of one frame"""
+        key = (channel, index % self.bank_size, data_format, units)
+        reply = self._encoded.get(key)
+        if reply is None:
+            reply = self._encode(*key)
+            self._encoded[key] = reply
+        return reply
+
+    def _encode(self, channel, index, data_format, units):
+        if units == "RAW":
+            values = self.raw[channel][index]
+        else:
+            values = self.volts[channel][index]
+
+        if data_format == "BIN":
+            # IEEE 488.2 definite length block, big endian like the real server
+            dtype = ">i2" if units == "RAW" else ">f4"
+            payload = values.astype(dtype).tobytes()
+            length = str(len(payload)).encode()
+            return b"#" + str(len(length)).encode() + length + payload + b"\r\n"
+
+        if units == "RAW":
+            text = ",".join(str(int(v)) for v in values)
+        else:
+            text = ",".join(f"{v:.5f}" for v in values)
+        return ("{" + text + "}\r\n").encode()
+
+
+class RedPitayaStub(socketserver.ThreadingTCPServer):
+    """
+    Threaded TCP server that answers like a Red Pitaya SCPI server
+
+    Parameters:
+    latency: Extra delay in seconds before every query reply
+    trigger_delay: Seconds between ACQ:START and the trigger firing
+    realtime: Also wait for the buffer to fill at the selected sample rate
+    trigger_miss_rate: Probability that an armed trigger never fires
+    error_rate: Probability that a data query returns a corrupted reply
+    disconnect_rate: Probability that a data query drops the connection
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=5000, latency=0.0, trigger_delay=0.0,
+                 realtime=False, trigger_miss_rate=0.0, error_rate=0.0,
+                 disconnect_rate=0.0, signal_freq=10e3, seed=0):
+        super().__init__((host, port), RedPitayaStubHandler)
+        self.latency = latency
+        self.trigger_delay = trigger_delay
+        self.realtime = realtime
+        self.trigger_miss_rate = trigger_miss_rate
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.signal_freq = signal_freq
+        self.seed = seed
+        self.idn = "REDPITAYA,INSTR2020,0,01-02 (stand-in)"
+
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self._banks = {}
+        self._thread = None
+        self.reset()
+
+        # Counters useful for checking client behaviour in tests
+        self.frames_served = 0
+        self.errors_injected = 0
+        self.commands_received = 0
+
+    @property
+    def address(self):
+        return self.server_address[0], self.server_address[1]
+
+    def reset(self):
+        """Restore acquisition settings to the ACQ:RST defaults"""
+        self.decimation = 1
+        self.buffer_size = 16384
+        self.trigger_source = "DISABLED"
+        self.trigger_level = 0.0
+        self.trigger_delay_samples = 0
+        self.data_format = "ASCII"
+        self.units = "VOLTS"
+        self.running = False
+        self.armed_at = None
+        self.trigger_missed = False
+        self.frame_index = 0
+
+    def bank(self):
+        key = (self.decimation, self.buffer_size)
+        bank = self._banks.get(key)
+        if bank is None:
+            bank = WaveformBank(self.decimation, self.buffer_size,
+                                signal_freq=self.signal_freq, seed=self.seed)
+            self._banks[key] = bank
+        return bank
+
+    def arm(self):
+        self.running = True
+        self.armed_at = time.perf_counter()
+        self.trigger_missed = (self.trigger_source != "DISABLED"
+                               and self.rng.random() < self.trigger_miss_rate)
+        self.frame_index += 1
+
+    def trigger_state(self):
+        if not self.running or self.armed_at is None or self.trigger_missed:
+            return "WAIT"
+        wait = self.trigger_delay
+        if self.realtime:
+            wait += self.buffer_size * self.decimation / BASE_SAMPLE_RATE
+        if time.perf_counter() - self.armed_at >= wait:
+            return "TD"
+        return "WAIT"
+
+    def start(self):
+        """Serve in a background thread and return the bound address"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+class RedPitayaStubHandler(socketserver.StreamRequestHandler):
+    """Handles one client connection, one SCPI command per line"""
+    def setup(self):
+        super().setup()
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                line = self.rfile.readline()
+            except (ConnectionError, OSError):
+                return
+            if not line:
+                return
+            command = line.decode("ascii", errors="replace").strip()
+            if not command:
+                continue
+
+            with server.lock:
+                server.commands_received += 1
+                reply = self.dispatch(command)
+
+            if reply is None:
+                continue
+            if reply is False:
+                # Injected connection drop
+                return
+            if server.latency:
+                time.sleep(server.latency)
+            try:
+                self.request.sendall(reply)
+            except (ConnectionError, OSError):
+                return
+
+    def dispatch(self, command):
+        """Apply a command to the server state, returning reply bytes or None"""
+        try:
+            return self.apply(command)
+        except (ValueError, OverflowError):
+            # A malformed argument (ACQ:DEC abc) leaves the setting alone and
+            # keeps the handler thread; like the real server, only a query
+            # gets an error reply, a set command gets none
+            if command.partition(" ")[0].endswith("?"):
+                return b"ERR!\r\n"
+            return None
+
+    def apply(self, command):
+        server = self.server
+        head, _, arg = command.partition(" ")
+        head = head.upper()
+        arg = arg.strip()
+
+        if head == "*IDN?":
+            return (server.idn + "\r\n").encode()
+        if head == "ACQ:RST":
+            server.reset()
+        elif head == "ACQ:START":
+            server.arm()
+        elif head == "ACQ:STOP":
+            server.running = False
+        elif head == "ACQ:DEC":
+            server.decimation = max(1, int(float(arg)))
+        elif head == "ACQ:DEC?":
+            return f"{server.decimation}\r\n".encode()
+        elif head == "ACQ:BUF:SIZE":
+            server.buffer_size = max(1, min(16384, int(float(arg))))
+        elif head == "ACQ:BUF:SIZE?":
+            return f"{server.buffer_size}\r\n".encode()
+        elif head == "ACQ:TRIG":
+            server.trigger_source = arg.upper() or "DISABLED"
+        elif head == "ACQ:TRIG:DIS":
+            server.trigger_source = "DISABLED"
+        elif head == "ACQ:TRIG:LEV":
+            server.trigger_level = float(arg)
+        elif head == "ACQ:TRIG:DLY":
+            server.trigger_delay_samples = int(float(arg))
+        elif head == "ACQ:TRIG:STAT?":
+            return f"{server.trigger_state()}\r\n".encode()
+        elif head == "ACQ:DATA:FORMAT":
+            server.data_format = "BIN" if arg.upper().startswith("BIN") else "ASCII"
+        elif head == "ACQ:DATA:UNITS":
+            server.units = "RAW" if arg.upper() == "RAW" else "VOLTS"
+        elif head.startswith("ACQ:SOUR") and head.endswith(":DATA?"):
+            return self.data_reply(head)
+        elif head.endswith("?"):
+            return b"ERR!\r\n"
+        return None
+
+    def data_reply(self, head):
+        server = self.server
+        try:
+            channel = int(head[len("ACQ:SOUR"):-len(":DATA?")])
+        except ValueError:
+            return b"ERR!\r\n"
+        if channel not in (1, 2):
+            return b"ERR!\r\n"
+
+        roll = server.rng.random()
+        if roll < server.disconnect_rate:
+            server.errors_injected += 1
+            return False
+        if roll < server.disconnect_rate + server.error_rate:
+            server.errors_injected += 1
+            return b"{ERR!,ERR!}\r\n"
+
+        server.frames_served += 1
+        return server.bank().encoded(channel, server.frame_index,
+                                     server.data_format, server.units)
+
+
+class StreamingStub(socketserver.ThreadingTCPServer):
+    """
+    Stand-in streamer in the repository's own packet format
+
+    Every connection receives an endless packet stream at the given decimation.
+    The format is the one packet_stream.StreamClient decodes, not the
+    real Red Pitaya streaming server's.
+
+    Parameters:
+    packet_samples: Samples per channel per packet
+    paced: Send at the real sample rate instead of as fast as possible
+    drop_rate: Probability that a packet is skipped (seq still advances)
+    device_lost_rate: Probability that a packet reports device-side losses
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=8900, decimation=8, packet_samples=16384,
+                 n_channels=2, paced=False, drop_rate=0.0, device_lost_rate=0.0,
+                 signal_freq=10e3, seed=0):
+        super().__init__((host, port), StreamingStubHandler)
+        self.decimation = decimation
+        self.packet_samples = packet_samples
+        self.n_channels = n_channels
+        self.paced = paced
+        self.drop_rate = drop_rate
+        self.device_lost_rate = device_lost_rate
+        self.seed = seed
+        self.bank = WaveformBank(decimation, packet_samples, signal_freq=signal_freq, seed=seed)
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server_address[0], self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+class StreamingStubHandler(socketserver.BaseRequestHandler):
+    """Pushes packets to one client until it disconnects"""
+    def handle(self):
+        from packet_stream import PACKET_HEADER, PACKET_MAGIC
+
+        server = self.server
+        sock = self.request
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        rng = random.Random(server.seed)
+        n = server.packet_samples
+        channels = [1, 2][:server.n_channels]
+
+        # Preassembled packets; only the header is rewritten per send
+        packets = []
+        for i in range(server.bank.bank_size):
+            packet = bytearray(PACKET_HEADER.size)
+            for ch in channels:
+                packet += server.bank.raw[ch][i].astype("<i2").tobytes()
+            packets.append(packet)
+
+        packet_period = n * server.decimation / BASE_SAMPLE_RATE
+        next_send = time.perf_counter()
+        seq = 0
+        while True:
+            lost = 0
+            if server.drop_rate and rng.random() < server.drop_rate:
+                seq += 1
+                continue
+            if server.device_lost_rate and rng.random() < server.device_lost_rate:
+                lost = n
+            packet = packets[seq % len(packets)]
+            PACKET_HEADER.pack_into(packet, 0, PACKET_MAGIC, seq, lost,
+                                    len(channels), server.decimation, n)
+            if server.paced:
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_send += packet_period
+            try:
+                sock.sendall(packet)
+            except (ConnectionError, OSError):
+                return
+            seq += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Red Pitaya SCPI stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Delay before each query reply (s)")
+    parser.add_argument("--trigger-delay", type=float, default=0.0,
+                        help="Time from ACQ:START to trigger (s)")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Also wait for the buffer to fill at the sample rate")
+    parser.add_argument("--trigger-miss-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--signal-freq", type=float, default=10e3,
+                        help="Synthetic signal frequency (Hz)")
+    args = parser.parse_args()
+
+    server = RedPitayaStub(
+        args.host, args.port,
+        latency=args.latency,
+        trigger_delay=args.trigger_delay,
+        realtime=args.realtime,
+        trigger_miss_rate=args.trigger_miss_rate,
+        error_rate=args.error_rate,
+        disconnect_rate=args.disconnect_rate,
+        signal_freq=args.signal_freq,
+    )
+    host, port = server.address
+    print(f"Red Pitaya stand-in listening on {host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
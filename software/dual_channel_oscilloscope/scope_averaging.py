@@ -0,0 +1,126 @@
+"""
+Trace averaging for the dual channel oscilloscope.
+
+TraceAverager combines successive frames into one displayed trace:
+
+    Linear       moving average of the last N frames
+    Exponential  running average, each frame weighted 1/N
+    Peak Hold    per-sample maximum since the last reset
+    Min Hold     per-sample minimum since the last reset
+
+All accumulators are allocated once per frame shape and updated in place,
+so adding a frame performs no allocation. The averager is shared between the
+acquisition worker and the GUI thread, hence the lock.
+"""
+import threading
+import numpy as np
+
+
+AVERAGING_MODES = ["Off", "Linear", "Exponential", "Peak Hold", "Min Hold"]
+
+
+class TraceAverager:
+    """
+    In-place per-channel trace averaging
+
+    Parameters:
+    mode: One of AVERAGING_MODES
+    n_frames: Window length for Linear, time constant (in frames) for Exponential
+    """
+    def __init__(self, mode="Off", n_frames=16):
+        self.lock = threading.Lock()
+        self.mode = mode
+        self.n_frames = max(1, int(n_frames))
+        self.frame_count = 0
+        self._shape = None
+        self._frame = None
+        self._result = None
+        self._sum = None
+        self._history = None
+        self._scratch = None
+
+    def configure(self, mode, n_frames):
+        """Change the mode or frame count, resetting only if something changed"""
+        n_frames = max(1, int(n_frames))
+        with self.lock:
+            if mode == self.mode and n_frames == self.n_frames:
+                return
+            self.mode = mode
+            self.n_frames = n_frames
+            self._reset()
+            # The history ring depends on n_frames
+            self._shape = None
+
+    def reset(self):
+        with self.lock:
+            self._reset()
+
+    def _reset(self):
+        self.frame_count = 0
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self._frame = np.zeros(shape)
+        self._result = np.zeros(shape)
+        self._scratch = np.zeros(shape)
+        if self.mode == "Linear":
+            self._sum = np.zeros(shape)
+            self._history = np.zeros((self.n_frames,) + shape)
+        else:
+            self._sum = None
+            self._history = None
+        self.frame_count = 0
+
+    def add(self, *channels):
+        """
+        Add one frame (one array per channel) and return the current result
+
+        The result is a (channels, samples) array owned by the averager and
+        overwritten by the next add(); copy it before handing it to another
+        thread. Channels of unequal length are truncated to the shortest.
+        """
+        n = min(len(ch) for ch in channels)
+        shape = (len(channels), n)
+        with self.lock:
+            if shape != self._shape:
+                self._allocate(shape)
+            frame = self._frame
+            for i, ch in enumerate(channels):
+                frame[i] = ch[:n]
+
+            if self.mode == "Off":
+                np.copyto(self._result, frame)
+                self.frame_count = 1
+                return self._result
+
+            if self.frame_count == 0:
+                np.copyto(self._result, frame)
+                if self.mode == "Linear":
+                    self._history[0] = frame
+                    np.copyto(self._sum, frame)
+            elif self.mode == "Linear":
+                # Moving sum over a ring of the last n_frames frames
+                slot = self.frame_count % self.n_frames
+                if self.frame_count >= self.n_frames:
+                    self._sum -= self._history[slot]
+                self._history[slot] = frame
+                if slot == 0 and self.frame_count >= self.n_frames:
+                    # Re-sum once per wrap so rounding errors cannot build up
+                    np.sum(self._history, axis=0, out=self._sum)
+                else:
+                    self._sum += frame
+                count = min(self.frame_count + 1, self.n_frames)
+                np.multiply(self._sum, 1.0 / count, out=self._result)
+            elif self.mode == "Exponential":
+                # result += (frame - result) / N, ramping up over the first N frames
+                alpha = 1.0 / min(self.frame_count + 1, self.n_frames)
+                np.subtract(frame, self._result, out=self._scratch)
+                self._scratch *= alpha
+                self._result += self._scratch
+            elif self.mode == "Peak Hold":
+                np.maximum(self._result, frame, out=self._result)
+            elif self.mode == "Min Hold":
+                np.minimum(self._result, frame, out=self._result)
+
+            self.frame_count += 1
+            return self._result
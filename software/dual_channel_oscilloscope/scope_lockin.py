@@ -0,0 +1,117 @@
+"""
+Live software lock-in for the dual channel oscilloscope.
+
+CH1 (photodiode) is demodulated against CH2 (modulation reference) on every
+acquired frame. The reference frequency is measured from CH2 with the
+sub-bin estimator of the measurement engine, both channels are projected
+onto a Hann-weighted quadrature pair at that frequency, and the signal phasor
+is rotated by the reference phase:
+
+    X + iY = 2 Z_sig conj(Z_ref) / (|Z_ref| sum(w))
+
+so X is the in-phase amplitude, R = |X + iY| and theta the phase of CH1
+relative to CH2. Results are kept in a rolling history for trend plots.
+
+This is the per-frame counterpart of LockInProcessor in lockin_detection,
+which filters a whole saved record; no intermediate files are written.
+"""
+import threading
+import time
+import numpy as np
+from scope_measurements import MeasurementEngine
+
+
+class FrameLockIn:
+    """
+    Per-frame dual-phase demodulation with preallocated buffers
+
+    Parameters:
+    history: Number of frames kept in the rolling X/Y/R/theta history
+    """
+    def __init__(self, history=500):
+        self.lock = threading.Lock()
+        self.history_size = history
+        self.engine = MeasurementEngine(frequency_mode="interpolate")
+        self._n = None
+        self._history = np.full((5, history), np.nan)  # t, X, Y, R, theta
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self._history.fill(np.nan)
+            self.frame_count = 0
+            self.start_time = None
+            self.last = None
+
+    def _allocate(self, n):
+        self._n = n
+        self._index = np.arange(n, dtype=np.float64)
+        self._window = np.hanning(n)
+        self._window_sum = np.sum(self._window)
+        self._phase = np.empty(n)
+        self._cos = np.empty(n)
+        self._sin = np.empty(n)
+
+    def _phasor(self, data):
+        """Hann-weighted projection onto the current quadrature pair, DC removed"""
+        mean = np.mean(data)
+        re = np.dot(data, self._cos) - mean * self._cos_sum
+        im = np.dot(data, self._sin) - mean * self._sin_sum
+        return complex(re, -im)
+
+    def process(self, signal, reference, sample_rate, frame_time=None, reference_freq=None):
+        """
+        Demodulate one frame; returns (X, Y, R, theta_degrees, f_ref) or None
+
+        reference_freq can be given to skip estimating it from the reference.
+        """
+        n = min(len(signal), len(reference))
+        if n < 8:
+            return None
+        signal = signal[:n]
+        reference = reference[:n]
+
+        if reference_freq is None:
+            results = self.engine.measure([reference], sample_rate, amplitude=False, distortion=False)
+            reference_freq = float(results["frequency"][0])
+            if not np.isfinite(reference_freq):
+                return None  # Flat reference, nothing to lock to
+
+        with self.lock:
+            if n != self._n:
+                self._allocate(n)
+            # Hann-weighted quadrature pair at the reference frequency, in place
+            np.multiply(self._index, 2 * np.pi * reference_freq / sample_rate, out=self._phase)
+            np.cos(self._phase, out=self._cos)
+            np.sin(self._phase, out=self._sin)
+            self._cos *= self._window
+            self._sin *= self._window
+            self._cos_sum = np.sum(self._cos)
+            self._sin_sum = np.sum(self._sin)
+
+            z_sig = self._phasor(signal)
+            z_ref = self._phasor(reference)
+            if abs(z_ref) == 0:
+                return None
+            z = 2.0 * z_sig * np.conj(z_ref) / (abs(z_ref) * self._window_sum)
+            x, y = z.real, z.imag
+            r = abs(z)
+            theta = np.degrees(np.angle(z))
+
+            now = time.time() if frame_time is None else frame_time
+            if self.start_time is None:
+                self.start_time = now
+            slot = self.frame_count % self.history_size
+            self._history[:, slot] = (now - self.start_time, x, y, r, theta)
+            self.frame_count += 1
+            self.last = (x, y, r, theta, reference_freq)
+            return self.last
+
+    def trend(self):
+        """Copy of the history in chronological order, shape (5, frames): t, X, Y, R, theta"""
+        with self.lock:
+            count = min(self.frame_count, self.history_size)
+            if self.frame_count <= self.history_size:
+                return self._history[:, :count].copy()
+            start = self.frame_count % self.history_size
+            return np.concatenate((self._history[:, start:], self._history[:, :start]), axis=1)
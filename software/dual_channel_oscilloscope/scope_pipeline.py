@@ -0,0 +1,279 @@
+"""
+Pipelined (double-buffered) acquisition loop for the Red Pitaya.
+
+The serial loop waits for a trigger, reads both channels, decodes and
+processes them, and only then re-arms, so the instrument sits idle for the
+whole transfer and processing time. Here the acquisition thread only waits
+for the trigger, transfers the raw int16 blocks into a free buffer and
+re-arms at once; decoding to volts and the frame callback run on a separate
+processing thread while the next frame is being collected.
+
+The board has a single capture buffer and ACQ:START restarts writing into it,
+so the transfer of a frame has to finish before re-arming. Pipelining hides
+the decode and processing time, not the transfer itself; the raw binary read
+keeps that part short.
+
+DutyCycleMeter measures acquisition time / wall time for either loop, so the
+two can be compared directly:
+
+    python scope_pipeline.py --frames 200
+"""
+import argparse
+import queue
+import threading
+import time
+import numpy as np
+from scope_segmented import BASE_SAMPLE_RATE, RAW_LSB_V, set_nodelay, configure
+from scope_timing import PhaseTimer
+
+
+class DutyCycleMeter:
+    """Fraction of wall time covered by acquisition records"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.perf_counter()
+        self.frames = 0
+        self.acquisition_time = 0.0
+
+    def add_frame(self, record_time):
+        self.frames += 1
+        self.acquisition_time += record_time
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    @property
+    def duty_cycle(self):
+        elapsed = self.elapsed
+        return min(1.0, self.acquisition_time / elapsed) if elapsed > 0 else 0.0
+
+    @property
+    def fps(self):
+        elapsed = self.elapsed
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return f"{self.fps:.1f} frames/s, duty cycle {100 * self.duty_cycle:.1f} %"
+
+
+class PipelinedAcquisition:
+    """
+    Re-arm right after each transfer and process frames on a second thread
+
+    Parameters:
+    device: Open pyvisa resource, already configured (decimation, buffer size, trigger level)
+    decimation: Decimation factor set on the device
+    buffer_size: Samples per channel
+    trigger_source: ACQ:TRIG source, "DISABLED" for free running
+    on_frame: Called on the processing thread as on_frame(frame_time, ch1, ch2);
+              the arrays are reused once it returns
+    n_buffers: Raw frame buffers (2 = double buffering)
+    pipelined: False runs the same steps serially, for comparison
+    trigger_timeout: Seconds to wait for a trigger before reporting a timeout
+    timer: Optional PhaseTimer for the trigger, transfer and parse phases
+    """
+    def __init__(self, device, decimation, buffer_size, trigger_source, on_frame,
+                 n_buffers=2, pipelined=True, trigger_timeout=5.0, timer=None):
+        self.device = device
+        self.decimation = decimation
+        self.buffer_size = buffer_size
+        self.trigger_source = trigger_source
+        self.on_frame = on_frame
+        self.pipelined = pipelined
+        self.trigger_timeout = trigger_timeout
+        self.timer = timer if timer is not None else PhaseTimer()
+        self.meter = DutyCycleMeter()
+        self.timeouts = 0
+        self.error = None
+
+        self._raw = np.zeros((n_buffers, 2, buffer_size), dtype=np.int16)
+        self._volts = np.zeros((n_buffers, 2, buffer_size))
+        self._times = np.zeros(n_buffers)
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        for slot in range(n_buffers):
+            self._free.put(slot)
+
+    @property
+    def record_time(self):
+        return self.buffer_size * self.decimation / BASE_SAMPLE_RATE
+
+    @property
+    def duty_cycle(self):
+        return self.meter.duty_cycle
+
+    def arm(self):
+        self.device.write("ACQ:START")
+        if self.trigger_source != "DISABLED":
+            # The trigger source is cleared when it fires
+            self.device.write(f"ACQ:TRIG {self.trigger_source}")
+        return time.perf_counter()
+
+    def wait_for_trigger(self, armed_at, should_stop):
+        """Returns the trigger detection time, or None on timeout or stop"""
+        if self.trigger_source == "DISABLED":
+            # Free running: the buffer is full one record time after arming
+            remaining = armed_at + self.record_time - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            return time.time()
+        deadline = armed_at + self.trigger_timeout
+        while not should_stop():
+            if self.device.query("ACQ:TRIG:STAT?").strip() == "TD":
+                return time.time()
+            if time.perf_counter() > deadline:
+                return None
+        return None
+
+    def transfer(self, slot):
+        """Read both channels as raw int16 blocks into a buffer slot"""
+        n = self.buffer_size
+        for i, channel in enumerate((1, 2)):
+            values = self.device.query_binary_values(
+                f"ACQ:SOUR{channel}:DATA?", datatype="h", is_big_endian=True,
+                container=np.array
+            )
+            m = min(len(values), n)
+            self._raw[slot, i, :m] = values[:m]
+            self._raw[slot, i, m:] = 0
+
+    def process(self, slot):
+        """Decode a slot to volts in place and hand it to on_frame"""
+        volts = self._volts[slot]
+        with self.timer.phase("parse"):
+            np.multiply(self._raw[slot], RAW_LSB_V, out=volts)
+        self.on_frame(self._times[slot], volts[0], volts[1])
+
+    def _processing_loop(self):
+        while True:
+            slot = self._ready.get()
+            if slot is None:
+                return
+            try:
+                self.process(slot)
+            except Exception as e:
+                self.error = e
+            finally:
+                self._free.put(slot)
+
+    def run(self, n_frames=None, should_stop=None, report=None):
+        """
+        Acquire until n_frames frames are done or should_stop() is true
+
+        Returns the DutyCycleMeter. Trigger timeouts re-arm and are counted
+        in self.timeouts; report() receives status messages.
+        """
+        if should_stop is None:
+            should_stop = lambda: False
+        if report is None:
+            report = lambda message: None
+
+        self.device.write("ACQ:DATA:FORMAT BIN")
+        self.device.write("ACQ:DATA:UNITS RAW")
+        processor = None
+        if self.pipelined:
+            processor = threading.Thread(target=self._processing_loop, daemon=True)
+            processor.start()
+
+        self.meter.reset()
+        try:
+            armed_at = self.arm()
+            while n_frames is None or self.meter.frames < n_frames:
+                if should_stop() or self.error is not None:
+                    break
+                with self.timer.phase("trigger"):
+                    frame_time = self.wait_for_trigger(armed_at, should_stop)
+                if frame_time is None:
+                    if should_stop():
+                        break
+                    self.timeouts += 1
+                    report("Trigger timeout, re-arming")
+                    armed_at = self.arm()
+                    continue
+
+                slot = self._free.get()
+                with self.timer.phase("transfer"):
+                    self.transfer(slot)
+                self._times[slot] = frame_time
+                self.meter.add_frame(self.record_time)
+
+                if self.pipelined:
+                    # Collect the next frame while this one is processed
+                    armed_at = self.arm()
+                    self._ready.put(slot)
+                else:
+                    try:
+                        self.process(slot)
+                    finally:
+                        self._free.put(slot)
+                    armed_at = self.arm()
+        finally:
+            if processor is not None:
+                self._ready.put(None)
+                processor.join()
+            self.device.write("ACQ:STOP")
+            self.device.write("ACQ:DATA:FORMAT ASCII")
+            self.device.write("ACQ:DATA:UNITS VOLTS")
+
+        if self.error is not None:
+            raise self.error
+        return self.meter
+
+
+def main():
+    import pyvisa
+    from redpitaya_stub import RedPitayaStub
+    from scope_measurements import MeasurementEngine
+    from scope_lockin import FrameLockIn
+
+    parser = argparse.ArgumentParser(description="Compare serial and pipelined acquisition duty cycle")
+    parser.add_argument("--ip", help="Red Pitaya IP address (default: local stand-in)")
+    parser.add_argument("--port", type=int, default=5000, help="SCPI port")
+    parser.add_argument("--frames", type=int, default=200, help="Frames per run")
+    parser.add_argument("--decimation", type=int, default=64, help="Decimation factor")
+    parser.add_argument("--buffer-size", type=int, default=16384, help="Samples per channel")
+    parser.add_argument("--trigger", default="DISABLED", help="Trigger source")
+    args = parser.parse_args()
+
+    stub = None
+    host, port = args.ip, args.port
+    if host is None:
+        # Real-time stand-in: each record takes as long as on the board
+        stub = RedPitayaStub(port=0, realtime=True)
+        host, port = stub.start()
+
+    rm = pyvisa.ResourceManager('@py')
+    device = rm.open_resource(f"TCPIP::{host}::{port}::SOCKET")
+    device.read_termination = '\r\n'
+    device.write_termination = '\r\n'
+    device.timeout = 5000
+
+    # Typical per-frame work: measurements and the live lock-in
+    engine = MeasurementEngine()
+    lockin = FrameLockIn()
+    sample_rate = BASE_SAMPLE_RATE / args.decimation
+
+    def on_frame(frame_time, ch1, ch2):
+        engine.measure([ch1, ch2], sample_rate, distortion=False)
+        lockin.process(ch1, ch2, sample_rate, frame_time)
+
+    try:
+        configure(device, args.decimation, args.buffer_size, args.trigger)
+        set_nodelay(device)
+        for pipelined in (False, True):
+            acquisition = PipelinedAcquisition(device, args.decimation, args.buffer_size,
+                                               args.trigger, on_frame, pipelined=pipelined)
+            meter = acquisition.run(args.frames)
+            name = "Pipelined" if pipelined else "Serial"
+            print(f"{name:10s} {meter.summary()}")
+    finally:
+        device.close()
+        if stub is not None:
+            stub.stop()
+
+
+if __name__ == "__main__":
+    main()
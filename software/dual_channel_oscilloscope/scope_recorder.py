@@ -0,0 +1,280 @@
+"""
+Continuous recording of oscilloscope frames to disk.
+
+Every frame is stored as int16 samples plus a per-frame scale in a
+memory-mapped file that is preallocated and grown in chunks. A second
+memory-mapped file holds one index record per frame (timestamp, decimation,
+trigger settings, scale) and a small JSON header describes the layout:
+
+    <base>.i16   int16 samples, shape (capacity, n_channels, n_samples)
+    <base>.idx   structured index records, shape (capacity,)
+    <base>.json  header (shape, counts, ring position)
+
+With a ring limit the files stop growing at that many frames and the oldest
+frames are overwritten, which bounds disk use during overnight runs. Without
+one, a min/max history pyramid (see history_pyramid.py) is built alongside
+so long runs can be browsed at any zoom.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import numpy as np
+from history_pyramid import PyramidBuilder
+
+
+ADC_BITS = 14
+INT16_MAX = np.iinfo(np.int16).max
+
+INDEX_DTYPE = np.dtype([
+    ("timestamp", "f8"),      # host time (s since epoch) of the trigger
+    ("seq", "i8"),            # frame number since the recording started
+    ("scale", "f4"),          # volts per LSB for this frame
+    ("n_valid", "i4"),        # samples actually used per channel
+    ("decimation", "i4"),
+    ("pretrigger", "i4"),
+    ("trigger_level", "f4"),
+    ("trigger_source", "S8"),
+])
+
+
+class FrameRecorder:
+    """
+    Appends oscilloscope frames to a memory-mapped recording
+
+    Frames are queued by append() and written by a background thread, so the
+    caller (the GUI thread) never waits on disk I/O.
+
+    Parameters:
+    path: Base path of the recording, without extension
+    n_samples: Samples per channel per frame (shorter frames are padded)
+    n_channels: Number of channels per frame
+    full_scale: ADC full-scale voltage, sets the default 14-bit scale
+    chunk_frames: Number of frames the files grow by at a time
+    ring_frames: Keep only the newest ring_frames frames (None for unlimited)
+    queue_size: Frames buffered between the caller and the writer thread
+    pyramid: Build the min/max history pyramid (not for ring recordings)
+    """
+    def __init__(self, path, n_samples, n_channels=2, full_scale=1.0,
+                 chunk_frames=256, ring_frames=None, queue_size=256, pyramid=True):
+        self.path = path
+        self.n_samples = int(n_samples)
+        self.n_channels = int(n_channels)
+        self.full_scale = float(full_scale)
+        self.base_scale = self.full_scale / 2 ** (ADC_BITS - 1)
+        self.chunk_frames = int(chunk_frames)
+        self.ring_frames = int(ring_frames) if ring_frames else None
+
+        self.samples_path = path + ".i16"
+        self.index_path = path + ".idx"
+        self.header_path = path + ".json"
+
+        self.capacity = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.created = time.time()
+        self._samples = None
+        self._index = None
+        # Ring recordings overwrite old frames, so there is no lasting history to index
+        self.pyramid = PyramidBuilder(path, self.n_channels) if pyramid and not self.ring_frames else None
+
+        # Start from empty files, then preallocate the first chunk
+        for file_path in (self.samples_path, self.index_path):
+            open(file_path, "wb").close()
+        self._grow()
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+    @property
+    def frame_bytes(self):
+        return self.n_channels * self.n_samples * 2
+
+    def append(self, *channels, timestamp=None, decimation=1, pretrigger=0,
+               trigger_level=0.0, trigger_source="DISABLED"):
+        """
+        Queue one frame for writing
+
+        Returns False if the writer is behind and the frame was dropped.
+        The channel arrays must not be modified after they are handed over.
+        """
+        meta = (
+            time.time() if timestamp is None else timestamp,
+            int(decimation),
+            int(pretrigger),
+            float(trigger_level),
+            str(trigger_source)[:8].encode(),
+        )
+        try:
+            self._queue.put_nowait((channels, meta))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def close(self):
+        """Write all queued frames, trim unused space and finalise the header"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+        self._flush()
+        if self.pyramid is not None:
+            self.pyramid.close()
+        used = self.stored_frames
+        self._samples = None
+        self._index = None
+        if used < self.capacity:
+            # Drop the unused tail of the last preallocated chunk
+            with open(self.samples_path, "r+b") as f:
+                f.truncate(used * self.frame_bytes)
+            with open(self.index_path, "r+b") as f:
+                f.truncate(used * INDEX_DTYPE.itemsize)
+            self.capacity = used
+        self._write_header()
+
+    @property
+    def stored_frames(self):
+        if self.ring_frames:
+            return min(self.frames_written, self.ring_frames)
+        return self.frames_written
+
+    def _writer_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write_frame(*item)
+            except Exception as e:
+                self.frames_dropped += 1
+                print(f"Recorder write error: {str(e)}")
+
+    def _write_frame(self, channels, meta):
+        seq = self.frames_written
+        slot = seq % self.ring_frames if self.ring_frames else seq
+        if slot >= self.capacity:
+            self._grow()
+
+        n_valid = min(self.n_samples, min(len(ch) for ch in channels))
+        peak = max(float(np.max(np.abs(ch[:n_valid]))) for ch in channels) if n_valid else 0.0
+        scale = self.base_scale
+        if peak / scale > INT16_MAX:
+            # Out of the nominal ADC range (e.g. HV jumper), widen rather than clip
+            scale = peak / INT16_MAX
+
+        frame = self._samples[slot]
+        for i, ch in enumerate(channels[:self.n_channels]):
+            np.rint(np.asarray(ch[:n_valid], dtype=np.float64) / scale,
+                    out=frame[i, :n_valid], casting="unsafe")
+        if n_valid < self.n_samples:
+            frame[:, n_valid:] = 0
+        if self.pyramid is not None:
+            # From the stored int16 values, so the envelope matches the file exactly
+            self.pyramid.add(frame * np.float32(scale))
+
+        timestamp, decimation, pretrigger, trigger_level, trigger_source = meta
+        self._index[slot] = (timestamp, seq, scale, n_valid, decimation,
+                             pretrigger, trigger_level, trigger_source)
+        self.frames_written += 1
+
+    def _grow(self):
+        """Extend both files by one chunk and remap them"""
+        new_capacity = self.capacity + self.chunk_frames
+        if self.ring_frames:
+            new_capacity = min(new_capacity, self.ring_frames)
+        if new_capacity == self.capacity:
+            return
+        old_capacity = self.capacity
+
+        self._flush()
+        self._samples = None
+        self._index = None
+        with open(self.samples_path, "r+b") as f:
+            f.truncate(new_capacity * self.frame_bytes)
+        with open(self.index_path, "r+b") as f:
+            f.truncate(new_capacity * INDEX_DTYPE.itemsize)
+
+        self.capacity = new_capacity
+        self._samples = np.memmap(self.samples_path, dtype=np.int16, mode="r+",
+                                  shape=(new_capacity, self.n_channels, self.n_samples))
+        self._index = np.memmap(self.index_path, dtype=INDEX_DTYPE, mode="r+",
+                                shape=(new_capacity,))
+        # Mark the new slots unused, so a reader can tell written frames apart
+        self._index["seq"][old_capacity:] = -1
+        # Keep the header current so an interrupted run stays readable
+        self._write_header()
+
+    def _flush(self):
+        if self._samples is not None:
+            self._samples.flush()
+            self._index.flush()
+
+    def _write_header(self):
+        header = {
+            "version": 1,
+            "created": self.created,
+            "n_channels": self.n_channels,
+            "n_samples": self.n_samples,
+            "sample_dtype": "int16",
+            "full_scale": self.full_scale,
+            "capacity": self.capacity,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "ring_frames": self.ring_frames,
+        }
+        tmp_path = self.header_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(header, f, indent=2)
+        os.replace(tmp_path, self.header_path)
+
+
+def recorded_index(path, header):
+    """
+    Index records of the frames a recording holds, in slot order
+
+    The header is only rewritten when the files grow, so after a crash its
+    frame count can be up to chunk_frames behind. The count is taken from
+    the index records instead, which are written with every frame.
+    """
+    frame_bytes = header["n_channels"] * header["n_samples"] * 2
+    stored = min(os.path.getsize(path + ".i16") // frame_bytes,
+                 os.path.getsize(path + ".idx") // INDEX_DTYPE.itemsize)
+    index = np.fromfile(path + ".idx", dtype=INDEX_DTYPE, count=stored)
+    # Unused slots hold seq -1, so the newest written frame gives the count
+    written = max(header["frames_written"], int(index["seq"].max()) + 1 if stored else 0)
+    ring = header["ring_frames"]
+    if ring:
+        return index[:min(stored, written, ring)]
+    return index[:min(stored, written)]
+
+
+def load_recording(path, volts=True):
+    """
+    Load a recording in chronological order
+
+    Returns (data, index) where data has shape (frames, channels, samples),
+    scaled to volts as float32 unless volts is False, and index is the
+    structured per-frame record array. A recording left open by a crash
+    loads up to its last written frame (see recorded_index).
+    """
+    with open(path + ".json") as f:
+        header = json.load(f)
+
+    shape = (header["n_channels"], header["n_samples"])
+    index = recorded_index(path, header)
+    samples = np.memmap(path + ".i16", dtype=np.int16, mode="r",
+                        shape=(len(index),) + shape)
+
+    # In a wrapped ring the oldest frame sits right after the newest one
+    order = np.argsort(index["seq"], kind="stable")
+    index = np.array(index[order])
+    if not volts:
+        return np.array(samples[order]), index
+    data = samples[order].astype(np.float32)
+    data *= index["scale"][:, None, None]
+    return data, index
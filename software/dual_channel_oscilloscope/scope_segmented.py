@@ -0,0 +1,222 @@
+"""
+Segmented multi-trigger acquisition for the Red Pitaya.
+
+Pulsed and modulated ODMR needs many triggered frames in quick succession.
+single_acquisition resets and reconfigures the instrument, sleeps, and reads
+both channels as ASCII for every frame. SegmentedCapture configures once and
+then only repeats the minimum per segment:
+
+    ACQ:START, ACQ:TRIG <source>   re-arm
+    ACQ:TRIG:STAT?                 tight poll until TD
+    ACQ:SOUR1:DATA?, ACQ:SOUR2:DATA?  raw int16 binary blocks
+
+Segments are written into one preallocated (K, channels, samples) array and
+returned in volts together with per-frame trigger timestamps, the achieved
+frame rate and the dead time between the end of one record and the next.
+
+Usage:
+    python scope_segmented.py --ip 169.254.195.129 --segments 100 --trigger CH1_PE
+"""
+import argparse
+import socket
+import time
+import numpy as np
+import pyvisa
+
+
+BASE_SAMPLE_RATE = 125e6  # Red Pitaya ADC clock
+RAW_LSB_V = 1.0 / 8192  # 14-bit ADC, +/-1 V (LV jumper)
+
+
+def set_nodelay(device):
+    """
+    Disable Nagle's algorithm on a pyvisa TCP socket resource
+
+    Without it a command written straight after another one (ACQ:START then
+    ACQ:TRIG, or a trigger status poll) waits for the delayed ACK, about
+    40 ms per segment.
+    """
+    try:
+        device.set_visa_attribute(pyvisa.constants.VI_ATTR_TCPIP_NODELAY, True)
+    except Exception:
+        # Some pyvisa-py versions do not route this attribute to the socket
+        session = getattr(device.visalib, "sessions", {}).get(device.session)
+        sock = getattr(session, "interface", None)
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class SegmentedCapture:
+    """
+    Capture K triggered frames with minimal re-arm latency
+
+    Parameters:
+    device: Open pyvisa resource (read/write termination '\\r\\n')
+    decimation: Decimation factor already set on the device
+    buffer_size: Samples per channel per segment
+    trigger_source: ACQ:TRIG source, "DISABLED" for free running segments
+    trigger_timeout: Seconds to wait for each trigger before giving up
+    poll_interval: Sleep between trigger status polls (0 polls back to back)
+    """
+    def __init__(self, device, decimation, buffer_size, trigger_source="DISABLED",
+                 trigger_timeout=5.0, poll_interval=0.0):
+        self.device = device
+        self.decimation = decimation
+        self.buffer_size = buffer_size
+        self.trigger_source = trigger_source
+        self.trigger_timeout = trigger_timeout
+        self.poll_interval = poll_interval
+        self.channels = (1, 2)
+
+    @property
+    def record_time(self):
+        """Duration of one segment in seconds"""
+        return self.buffer_size * self.decimation / BASE_SAMPLE_RATE
+
+    def read_raw(self, channel):
+        """Read one channel as a raw int16 binary block"""
+        return self.device.query_binary_values(
+            f"ACQ:SOUR{channel}:DATA?", datatype="h", is_big_endian=True,
+            container=np.array
+        )
+
+    def wait_for_trigger(self):
+        """Poll the trigger state until it fires, returns the detection time or None"""
+        deadline = time.perf_counter() + self.trigger_timeout
+        while True:
+            state = self.device.query("ACQ:TRIG:STAT?").strip()
+            if state == "TD":
+                return time.time()
+            if time.perf_counter() > deadline:
+                return None
+            if self.poll_interval:
+                time.sleep(self.poll_interval)
+
+    def capture(self, n_segments, report=None, should_stop=None):
+        """
+        Capture n_segments frames
+
+        Returns a dict with "data" ((K, channels, samples) float32 volts),
+        "timestamps" (host time of each trigger detection), "fps",
+        "dead_time" (mean seconds per segment not covered by a record),
+        "elapsed", "record_time" and "complete". If a trigger times out or
+        should_stop() becomes true the segments captured so far are returned
+        with complete=False.
+        """
+        if report is None:
+            report = lambda message: None
+        n = self.buffer_size
+        raw = np.empty((n_segments, len(self.channels), n), dtype=np.int16)
+        timestamps = np.empty(n_segments)
+
+        # Binary raw transfer for the whole run, ASCII volts restored afterwards
+        self.device.write("ACQ:DATA:FORMAT BIN")
+        self.device.write("ACQ:DATA:UNITS RAW")
+        captured = 0
+        complete = True
+        start = time.perf_counter()
+        try:
+            for k in range(n_segments):
+                if should_stop is not None and should_stop():
+                    complete = False
+                    break
+                # The trigger source is cleared when it fires, so re-arm both
+                self.device.write("ACQ:START")
+                if self.trigger_source != "DISABLED":
+                    self.device.write(f"ACQ:TRIG {self.trigger_source}")
+                    trigger_time = self.wait_for_trigger()
+                    if trigger_time is None:
+                        report(f"Trigger timeout after {k} segments")
+                        complete = False
+                        break
+                else:
+                    # Free running: only wait for the buffer to fill
+                    time.sleep(self.record_time)
+                    trigger_time = time.time()
+
+                for i, channel in enumerate(self.channels):
+                    values = self.read_raw(channel)
+                    m = min(len(values), n)
+                    raw[k, i, :m] = values[:m]
+                    raw[k, i, m:] = 0
+                timestamps[k] = trigger_time
+                captured = k + 1
+                if captured % 10 == 0:
+                    report(f"Segmented capture: {captured}/{n_segments}")
+        finally:
+            elapsed = time.perf_counter() - start
+            self.device.write("ACQ:STOP")
+            self.device.write("ACQ:DATA:FORMAT ASCII")
+            self.device.write("ACQ:DATA:UNITS VOLTS")
+
+        data = raw[:captured].astype(np.float32)
+        data *= RAW_LSB_V
+        fps = captured / elapsed if elapsed > 0 else 0.0
+        dead_time = (elapsed / captured - self.record_time) if captured else 0.0
+        return {
+            "data": data,
+            "timestamps": timestamps[:captured],
+            "fps": fps,
+            "dead_time": max(0.0, dead_time),
+            "elapsed": elapsed,
+            "record_time": self.record_time,
+            "complete": complete,
+        }
+
+
+def normalized_trigger_level(trigger_source, trigger_level_v):
+    """Convert a trigger level in volts to the normalised ACQ:TRIG:LEV value"""
+    if trigger_source.startswith("EXT"):
+        # External trigger range is typically 0V to 3.3V
+        return max(0.0, min(1.0, trigger_level_v / 3.3))
+    # Channel triggers use full ADC range (-1 to 1), from +/-20 V
+    return max(-1.0, min(1.0, trigger_level_v / 20.0))
+
+
+def configure(device, decimation, buffer_size, trigger_source, trigger_level=0.0):
+    """One-off acquisition setup before a segmented run; trigger_level in volts"""
+    set_nodelay(device)
+    device.write("ACQ:RST")
+    device.write(f"ACQ:DEC {decimation}")
+    device.write(f"ACQ:BUF:SIZE {buffer_size}")
+    device.write("ACQ:TRIG:DLY 0")
+    if trigger_source != "DISABLED":
+        device.write(f"ACQ:TRIG:LEV {normalized_trigger_level(trigger_source, trigger_level)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segmented multi-trigger Red Pitaya capture")
+    parser.add_argument("--ip", default="169.254.195.129", help="Red Pitaya IP address")
+    parser.add_argument("--port", type=int, default=5000, help="SCPI port")
+    parser.add_argument("--segments", type=int, default=100, help="Number of triggered frames")
+    parser.add_argument("--decimation", type=int, default=64, help="Decimation factor")
+    parser.add_argument("--buffer-size", type=int, default=1024, help="Samples per channel")
+    parser.add_argument("--trigger", default="DISABLED", help="Trigger source, e.g. CH1_PE or EXT_PE")
+    parser.add_argument("--level", type=float, default=0.0, help="Trigger level (V)")
+    parser.add_argument("--output", help="Save data and timestamps to this .npz file")
+    args = parser.parse_args()
+
+    rm = pyvisa.ResourceManager('@py')
+    device = rm.open_resource(f"TCPIP::{args.ip}::{args.port}::SOCKET")
+    device.read_termination = '\r\n'
+    device.write_termination = '\r\n'
+    device.timeout = 5000
+    try:
+        configure(device, args.decimation, args.buffer_size, args.trigger, args.level)
+        capture = SegmentedCapture(device, args.decimation, args.buffer_size, args.trigger)
+        result = capture.capture(args.segments, report=print)
+    finally:
+        device.close()
+
+    print(f"Captured {len(result['data'])} segments in {result['elapsed']:.3f} s")
+    print(f"Frame rate: {result['fps']:.1f} frames/s")
+    print(f"Record time: {result['record_time']*1e3:.3f} ms, "
+          f"dead time: {result['dead_time']*1e3:.3f} ms per segment")
+    if args.output:
+        np.savez(args.output, data=result["data"], timestamps=result["timestamps"],
+                 decimation=args.decimation)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Per-phase acquisition timing for the dual channel oscilloscope.
+
+PhaseTimer keeps the last N durations of every acquisition phase (setup,
+trigger wait, transfer, parse, processing, measurements, plotting and the
+whole frame) in ring buffers, and computes percentiles and log-spaced
+histograms from them on demand. Timing a phase is a context manager:
+
+    with timer.phase("transfer"):
+        data = device.query(...)
+
+While the timer is disabled phase() returns a shared no-op context, so the
+instrumentation can stay in the acquisition path permanently.
+"""
+import csv
+import json
+import threading
+import time
+import numpy as np
+
+
+PHASES = ("setup", "trigger", "transfer", "parse", "process", "measure", "plot", "frame")
+SHORT_NAMES = {"setup": "setup", "trigger": "trig", "transfer": "xfer", "parse": "parse",
+               "process": "proc", "measure": "meas", "plot": "plot", "frame": "frame"}
+
+
+class _NullPhase:
+    """No-op context used while timing is disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class PhaseTimer:
+    """
+    Rolling per-phase durations with percentiles and histograms
+
+    Parameters:
+    enabled: Start with timing switched on
+    history: Durations kept per phase
+    """
+    def __init__(self, enabled=False, history=1000):
+        self.enabled = enabled
+        self.history = history
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self._samples = {name: np.zeros(self.history) for name in PHASES}
+            self._counts = dict.fromkeys(PHASES, 0)
+
+    def phase(self, name):
+        """Context manager timing one phase; free when the timer is disabled"""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = np.zeros(self.history)
+                self._counts[name] = 0
+            samples[self._counts[name] % self.history] = seconds
+            self._counts[name] += 1
+
+    def samples(self, name):
+        """Copy of the rolling durations of one phase in seconds (unordered)"""
+        with self.lock:
+            count = min(self._counts.get(name, 0), self.history)
+            return self._samples[name][:count].copy() if count else np.zeros(0)
+
+    def statistics(self, name):
+        """Count, mean and p50/p95/p99 of one phase in seconds, or None if empty"""
+        samples = self.samples(name)
+        if len(samples) == 0:
+            return None
+        p50, p95, p99 = np.percentile(samples, (50, 95, 99))
+        return {
+            "count": self._counts[name],
+            "mean": float(samples.mean()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(samples.max()),
+        }
+
+    def histogram(self, name, bins_per_decade=10, low=1e-6, high=10.0):
+        """Log-spaced histogram of the rolling durations: (counts, bin_edges) in seconds"""
+        decades = np.log10(high / low)
+        edges = np.logspace(np.log10(low), np.log10(high), int(decades * bins_per_decade) + 1)
+        counts, edges = np.histogram(np.clip(self.samples(name), low, high), bins=edges)
+        return counts, edges
+
+    def phases(self):
+        with self.lock:
+            return [name for name in self._samples if self._counts[name]]
+
+    def summary(self):
+        """Compact p50/p95 line in milliseconds for the status bar"""
+        parts = []
+        for name in self.phases():
+            stats = self.statistics(name)
+            parts.append(f"{SHORT_NAMES.get(name, name)} {stats['p50']*1e3:.1f}/{stats['p95']*1e3:.1f}")
+        if not parts:
+            return "Timing: no frames"
+        return "p50/p95 ms: " + "  ".join(parts)
+
+    def export_csv(self, path):
+        """One row per phase with count, mean, p50, p95, p99 and max in milliseconds"""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["phase", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+            for name in self.phases():
+                stats = self.statistics(name)
+                writer.writerow([name, stats["count"]] + [
+                    f"{stats[key]*1e3:.4f}" for key in ("mean", "p50", "p95", "p99", "max")
+                ])
+
+    def export_json(self, path):
+        """Statistics, histograms and the rolling samples of every phase"""
+        report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "phases": {}}
+        for name in self.phases():
+            counts, edges = self.histogram(name)
+            report["phases"][name] = {
+                "statistics": self.statistics(name),
+                "histogram": {"counts": counts.tolist(), "bin_edges_s": edges.tolist()},
+                "samples_s": self.samples(name).tolist(),
+            }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
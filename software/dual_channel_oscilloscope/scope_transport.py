@@ -0,0 +1,289 @@
+"""
+Self-healing SCPI transport for the Red Pitaya.
+
+ScpiTransport wraps the pyvisa socket resource used by the oscilloscope. Every
+write and query runs under one lock; if it fails the socket is reopened with
+bounded exponential backoff, the acquisition settings sent so far are
+replayed, and the command is retried. A watchdog thread pings the instrument
+when the link has been idle, so a dead connection is found and replaced
+before the next frame needs it.
+
+Failures that survive all retries raise TransportError. Callers should
+treat the frame as failed rather than substituting placeholder data.
+Reconnects and watchdog failures are reported through the report callback,
+or the module logger when none is given.
+"""
+import logging
+import select
+import socket
+import threading
+import time
+import numpy as np
+import pyvisa
+from scope_segmented import set_nodelay
+
+logger = logging.getLogger(__name__)
+
+
+# Commands whose last value is replayed after a reconnect, in this order
+REPLAYED_COMMANDS = (
+    "ACQ:DEC", "ACQ:BUF:SIZE", "ACQ:TRIG:LEV", "ACQ:TRIG:DLY",
+    "ACQ:DATA:FORMAT", "ACQ:DATA:UNITS",
+)
+
+
+class TransportError(Exception):
+    """The instrument could not be reached within the retry budget"""
+
+
+class ScpiTransport:
+    """
+    pyvisa socket resource with watchdog, backoff reconnect and settings replay
+
+    Parameters:
+    host: Red Pitaya IP address
+    port: SCPI server port
+    timeout_ms: I/O timeout of the underlying resource
+    max_retries: Reconnect attempts per command before TransportError
+    backoff_initial: First reconnect delay in seconds, doubled per attempt
+    backoff_max: Upper bound of the reconnect delay
+    watchdog_interval: Idle seconds before the watchdog pings the instrument (0 disables it)
+    report: Called with reconnect and watchdog messages; logged as warnings if not given
+    """
+    def __init__(self, host, port=5000, timeout_ms=5000, max_retries=5,
+                 backoff_initial=0.01, backoff_max=0.25, watchdog_interval=2.0, report=None):
+        self.host = host
+        self.port = port
+        self.timeout_ms = timeout_ms
+        self.max_retries = max_retries
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.watchdog_interval = watchdog_interval
+        self.report = report if report is not None else logger.warning
+
+        self.rm = pyvisa.ResourceManager('@py')
+        self.resource = None
+        self.lock = threading.RLock()
+        self.settings = {}
+        self.healthy = False
+        self.last_io = 0.0
+
+        # Statistics
+        self.reconnects = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_recovery_time = 0.0
+
+        self._watchdog = None
+        self._closing = threading.Event()
+
+    @property
+    def resource_string(self):
+        return f"TCPIP::{self.host}::{self.port}::SOCKET"
+
+    def open(self):
+        """Connect and start the watchdog; returns the *IDN? reply"""
+        with self.lock:
+            self._open_resource()
+            idn = self.query("*IDN?")
+        self._closing.clear()
+        if self.watchdog_interval and self._watchdog is None:
+            self._watchdog = threading.Thread(target=self._watchdog_loop, daemon=True)
+            self._watchdog.start()
+        return idn
+
+    def close(self):
+        self._closing.set()
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.watchdog_interval + 1.0)
+            self._watchdog = None
+        with self.lock:
+            self._close_resource()
+            self.healthy = False
+
+    def _open_resource(self):
+        self.resource = self.rm.open_resource(self.resource_string)
+        self.resource.read_termination = '\r\n'
+        self.resource.write_termination = '\r\n'
+        self.resource.timeout = self.timeout_ms
+        set_nodelay(self.resource)
+        self.healthy = True
+        self.last_io = time.perf_counter()
+
+    def _close_resource(self):
+        if self.resource is not None:
+            try:
+                self.resource.close()
+            except Exception:
+                pass
+            self.resource = None
+
+    def reconnect(self):
+        """Reopen the socket with bounded exponential backoff and replay the settings"""
+        with self.lock:
+            started = time.perf_counter()
+            delay = self.backoff_initial
+            for attempt in range(self.max_retries):
+                self._close_resource()
+                if self._closing.is_set():
+                    break
+                try:
+                    self._open_resource()
+                    for head in REPLAYED_COMMANDS:
+                        if head in self.settings:
+                            self.resource.write(self.settings[head])
+                    self.reconnects += 1
+                    self.last_recovery_time = time.perf_counter() - started
+                    self.report(f"Reconnected to {self.host}:{self.port} in {self.last_recovery_time*1e3:.0f} ms")
+                    return
+                except Exception as e:
+                    self.last_error = e
+                    self.healthy = False
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.backoff_max)
+            self.healthy = False
+            raise TransportError(f"Reconnect to {self.host}:{self.port} failed: {self.last_error}")
+
+    def _call(self, method, *args, **kwargs):
+        """Run a resource method, reconnecting and retrying on failure"""
+        with self.lock:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if self.resource is None:
+                        self.reconnect()
+                    # Queries go through the EOF-aware versions below
+                    call = getattr(self, "_" + method, None) or getattr(self.resource, method)
+                    result = call(*args, **kwargs)
+                    self.healthy = True
+                    self.last_io = time.perf_counter()
+                    return result
+                except TransportError:
+                    raise
+                except Exception as e:
+                    # I/O errors, dropped connections and garbled binary
+                    # blocks all leave the stream in an unknown state
+                    self.failures += 1
+                    self.last_error = e
+                    self.healthy = False
+                    if attempt == self.max_retries:
+                        break
+                    self.reconnect()
+            raise TransportError(f"{args[0] if args else method} failed: {self.last_error}")
+
+    def _socket(self):
+        session = getattr(self.resource.visalib, "sessions", {}).get(self.resource.session)
+        return session, getattr(session, "interface", None)
+
+    def _wait_for_reply(self):
+        """
+        Wait for the first reply byte, failing fast if the peer closed the socket
+
+        pyvisa-py does not notice a closed connection and would wait for the
+        full I/O timeout; here it is detected as soon as the FIN arrives.
+        """
+        session, sock = self._socket()
+        if sock is None or getattr(session, "_pending_buffer", None):
+            return
+        readable, _, _ = select.select([sock], [], [], self.timeout_ms / 1000)
+        if not readable:
+            raise TimeoutError("no reply before the I/O timeout")
+        if sock.recv(1, socket.MSG_PEEK) == b"":
+            raise ConnectionError("connection closed by the instrument")
+
+    def _query(self, command):
+        self.resource.write(command)
+        self._wait_for_reply()
+        return self.resource.read()
+
+    def _query_binary_values(self, command, datatype="h", is_big_endian=True, **kwargs):
+        """
+        Query an IEEE 488.2 definite length block straight from the socket
+
+        pyvisa-py reads sockets in 4 kB pieces with a lot of Python work per
+        piece, which holds the GIL and stops several units from being read in
+        parallel. Here the block is received with recv_into into one buffer.
+        Falls back to pyvisa when the raw socket is not available.
+        """
+        session, sock = self._socket()
+        if sock is None or getattr(session, "_pending_buffer", None):
+            self.resource.write(command)
+            self._wait_for_reply()
+            kwargs.setdefault("container", np.array)
+            return self.resource.read_binary_values(datatype=datatype, is_big_endian=is_big_endian, **kwargs)
+
+        sock.sendall((command + self.resource.write_termination).encode())
+        header = self._recv_exact(sock, 2)
+        if header[:1] != b"#" or not header[1:2].isdigit():
+            raise ValueError(f"Not a binary block: {bytes(header)!r}")
+        length = int(self._recv_exact(sock, int(header[1:2])))
+        payload = self._recv_exact(sock, length + len(self.resource.read_termination))
+        dtype = np.dtype(datatype).newbyteorder(">" if is_big_endian else "<")
+        return np.frombuffer(payload, dtype=dtype, count=length // dtype.itemsize)
+
+    def _recv_exact(self, sock, n):
+        """Receive exactly n bytes from a non-blocking socket within the I/O timeout"""
+        buffer = bytearray(n)
+        view = memoryview(buffer)
+        received = 0
+        deadline = time.perf_counter() + self.timeout_ms / 1000
+        while received < n:
+            remaining = deadline - time.perf_counter()
+            readable, _, _ = select.select([sock], [], [], max(remaining, 0))
+            if not readable:
+                raise TimeoutError("no reply before the I/O timeout")
+            count = sock.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("connection closed by the instrument")
+            received += count
+        return buffer
+
+    def _remember(self, command):
+        head = command.partition(" ")[0].upper()
+        if head == "ACQ:RST":
+            self.settings.clear()
+        elif head in REPLAYED_COMMANDS:
+            self.settings[head] = command
+
+    def write(self, command):
+        with self.lock:
+            self._remember(command)
+            return self._call("write", command)
+
+    def query(self, command):
+        return self._call("query", command)
+
+    def query_binary_values(self, command, **kwargs):
+        return self._call("query_binary_values", command, **kwargs)
+
+    def clear(self):
+        return self._call("clear")
+
+    def __getattr__(self, name):
+        # Anything else (read_termination, visalib, session ...) comes from the resource
+        resource = self.__dict__.get("resource")
+        if resource is None:
+            raise AttributeError(name)
+        return getattr(resource, name)
+
+    def _watchdog_loop(self):
+        while not self._closing.wait(self.watchdog_interval / 2):
+            if time.perf_counter() - self.last_io < self.watchdog_interval:
+                continue
+            # Only ping when nobody else is using the link
+            if not self.lock.acquire(blocking=False):
+                continue
+            try:
+                self._call("query", "*IDN?")
+            except TransportError as e:
+                self.report(f"Watchdog: {e}")
+            finally:
+                self.lock.release()
+
+    def stats(self):
+        return {
+            "healthy": self.healthy,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+            "last_recovery_time": self.last_recovery_time,
+            "last_error": str(self.last_error) if self.last_error else None,
+        }
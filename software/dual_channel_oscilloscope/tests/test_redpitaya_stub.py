@@ -0,0 +1,38 @@
+import socket
+import pytest
+from redpitaya_stub import RedPitayaStub
+
+
+@pytest.fixture
+def connection():
+    server = RedPitayaStub(port=0)
+    address = server.start()
+    sock = socket.create_connection(address, timeout=2)
+    yield sock.makefile("rwb")
+    sock.close()
+    server.stop()
+
+
+def send(stream, command):
+    stream.write(command.encode() + b"\r\n")
+    stream.flush()
+
+
+def query(stream, command):
+    send(stream, command)
+    return stream.readline().strip()
+
+
+@pytest.mark.parametrize("command", ["ACQ:DEC abc", "ACQ:BUF:SIZE", "ACQ:TRIG:LEV x", "ACQ:TRIG:DLY inf"])
+def test_malformed_set_command_gets_no_reply_and_keeps_connection(connection, command):
+    send(connection, "ACQ:DEC 8")
+    send(connection, command)
+    # The next reply is the query's, not an error for the set command
+    assert query(connection, "ACQ:DEC?") == b"8"
+    assert query(connection, "ACQ:BUF:SIZE?") == b"16384"
+
+
+@pytest.mark.parametrize("command", ["ACQ:SOUR3:DATA?", "ACQ:SOURX:DATA?", "ACQ:GAIN?"])
+def test_malformed_query_replies_error(connection, command):
+    assert query(connection, command) == b"ERR!"
+    assert query(connection, "ACQ:DEC?") == b"1"
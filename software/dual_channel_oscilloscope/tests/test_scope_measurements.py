@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scope_measurements import MeasurementEngine, benchmark
+
+SAMPLE_RATE = 122e3
+N = 1024
+
+
+def tone(freq, noise=0.0, seed=0, harmonic=0.0):
+    t = np.arange(N) / SAMPLE_RATE
+    signal = np.sin(2 * np.pi * freq * t) + harmonic * np.sin(2 * np.pi * 3 * freq * t)
+    return signal + np.random.default_rng(seed).normal(0, noise, N)
+
+
+@pytest.mark.parametrize("noise", [1e-4, 1e-3, 1e-2])
+def test_snr_follows_added_noise(noise):
+    engine = MeasurementEngine()
+    expected = 10 * np.log10(0.5 / noise ** 2)
+    snr = [engine.measure([tone(1000.3, noise, seed)], SAMPLE_RATE)["snr"][0] for seed in range(10)]
+    assert np.mean(snr) == pytest.approx(expected, abs=0.5)
+
+
+def test_clean_tone_has_no_leakage_floor():
+    result = MeasurementEngine().measure([tone(1000.3)], SAMPLE_RATE)
+    assert result["snr"][0] > 100
+    assert result["thd"][0] < 0.01
+    assert result["frequency"][0] == pytest.approx(1000.3, abs=0.5)
+
+
+def test_thd_of_known_third_harmonic():
+    result = MeasurementEngine().measure([tone(1000.3, 1e-4, harmonic=0.01)], SAMPLE_RATE)
+    assert result["thd"][0] == pytest.approx(1.0, abs=0.02)
+
+
+def test_constant_frame_has_no_frequency():
+    result = MeasurementEngine().measure([np.zeros(N), tone(1000.3)], SAMPLE_RATE)
+    assert np.isnan(result["frequency"][0])
+    assert np.isnan(result["thd"][0]) and np.isnan(result["snr"][0])
+    assert result["frequency"][1] == pytest.approx(1000.3, abs=0.5)
+
+
+def test_frequency_and_phase_without_distortion():
+    engine = MeasurementEngine()
+    channels = [tone(1000.3, 1e-3), np.roll(tone(1000.3, 1e-3, seed=1), 5)]
+    full = engine.measure(channels, SAMPLE_RATE)
+    fast = engine.measure(channels, SAMPLE_RATE, distortion=False)
+    assert "thd" not in fast and "snr" not in fast
+    assert np.array_equal(fast["frequency"], full["frequency"])
+    assert fast["phase"] == full["phase"]
+
+
+@pytest.mark.parametrize("n_samples", [1024, 16384])
+def test_default_set_costs_less_than_legacy(n_samples):
+    costs = benchmark(n_samples, repeats=200)
+    assert costs["default"] < costs["legacy"]
@@ -0,0 +1,57 @@
+import json
+import time
+import numpy as np
+import pytest
+from history_pyramid import HistoryPyramid
+from scope_recorder import FrameRecorder, load_recording
+
+N_SAMPLES = 64
+
+
+def record(path, count, pyramid=False, **options):
+    recorder = FrameRecorder(str(path), N_SAMPLES, queue_size=1024, pyramid=pyramid, **options)
+    for seq in range(count):
+        recorder.append(np.full(N_SAMPLES, seq * 1e-3), np.zeros(N_SAMPLES), timestamp=1000.0 + seq)
+    return recorder
+
+
+def wait_written(recorder, count):
+    deadline = time.monotonic() + 5
+    while recorder.frames_written < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_closed_recording_round_trip(tmp_path):
+    recorder = record(tmp_path / "run", 300)
+    recorder.close()
+    data, index = load_recording(str(tmp_path / "run"))
+    assert data.shape == (300, 2, N_SAMPLES)
+    assert np.array_equal(index["seq"], np.arange(300))
+    assert data[299, 0, 0] == pytest.approx(0.299, abs=1e-4)
+
+
+@pytest.mark.parametrize("count, ring", [(300, None), (10, None), (100, 64)])
+def test_crashed_recording_keeps_frames_past_the_header(tmp_path, count, ring):
+    path = tmp_path / "run"
+    recorder = record(path, count, ring_frames=ring)
+    wait_written(recorder, count)
+    # Not closed: the header still has the count from the last grow
+    with open(str(path) + ".json") as f:
+        assert json.load(f)["frames_written"] < count
+    data, index = load_recording(str(path))
+    kept = min(count, ring or count)
+    assert np.array_equal(index["seq"], np.arange(count - kept, count))
+    assert data[-1, 0, 0] == pytest.approx((count - 1) * 1e-3, abs=1e-4)
+    recorder.close()
+
+
+def test_crashed_recording_browses_to_the_last_frame(tmp_path):
+    path = tmp_path / "run"
+    recorder = record(path, 300, pyramid=True)
+    wait_written(recorder, 300)
+    history = HistoryPyramid(str(path))
+    assert history.frames == 300
+    assert history.total_samples == 300 * N_SAMPLES
+    assert np.array_equal(history.index["seq"], np.arange(300))
+    recorder.close()
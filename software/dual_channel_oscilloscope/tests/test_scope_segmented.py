@@ -0,0 +1,37 @@
+import pytest
+from redpitaya_acquisition import RedPitayaAcquisition, make_settings
+from scope_segmented import configure
+
+
+class RecordingDevice:
+    """pyvisa resource stand-in that keeps the commands written to it"""
+    def __init__(self):
+        self.commands = []
+
+    def set_visa_attribute(self, attribute, value):
+        pass
+
+    def write(self, command):
+        self.commands.append(command)
+
+
+def trigger_level(device):
+    return [command for command in device.commands if command.startswith("ACQ:TRIG:LEV")]
+
+
+@pytest.mark.parametrize("source, volts, expected", [
+    ("CH1_PE", 2.0, 0.1), ("CH2_NE", -40.0, -1.0), ("EXT_PE", 1.65, 0.5), ("EXT_PE", 5.0, 1.0)])
+def test_trigger_level_sent_normalised(source, volts, expected):
+    segmented = RecordingDevice()
+    configure(segmented, 64, 1024, source, volts)
+    assert trigger_level(segmented) == [f"ACQ:TRIG:LEV {expected}"]
+    # The same value the single-frame path sends
+    single = RecordingDevice()
+    RedPitayaAcquisition(single).configure(make_settings(trigger_source=source, trigger_level=volts))
+    assert trigger_level(single) == trigger_level(segmented)
+
+
+def test_no_trigger_level_when_free_running():
+    device = RecordingDevice()
+    configure(device, 64, 1024, "DISABLED", 0.5)
+    assert trigger_level(device) == []
@@ -0,0 +1,52 @@
+import logging
+import time
+import pytest
+from redpitaya_stub import RedPitayaStub
+from scope_transport import ScpiTransport
+
+
+@pytest.fixture
+def stub():
+    server = RedPitayaStub(port=0)
+    address = server.start()
+    yield server, address
+    server.stop()
+
+
+def test_reconnect_reported_and_settings_replayed(stub):
+    _, (host, port) = stub
+    messages = []
+    transport = ScpiTransport(host, port, watchdog_interval=0, report=messages.append)
+    transport.open()
+    transport.write("ACQ:DEC 8")
+    transport.resource.close()  # The link drops
+    assert transport.query("ACQ:DEC?") == "8"
+    transport.close()
+    assert transport.reconnects == 1
+    assert len(messages) == 1 and messages[0].startswith(f"Reconnected to {host}:{port}")
+
+
+def test_reports_go_to_the_logger_by_default(stub, caplog):
+    _, (host, port) = stub
+    transport = ScpiTransport(host, port, watchdog_interval=0)
+    transport.open()
+    transport.resource.close()
+    with caplog.at_level(logging.WARNING, logger="scope_transport"):
+        transport.query("*IDN?")
+    transport.close()
+    assert [record.getMessage()[:14] for record in caplog.records] == ["Reconnected to"]
+
+
+def test_watchdog_failure_reported(stub):
+    server, (host, port) = stub
+    messages = []
+    transport = ScpiTransport(host, port, max_retries=2, watchdog_interval=0.05, report=messages.append)
+    transport.open()
+    server.stop()
+    transport.resource.close()
+    deadline = time.monotonic() + 5
+    while not any(message.startswith("Watchdog: ") for message in messages):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    transport.close()
+    assert not transport.healthy